@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import User, ChatSession, ChatMessage, Document, FAQ
+from .models import User, ChatSession, ChatMessage, Document, FAQ, OutboundEmail
 
 
 @admin.register(User)
@@ -41,3 +41,11 @@ class FAQAdmin(admin.ModelAdmin):
 
     def question_preview(self, obj):
         return obj.question[:50] + '...' if len(obj.question) > 50 else obj.question
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ['id', 'to_email', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['to_email', 'subject']
+    readonly_fields = ['claim_token', 'last_error']
@@ -1,4 +1,8 @@
+import os
+import sys
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class ApiConfig(AppConfig):
@@ -6,8 +10,18 @@ class ApiConfig(AppConfig):
     name = 'api'
 
     def ready(self):
-        # Start background scheduler when app is ready
-        import os
+        # Keep stored knowledge-base embeddings in sync with row changes
+        from . import signals  # noqa: F401
+
+        # Load the RAG pipeline in the background so the first chat request does not.
+        # With RAG_SHARED_MODE=preload the gunicorn master loads it before forking instead.
+        if (getattr(settings, 'RAG_WARMUP', True) and getattr(settings, 'RAG_SHARED_MODE', '') != 'preload'
+                and self._serves_requests()):
+            from rag.pipeline import start_warmup
+            start_warmup()
+
+        # Start the background scheduler in the runserver child process. Production
+        # servers do not run it: the email outbox has its own drain_outbox worker.
         if os.environ.get('RUN_MAIN', None) != 'true':
             return  # Avoid running twice in development
 
@@ -16,3 +30,16 @@ class ApiConfig(AppConfig):
             start_scheduler()
         except Exception as e:
             print(f"Failed to start scheduler: {e}")
+
+    @staticmethod
+    def _serves_requests() -> bool:
+        """
+        Whether this process serves HTTP: a WSGI/ASGI server, or the child
+        process of ``runserver`` (not its autoreloader, nor any other
+        management command).
+        """
+        if os.path.basename(sys.argv[0]) not in ('manage.py', 'django-admin', '__main__.py', '-c'):
+            return True
+        return sys.argv[1:2] == ['runserver'] and (
+            os.environ.get('RUN_MAIN') == 'true' or '--noreload' in sys.argv
+        )
@@ -0,0 +1,150 @@
+"""
+Bulk import of knowledge-base rows from JSONL or CSV.
+
+Used by ``POST /api/documents/bulk/``, ``POST /api/faqs/bulk/`` and
+``manage.py import_knowledge_base``. Input is read a line at a time and
+handled in batches of ``RAG_IMPORT_BATCH_SIZE`` rows: each batch is
+validated with the model's serializer, inserted by one ``bulk_create`` in
+a transaction, then embedded and added to the RAG index in batches of
+``RAG_EMBED_BATCH_SIZE``. Memory use depends on the batch size, not on the
+size of the input.
+
+``bulk_create`` sends no ``post_save`` signals, so the importer indexes the
+new rows and invalidates cached answers itself.
+"""
+import csv
+import json
+import time
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+
+from rag.pipeline import invalidate_answer_cache
+
+from .models import Document, FAQ
+from .serializers import DocumentSerializer, FAQSerializer
+
+IMPORT_SOURCES = {
+    'document': (Document, DocumentSerializer),
+    'faq': (FAQ, FAQSerializer),
+}
+IMPORT_FORMATS = ('jsonl', 'csv')
+
+# Invalid rows are counted in full but only the first ones are described
+MAX_REPORTED_ERRORS = 100
+
+
+def read_records(lines: Iterable, fmt: str) -> Iterator[Tuple[int, object]]:
+    """
+    Yield ``(line number, record)`` for every JSONL line or CSV row of
+    ``lines`` (str or UTF-8 bytes, as read from a file or request stream).
+    A JSONL line that cannot be parsed yields a ``ValueError`` in place of
+    its record; blank lines are skipped.
+    """
+    if fmt not in IMPORT_FORMATS:
+        raise ValueError(f"Unknown import format {fmt!r}, expected one of {IMPORT_FORMATS}")
+    if fmt == 'csv':
+        reader = csv.DictReader(line.decode('utf-8') if isinstance(line, bytes) else line for line in lines)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for number, line in enumerate(lines, 1):
+        try:
+            line = line.decode('utf-8') if isinstance(line, bytes) else line
+            if not line.strip():
+                continue
+            record = json.loads(line)
+        except ValueError as e:  # Includes JSONDecodeError and UnicodeDecodeError
+            yield number, e
+            continue
+        yield number, record if isinstance(record, dict) else ValueError('Expected a JSON object')
+
+
+class KnowledgeBaseImporter:
+    """
+    Imports ``(line number, record)`` pairs (see :func:`read_records`) as
+    rows of one knowledge-base type. Invalid records are skipped and
+    reported; valid ones are inserted and, when a pipeline is given, indexed.
+    With ``index=False`` the pipeline only computes and stores their
+    embeddings, leaving its own index empty.
+    """
+
+    def __init__(self, doc_type: str, rag=None, batch_size: Optional[int] = None,
+                 progress: Optional[Callable[[Dict], None]] = None, index: bool = True):
+        self.doc_type = doc_type
+        self.model, self.serializer_class = IMPORT_SOURCES[doc_type]
+        self.rag = rag
+        self.index = index
+        self.batch_size = batch_size or getattr(settings, 'RAG_IMPORT_BATCH_SIZE', 500)
+        self.progress = progress  # Called with stats() after every batch
+        self.rows = self.created = self.indexed = self.failed = 0
+        self.errors = []
+        self.seconds = 0.0
+
+    def run(self, records: Iterable[Tuple[int, object]]) -> Dict:
+        """Import all ``records`` and return :meth:`stats`."""
+        started = time.perf_counter()
+        records = iter(records)
+        try:
+            while batch := list(islice(records, self.batch_size)):
+                self._import_batch(batch)
+                self.seconds = time.perf_counter() - started
+                if self.progress is not None:
+                    self.progress(self.stats())
+        finally:
+            if self.created:
+                invalidate_answer_cache()
+        return self.stats()
+
+    def stats(self) -> Dict:
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'indexed': self.indexed,
+            'failed': self.failed,
+            'errors': self.errors,
+            'seconds': round(self.seconds, 3),
+            'rows_per_sec': round(self.created / self.seconds, 1) if self.seconds else 0.0,
+        }
+
+    def _import_batch(self, batch):
+        instances = []
+        for number, record in batch:
+            self.rows += 1
+            if isinstance(record, Exception):
+                self._reject(number, str(record))
+                continue
+            serializer = self.serializer_class(data=record)
+            if serializer.is_valid():
+                instances.append(self.model(**serializer.validated_data))
+            else:
+                self._reject(number, serializer.errors)
+        if not instances:
+            return
+
+        with transaction.atomic():
+            created = self.model.objects.bulk_create(instances)
+        self.created += len(created)
+
+        if self.rag is None:
+            return
+        if created[0].pk is None:
+            # Backends that cannot return bulk-inserted keys (MySQL): the rows are
+            # encoded and indexed by the next full index load instead
+            return
+        try:
+            if self.index:
+                self.rag.upsert_instances(self.doc_type, created)
+            else:
+                self.rag.embed_instances(self.doc_type, created)
+            self.indexed += len(created)
+        except Exception as e:
+            print(f"[RAG] Failed to index imported {self.model.__name__} rows: {e}")
+
+    def _reject(self, number: int, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': number, 'errors': errors})
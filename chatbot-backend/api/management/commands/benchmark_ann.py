@@ -0,0 +1,126 @@
+"""
+Management command to benchmark the RAG index types on synthetic corpora.
+
+For every corpus size and index type it reports recall@k against the exact
+flat index, p50/p99 single-query search latency, build time and index size.
+"""
+import os
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from rag.index import INDEX_TYPES, create_index, index_params, train_index
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+
+def synthetic_corpus(count, dim, rng, clusters=1000, chunk=100000, intrinsic_dim=None):
+    """
+    Unit vectors drawn around random cluster centres, like sentence embeddings.
+    With ``intrinsic_dim`` the clusters lie in a random subspace of that many
+    dimensions plus a little isotropic noise, as the variance of real
+    embeddings is concentrated in their leading principal components.
+    """
+    centres = rng.standard_normal((clusters, intrinsic_dim or dim)).astype(np.float32)
+    basis = np.linalg.qr(rng.standard_normal((dim, intrinsic_dim)))[0].T.astype(np.float32) if intrinsic_dim else None
+    vectors = np.empty((count, dim), dtype=np.float32)
+    for start in range(0, count, chunk):
+        stop = min(start + chunk, count)
+        block = centres[rng.integers(0, clusters, stop - start)]
+        block += 0.3 * rng.standard_normal(block.shape).astype(np.float32)
+        if basis is not None:
+            block = block @ basis + 0.05 * rng.standard_normal((stop - start, dim)).astype(np.float32)
+        block /= np.linalg.norm(block, axis=1, keepdims=True)
+        vectors[start:stop] = block
+    return vectors
+
+
+def index_bytes(index):
+    """Serialized size of an index, a close proxy for its memory footprint."""
+    with tempfile.NamedTemporaryFile(suffix='.faiss', delete=False) as f:
+        path = f.name
+    try:
+        faiss.write_index(index, path)
+        return os.path.getsize(path)
+    finally:
+        os.unlink(path)
+
+
+class Command(BaseCommand):
+    help = 'Report recall@k, p50/p99 latency and memory for flat, IVF-Flat, HNSW and IVF-PQ indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000,1000000',
+                            help='Comma-separated corpus sizes')
+        parser.add_argument('--types', default=','.join(INDEX_TYPES),
+                            help='Comma-separated index types')
+        parser.add_argument('--dim', type=int, default=384)
+        parser.add_argument('--queries', type=int, default=500)
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if faiss is None:
+            raise CommandError('faiss is not installed')
+        sizes = [int(s) for s in options['sizes'].split(',') if s]
+        types = [t for t in options['types'].split(',') if t]
+        unknown = set(types) - set(INDEX_TYPES)
+        if unknown:
+            raise CommandError(f"Unknown index types: {', '.join(sorted(unknown))}")
+        if min(sizes, default=0) < 1 or options['queries'] < 1 or options['k'] < 1:
+            raise CommandError('--sizes, --queries and --k must be positive')
+
+        k = options['k']
+        rng = np.random.default_rng(options['seed'])
+        base = index_params()
+        self.stdout.write(
+            f"nlist={base['nlist']} nprobe={base['nprobe']} hnsw_m={base['hnsw_m']} "
+            f"ef_search={base['ef_search']} pq={base['pq_m']}x{base['pq_nbits']}"
+        )
+
+        for size in sizes:
+            self.stdout.write(f'\nCorpus of {size:,} x {options["dim"]} vectors')
+            corpus = synthetic_corpus(size, options['dim'], rng)
+            queries = synthetic_corpus(options['queries'], options['dim'], rng)
+
+            exact = faiss.IndexFlatL2(options['dim'])
+            exact.add(corpus)
+            _, truth = exact.search(queries, k)
+            del exact
+
+            self.stdout.write(
+                f"  {'type':<10}{'recall@' + str(k):>10}{'p50 ms':>10}{'p99 ms':>10}"
+                f"{'build s':>10}{'index MB':>10}{'B/vector':>10}"
+            )
+            for index_type in types:
+                self._run(index_type, base, corpus, queries, truth, k)
+            del corpus
+
+    def _run(self, index_type, base, corpus, queries, truth, k):
+        params = dict(base, type=index_type)
+        started = time.perf_counter()
+        index = train_index(create_index(corpus.shape[1], params), corpus, params)
+        for start in range(0, len(corpus), 100000):
+            index.add_with_ids(corpus[start:start + 100000], np.arange(start, min(start + 100000, len(corpus))))
+        build = time.perf_counter() - started
+
+        latencies = np.empty(len(queries))
+        found = np.empty((len(queries), k), dtype=np.int64)
+        for i in range(len(queries)):
+            t0 = time.perf_counter()
+            _, ids = index.search(queries[i:i + 1], k)
+            latencies[i] = time.perf_counter() - t0
+            found[i] = ids[0]
+
+        recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+        size = index_bytes(index)
+        self.stdout.write(
+            f'  {index_type:<10}{recall:>10.3f}{np.percentile(latencies, 50) * 1000:>10.3f}'
+            f'{np.percentile(latencies, 99) * 1000:>10.3f}{build:>10.1f}'
+            f'{size / 2**20:>10.1f}{size / len(corpus):>10.0f}'
+        )
@@ -0,0 +1,77 @@
+"""
+Management command to benchmark the embedding backends (see rag.embedding).
+
+Encodes the same synthetic texts with every backend and reports load time,
+throughput and per-call latency for single queries and batches, plus the
+cosine similarity of each backend's vectors to the first backend's.
+"""
+import random
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from rag.embedding import EMBEDDING_BACKENDS, load_embedding_model
+
+from .benchmark_ingestion import WORDS
+
+
+class Command(BaseCommand):
+    help = 'Report single-query and batch encode throughput and parity of the torch/ONNX/int8 embedding backends'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backends', default=','.join(EMBEDDING_BACKENDS),
+                            help='Comma-separated backends; the first is the parity reference')
+        parser.add_argument('--batch-sizes', default='1,8,32,128', help='Comma-separated texts per encode() call')
+        parser.add_argument('--texts', type=int, default=512, help='Texts encoded per batch size')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        backends = [b for b in options['backends'].split(',') if b]
+        unknown = set(backends) - set(EMBEDDING_BACKENDS)
+        if unknown:
+            raise CommandError(f"Unknown backends: {', '.join(sorted(unknown))}")
+        batch_sizes = [int(b) for b in options['batch_sizes'].split(',') if b]
+        if min(batch_sizes, default=0) < 1 or options['texts'] < 1:
+            raise CommandError('--batch-sizes and --texts must be positive')
+
+        rng = random.Random(options['seed'])
+        texts = [' '.join(rng.choices(WORDS, k=rng.randint(5, 60))) for _ in range(options['texts'])]
+        name = getattr(settings, 'RAG_EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+        self.stdout.write(f'{name}, {len(texts)} texts of 5-60 words')
+        self.stdout.write(
+            f"  {'backend':<11}{'batch':>7}{'texts/s':>10}{'p50 ms':>10}{'p99 ms':>10}"
+            f"{'min cos':>10}{'mean cos':>10}"
+        )
+
+        reference = None
+        for backend in backends:
+            started = time.perf_counter()
+            try:
+                model = load_embedding_model(name, backend)
+            except Exception as e:
+                self.stdout.write(f'  {backend:<11} unavailable: {e}')
+                continue
+            loaded = time.perf_counter() - started
+            model.encode(texts[:8], show_progress_bar=False)  # Warm up
+
+            vectors = model.encode(texts, batch_size=64, normalize_embeddings=True, show_progress_bar=False)
+            if reference is None:
+                reference = vectors
+            cosines = np.sum(vectors * reference, axis=1)
+
+            for batch_size in batch_sizes:
+                latencies = []
+                started = time.perf_counter()
+                for start in range(0, len(texts), batch_size):
+                    t0 = time.perf_counter()
+                    model.encode(texts[start:start + batch_size], batch_size=batch_size, show_progress_bar=False)
+                    latencies.append(time.perf_counter() - t0)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'  {backend:<11}{batch_size:>7}{len(texts) / elapsed:>10.1f}'
+                    f'{np.percentile(latencies, 50) * 1000:>10.2f}{np.percentile(latencies, 99) * 1000:>10.2f}'
+                    f'{cosines.min():>10.4f}{cosines.mean():>10.4f}'
+                )
+            self.stdout.write(f'  {backend:<11} loaded in {loaded:.1f}s')
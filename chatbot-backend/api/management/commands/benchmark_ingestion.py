@@ -0,0 +1,100 @@
+"""
+Management command to benchmark knowledge-base ingestion throughput.
+
+Runs the legacy per-document loop (one encode() and one index.add() per
+entry) and the batched RAGPipeline.add_documents path over the same corpus
+and reports docs/sec for both.
+"""
+import random
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from rag.pipeline import RAGPipeline, entry_label
+
+
+WORDS = (
+    'course enroll certificate quiz lesson module payment refund invoice stripe '
+    'instructor assignment deadline progress dashboard video browser account '
+    'password email verification forum discussion grade completion schedule '
+    'support ticket subscription discount coupon mobile download profile'
+).split()
+
+
+class Command(BaseCommand):
+    help = 'Benchmark per-document vs batched embedding ingestion (docs/sec)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--docs', type=int, default=2000,
+                            help='Number of synthetic documents to ingest')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Encode batch size (defaults to RAG_EMBED_BATCH_SIZE)')
+        parser.add_argument('--from-db', action='store_true',
+                            help='Ingest the Document/FAQ rows from the database instead')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if options['batch_size'] is not None and options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        rag = RAGPipeline()
+        if rag.embedding_model is None or rag.index is None:
+            raise CommandError('Embedding model / FAISS are not available')
+
+        if options['from_db']:
+            documents = [doc for doc, _ in rag._iter_knowledge_base()]
+        else:
+            documents = list(rag._chunk_documents(self._synthetic_documents(options['docs'], options['seed'])))
+        if not documents:
+            raise CommandError('No documents to ingest')
+
+        # Warm up the model so neither run pays for lazy initialisation
+        rag.embedding_model.encode(['warmup'], show_progress_bar=False)
+
+        self.stdout.write(f'Ingesting {len(documents)} documents...')
+
+        legacy = self._timed(rag, lambda: self._legacy_ingest(rag, documents))
+        self._report('per-document loop', len(documents), legacy)
+
+        batched = self._timed(rag, lambda: rag.add_documents(documents, batch_size=options['batch_size']))
+        self._report('batched', len(documents), batched)
+
+        self.stdout.write(self.style.SUCCESS(f'Speedup: {legacy / batched:.1f}x'))
+
+    def _timed(self, rag, ingest):
+        rag.index.reset()
+        rag.documents = {}
+        rag.lexical.clear()
+        start = time.perf_counter()
+        ingest()
+        elapsed = time.perf_counter() - start
+        if rag.index.ntotal != len(rag.documents):
+            raise CommandError('Index and document list are out of sync')
+        return elapsed
+
+    def _report(self, label, count, elapsed):
+        self.stdout.write(f'  {label:<18} {elapsed:8.2f}s  {count / elapsed:10.1f} docs/sec')
+
+    @staticmethod
+    def _legacy_ingest(rag, documents):
+        """The original ingestion loop: one encode and one index.add per document."""
+        for doc in documents:
+            text = f"{doc.get('title', '')} {doc.get('content', '')}"
+            embedding = rag.embedding_model.encode([text])[0]
+            label = entry_label(doc)
+            rag.index.add_with_ids(np.array([embedding], dtype=np.float32), np.array([label], dtype=np.int64))
+            rag.documents[label] = doc
+
+    @staticmethod
+    def _synthetic_documents(count, seed):
+        rng = random.Random(seed)
+        return [
+            {
+                'title': ' '.join(rng.choices(WORDS, k=6)).capitalize(),
+                'content': ' '.join(rng.choices(WORDS, k=rng.randint(60, 200))),
+                'type': 'document',
+                'id': i,
+            }
+            for i in range(1, count + 1)
+        ]
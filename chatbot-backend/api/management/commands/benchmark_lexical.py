@@ -0,0 +1,91 @@
+"""
+Management command to benchmark the keyword (BM25) leg of hybrid retrieval.
+
+Indexes a synthetic corpus with a Zipf-distributed vocabulary whose most
+frequent words are the stopwords, so the remaining common words have long
+postings like real text, and reports the p50/p99 latency
+of ``LexicalIndex.search`` and of reciprocal-rank fusion with a dense
+result list, per corpus size.
+"""
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from rag.lexical import STOPWORDS, LexicalIndex, reciprocal_rank_fusion
+
+
+def synthetic_vocabulary(size):
+    """Words by frequency rank; as in English, the most frequent ones are stopwords."""
+    return sorted(STOPWORDS) + [f'w{rank}' for rank in range(size - len(STOPWORDS))]
+
+
+def synthetic_texts(count, rng, vocabulary, min_words=40, max_words=200):
+    """Random documents whose word frequencies follow a Zipf law, like natural language."""
+    weights = 1.0 / np.arange(1, len(vocabulary) + 1)
+    weights /= weights.sum()
+    lengths = rng.integers(min_words, max_words, count)
+    words = rng.choice(len(vocabulary), size=int(lengths.sum()), p=weights)
+    texts, start = [], 0
+    for length in lengths:
+        texts.append(' '.join(vocabulary[word] for word in words[start:start + length]))
+        start += length
+    return texts, weights
+
+
+class Command(BaseCommand):
+    help = 'Report BM25 search and fusion latency of the hybrid retrieval keyword leg'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000', help='Comma-separated corpus sizes')
+        parser.add_argument('--vocabulary', type=int, default=50000, help='Distinct words in the corpus')
+        parser.add_argument('--queries', type=int, default=1000)
+        parser.add_argument('--query-words', type=int, default=5, help='Words per query')
+        parser.add_argument('--candidates', type=int, default=20, help='Results ranked per leg')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        sizes = [int(s) for s in options['sizes'].split(',') if s]
+        if min(sizes, default=0) < 1 or options['queries'] < 1 or options['query_words'] < 1:
+            raise CommandError('--sizes, --queries and --query-words must be positive')
+        if options['vocabulary'] <= len(STOPWORDS):
+            raise CommandError(f'--vocabulary must be larger than the {len(STOPWORDS)} stopwords')
+
+        rng = np.random.default_rng(options['seed'])
+        depth = options['candidates']
+        vocabulary = synthetic_vocabulary(options['vocabulary'])
+        self.stdout.write(
+            f"  {'documents':>10}{'build s':>10}{'bm25 p50 ms':>13}{'bm25 p99 ms':>13}"
+            f"{'fusion p50 ms':>15}{'fusion p99 ms':>15}"
+        )
+        for size in sizes:
+            texts, weights = synthetic_texts(size, rng, vocabulary)
+            labels = list(range(size))
+            index = LexicalIndex()
+            started = time.perf_counter()
+            for start in range(0, size, 1000):
+                index.add(labels[start:start + 1000], texts[start:start + 1000])
+            build = time.perf_counter() - started
+
+            # Queries mix frequent and rare words, drawn from the same distribution as the corpus
+            queries = [
+                ' '.join(vocabulary[word] for word in rng.choice(len(vocabulary), size=options['query_words'], p=weights))
+                for _ in range(options['queries'])
+            ]
+            dense = [rng.choice(size, size=min(depth, size), replace=False).tolist() for _ in queries]
+            for query in queries:  # Steady state: postings are weighted once per term after each change
+                index.search(query, depth)
+
+            search, fusion = np.empty(len(queries)), np.empty(len(queries))
+            for i, query in enumerate(queries):
+                t0 = time.perf_counter()
+                lexical = index.search(query, depth)
+                t1 = time.perf_counter()
+                reciprocal_rank_fusion([dense[i], lexical], limit=3)
+                search[i], fusion[i] = t1 - t0, time.perf_counter() - t1
+
+            self.stdout.write(
+                f'  {size:>10,}{build:>10.1f}{np.percentile(search, 50) * 1000:>13.3f}'
+                f'{np.percentile(search, 99) * 1000:>13.3f}{np.percentile(fusion, 50) * 1000:>15.3f}'
+                f'{np.percentile(fusion, 99) * 1000:>15.3f}'
+            )
@@ -0,0 +1,148 @@
+"""
+Management command to benchmark email delivery through the outbox.
+
+Starts a local SMTP stand-in that accepts everything and waits
+``--connect-delay`` seconds per new connection (the TLS handshake and login
+of a real server), then sends ``--emails`` emails twice: with one
+``send_mail`` call each, as the per-signup jobs did, and through
+``drain_outbox``, which reuses one connection. Queued rows are deleted
+afterwards.
+"""
+import socketserver
+import threading
+import time
+
+from django.core.mail import send_mail
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from api.models import OutboundEmail
+from tasks.outbox import drain_outbox, queue_email
+
+SUBJECT_PREFIX = '[benchmark-outbox]'
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        sink = self.server
+        time.sleep(sink.connect_delay)
+        with sink.lock:
+            sink.connections += 1
+        self.reply('220 localhost SMTP sink')
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command[:4].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 localhost')
+            elif verb == 'MAIL':
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                address = command.split(':', 1)[1].strip().strip('<>')
+                if address in sink.reject:
+                    self.reply('550 No such user')
+                else:
+                    recipients.append(address)
+                    self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                with sink.lock:
+                    sink.messages.extend(recipients)
+                self.reply('250 OK')
+            elif verb in ('RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """
+    Minimal local SMTP server for tests and benchmarks.
+
+    Accepts every message (except for addresses in ``reject``) and records
+    how many connections were opened and who each message was delivered to.
+    Use as a context manager; ``settings()`` points Django's SMTP backend at it.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, connect_delay=0.0, reject=()):
+        super().__init__(('127.0.0.1', 0), _SMTPHandler)
+        self.connect_delay = connect_delay
+        self.reject = set(reject)
+        self.connections = 0
+        self.messages = []
+        self.lock = threading.Lock()
+
+    def settings(self):
+        return override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=self.server_address[1],
+            EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER='',
+            EMAIL_HOST_PASSWORD='',
+        )
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+class Command(BaseCommand):
+    help = 'Compare per-email send_mail() with draining the outbox over one SMTP connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--emails', type=int, default=500)
+        parser.add_argument('--connect-delay', type=float, default=0.05,
+                            help='Seconds the stand-in server takes to accept a connection')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Emails claimed per batch (default: EMAIL_OUTBOX_BATCH_SIZE)')
+
+    def handle(self, *args, **options):
+        if options['emails'] < 1:
+            raise CommandError('--emails must be positive')
+        count = options['emails']
+        recipients = [f'user{i}@example.com' for i in range(count)]
+
+        with SMTPSink(connect_delay=options['connect_delay']) as sink, sink.settings():
+            started = time.perf_counter()
+            for address in recipients:
+                send_mail(f'{SUBJECT_PREFIX} Verify', 'Body', 'noreply@example.com', [address])
+            direct = time.perf_counter() - started
+            direct_connections = sink.connections
+
+            OutboundEmail.objects.filter(subject__startswith=SUBJECT_PREFIX).delete()
+            for address in recipients:
+                queue_email(address, f'{SUBJECT_PREFIX} Verify', 'Body', 'noreply@example.com')
+            sink.connections = 0
+            try:
+                started = time.perf_counter()
+                stats = drain_outbox(batch_size=options['batch_size'])
+                drained = time.perf_counter() - started
+            finally:
+                OutboundEmail.objects.filter(subject__startswith=SUBJECT_PREFIX).delete()
+
+        self.stdout.write(f"{count} emails, {options['connect_delay'] * 1000:.0f}ms per new SMTP connection")
+        self.stdout.write(f"  {'delivery':<22}{'seconds':>9}{'emails/s':>10}{'connections':>13}")
+        self.stdout.write(f"  {'send_mail() each':<22}{direct:>9.2f}{count / direct:>10.0f}{direct_connections:>13}")
+        self.stdout.write(
+            f"  {'outbox drain':<22}{drained:>9.2f}{stats['sent'] / drained:>10.0f}{sink.connections:>13}"
+        )
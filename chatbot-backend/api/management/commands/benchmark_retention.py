@@ -0,0 +1,172 @@
+"""
+Management command to benchmark the chat history retention job.
+
+Seeds a synthetic message table (5M rows by default) dated in the year 2000,
+runs ``cleanup_old_chat_history`` with a cutoff halfway through it and
+reports rows/s, duration and the longest delete transaction. While the job
+runs, a probe thread keeps writing chat messages and records how long each
+write took, which is what users notice when the table is locked.
+
+``--compare`` re-seeds the table and times the previous approach (one
+``delete()`` of every old message) under the same probe. Only rows created
+by this command are old enough to be deleted; they are removed afterwards.
+"""
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.db.models import F
+
+from api.models import ChatMessage, ChatSession, User
+from tasks.scheduler import cleanup_old_chat_history, delete_in_batches
+
+USERNAME = 'benchmark-retention'
+EPOCH = datetime(2000, 1, 1, tzinfo=dt_timezone.utc)
+SPAN = timedelta(days=60)
+
+
+class WriteProbe(threading.Thread):
+    """Adds a message to a session every ``interval`` seconds and records each write's latency."""
+
+    def __init__(self, session, interval=0.05):
+        super().__init__(daemon=True)
+        self.session = session
+        self.interval = interval
+        self.latencies = []
+        self.errors = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        try:
+            while not self._stop_event.is_set():
+                started = time.perf_counter()
+                try:
+                    self.session.add_message('user', 'probe')
+                except Exception:
+                    self.errors += 1  # e.g. "database is locked" after the lock timeout
+                self.latencies.append(time.perf_counter() - started)
+                self._stop_event.wait(self.interval)
+        finally:
+            connections.close_all()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the batched chat history cleanup on a seeded message table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=5_000_000)
+        parser.add_argument('--per-session', type=int, default=100, help='Messages per seeded session')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Rows per delete transaction (default: CHAT_CLEANUP_BATCH_SIZE)')
+        parser.add_argument('--pause', type=float, default=None,
+                            help='Seconds between batches (default: CHAT_CLEANUP_BATCH_PAUSE)')
+        parser.add_argument('--compare', action='store_true',
+                            help='Also time the previous single delete() on a re-seeded table')
+
+    def handle(self, *args, **options):
+        if options['messages'] < 1 or options['per_session'] < 1:
+            raise CommandError('--messages and --per-session must be positive')
+        batch_size = options['batch_size'] or getattr(settings, 'CHAT_CLEANUP_BATCH_SIZE', 5000)
+        pause = options['pause'] if options['pause'] is not None else getattr(settings, 'CHAT_CLEANUP_BATCH_PAUSE', 0.1)
+        cutoff = EPOCH + SPAN / 2
+
+        User.objects.filter(username=USERNAME).delete()
+        user = User.objects.create_user(username=USERNAME, email=f'{USERNAME}@example.com')
+        probe_session = ChatSession.objects.create(user=user, title='Probe')
+        try:
+            self.stdout.write(f"Batched cleanup (batch size {batch_size}, pause {pause}s)")
+            self._seed(user, options['messages'], options['per_session'])
+            stats, probe = self._probe(probe_session, lambda: cleanup_old_chat_history(cutoff, batch_size, pause))
+            rows, seconds, longest = stats['messages']
+            self._report(rows, seconds, longest, probe)
+
+            if options['compare']:
+                self.stdout.write('Single delete() (previous implementation)')
+                self._clear(user, probe_session)
+                self._seed(user, options['messages'], options['per_session'])
+
+                def single_delete():
+                    started = time.monotonic()
+                    rows = ChatMessage.objects.filter(created_at__lt=cutoff).delete()[0]
+                    seconds = time.monotonic() - started
+                    return rows, seconds
+
+                (rows, seconds), probe = self._probe(probe_session, single_delete)
+                self._report(rows, seconds, seconds, probe)
+        finally:
+            self._clear(user, probe_session)
+            user.delete()
+
+    def _seed(self, user, count, per_session):
+        """Insert ``count`` messages dated over SPAN, written session by session like real chats."""
+        started = time.monotonic()
+        sessions = -(-count // per_session)
+        step = SPAN / count
+        is_active = [i % 4 != 0 for i in range(sessions)]  # A quarter of the sessions are closed
+        with transaction.atomic():
+            ChatSession.objects.bulk_create(
+                (ChatSession(user=user, title=f'Session {i}', is_active=is_active[i]) for i in range(sessions)),
+                batch_size=5000,
+            )
+        session_ids = list(
+            ChatSession.objects.filter(user=user, title__startswith='Session ').order_by('pk').values_list('pk', flat=True)
+        )
+
+        adapt = connection.ops.adapt_datetimefield_value
+        table = ChatMessage._meta.db_table
+        sql = f'INSERT INTO {table} (session_id, role, content, retrieved_docs, created_at) VALUES (%s, %s, %s, %s, %s)'
+        with connection.cursor() as cursor:
+            for start in range(0, count, 50000):
+                rows = []
+                for i in range(start, min(start + 50000, count)):
+                    session, position = divmod(i, per_session)
+                    rows.append((
+                        session_ids[session],
+                        'user' if position % 2 == 0 else 'assistant',
+                        f'Message {position}: ' + 'lorem ipsum dolor sit amet ' * (2 if position % 2 == 0 else 8),
+                        None,
+                        adapt(EPOCH + step * i),
+                    ))
+                with transaction.atomic():
+                    cursor.executemany(sql, rows)
+
+        # Sessions were last updated by their last message, as with add_message()
+        seeded = ChatSession.objects.filter(user=user, title__startswith='Session ')
+        seeded.refresh_message_stats()
+        seeded.update(updated_at=F('last_message_at'))
+        self.stdout.write(f'  seeded {count:,} messages in {sessions:,} sessions in {time.monotonic() - started:.1f}s')
+
+    @staticmethod
+    def _probe(session, job):
+        probe = WriteProbe(session)
+        probe.start()
+        try:
+            result = job()
+        finally:
+            probe.stop()
+        return result, probe
+
+    def _report(self, rows, seconds, longest, probe):
+        latencies = np.array(probe.latencies or [0.0]) * 1000
+        self.stdout.write(
+            f'  deleted {rows:,} messages in {seconds:.1f}s ({rows / seconds if seconds else 0:,.0f} rows/s), '
+            f'longest transaction {longest * 1000:,.0f}ms'
+        )
+        self.stdout.write(
+            f'  concurrent writes: {len(probe.latencies)} (errors {probe.errors}), '
+            f'p50 {np.percentile(latencies, 50):.1f}ms p99 {np.percentile(latencies, 99):.1f}ms '
+            f'max {latencies.max():.1f}ms'
+        )
+
+    @staticmethod
+    def _clear(user, probe_session):
+        # Whole sessions per batch, so their messages go by the session index
+        delete_in_batches(ChatSession.objects.filter(user=user).exclude(pk=probe_session.pk), 100)
@@ -0,0 +1,90 @@
+"""
+Management command to benchmark GET /api/chat-history/<id>/ on a long session.
+
+Compares the previous response (every message nested, plus a count query)
+with the paginated one (latest page only) on a synthetic session, reporting
+payload size, queries and p50/p99 latency. The session is deleted afterwards.
+"""
+import json
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.models import ChatMessage, ChatSession, User
+from api.serializers import ChatSessionSerializer
+from api.views import ChatSessionDetailView
+
+USERNAME = 'benchmark-session-detail'
+
+
+class Command(BaseCommand):
+    help = 'Compare payload size and latency of full vs paginated session detail responses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=5000)
+        parser.add_argument('--limit', type=int, default=50, help='Page size for the paginated view')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        if options['messages'] < 1 or options['repeat'] < 1 or not 1 <= options['limit'] <= 200:
+            raise CommandError('--messages and --repeat must be positive, --limit between 1 and 200')
+
+        user, session = self._create_session(options['messages'])
+        try:
+            factory = APIRequestFactory()
+            view = ChatSessionDetailView.as_view()
+
+            def full():
+                return JSONRenderer().render(ChatSessionSerializer(ChatSession.objects.get(pk=session.pk)).data)
+
+            def paginated():
+                request = factory.get(f'/api/chat-history/{session.pk}/', {'limit': options['limit']})
+                force_authenticate(request, user)
+                response = view(request, session_id=session.pk)
+                return response.render().content
+
+            self.stdout.write(f"Session with {options['messages']:,} messages, {options['repeat']} requests each")
+            self.stdout.write(f"  {'response':<22}{'payload KB':>12}{'queries':>9}{'p50 ms':>10}{'p99 ms':>10}")
+            for label, render in [('all messages', full), (f'latest {options["limit"]}', paginated)]:
+                self._report(label, render, options['repeat'])
+        finally:
+            user.delete()  # Cascades to the session and its messages
+
+    def _create_session(self, count):
+        User.objects.filter(username=USERNAME).delete()
+        with transaction.atomic():
+            user = User.objects.create_user(username=USERNAME, email=f'{USERNAME}@example.com')
+            session = ChatSession.objects.create(user=user, title='Benchmark session')
+            ChatMessage.objects.bulk_create(
+                (
+                    ChatMessage(
+                        session=session,
+                        role='user' if i % 2 == 0 else 'assistant',
+                        content=f'Message {i}: ' + 'lorem ipsum dolor sit amet ' * (4 if i % 2 == 0 else 24),
+                        retrieved_docs=None if i % 2 == 0 else [{'title': 'Course guide', 'score': 0.8}],
+                    )
+                    for i in range(count)
+                ),
+                batch_size=1000,
+            )
+            ChatSession.objects.filter(pk=session.pk).refresh_message_stats()
+        return user, session
+
+    def _report(self, label, render, repeat):
+        with CaptureQueriesContext(connection) as queries:
+            payload = render()
+        json.loads(payload)  # Sanity check
+        latencies = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            render()
+            latencies.append(time.perf_counter() - started)
+        self.stdout.write(
+            f'  {label:<22}{len(payload) / 1024:>12.1f}{len(queries):>9}'
+            f'{np.percentile(latencies, 50) * 1000:>10.1f}{np.percentile(latencies, 99) * 1000:>10.1f}'
+        )
@@ -0,0 +1,71 @@
+"""
+Management command to measure RAG pipeline startup time and memory.
+
+Each mode runs ``get_rag_pipeline()`` in a fresh interpreter so the numbers
+match what a newly forked worker pays: rebuilding the index from the
+database versus loading the current on-disk snapshot.
+"""
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+PROBE = '''
+import json, os, time, django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'chatbot_project.settings')
+django.setup()
+from rag.pipeline import current_rss_mb, get_rag_pipeline
+baseline = current_rss_mb()
+started = time.perf_counter()
+rag = get_rag_pipeline()
+print(json.dumps({
+    'seconds': time.perf_counter() - started,
+    'rss_mb': current_rss_mb(),
+    'rss_delta_mb': current_rss_mb() - baseline,
+    'documents': len(rag.documents),
+    'mmap': rag.index_path is not None,
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Compare pipeline startup time and RSS: full rebuild vs on-disk index snapshot'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3, help='Runs per mode (best is reported)')
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1:
+            raise CommandError('--runs must be at least 1')
+
+        modes = [
+            ('rebuild', {'RAG_INDEX_SNAPSHOTS': 'False'}),
+            ('snapshot', {'RAG_INDEX_SNAPSHOTS': 'True', 'RAG_INDEX_MMAP': 'False'}),
+            ('snapshot+mmap', {'RAG_INDEX_SNAPSHOTS': 'True', 'RAG_INDEX_MMAP': 'True'}),
+        ]
+        self.stdout.write(f"{'mode':<15}{'startup':>10}{'RSS':>10}{'RSS delta':>12}{'docs':>8}")
+        for label, env in modes:
+            runs = [self._probe(env) for _ in range(options['runs'])]
+            best = min(runs, key=lambda r: r['seconds'])
+            if label.endswith('mmap') and not best['mmap']:
+                label += ' (n/a)'
+            self.stdout.write(
+                f"{label:<15}{best['seconds']:>9.2f}s{best['rss_mb']:>8.0f}MB"
+                f"{best['rss_delta_mb']:>10.0f}MB{best['documents']:>8}"
+            )
+
+    def _probe(self, env):
+        result = subprocess.run(
+            [sys.executable, '-c', PROBE],
+            cwd=settings.BASE_DIR,
+            env={**os.environ, **env},
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError(result.stderr.strip().splitlines()[-1] if result.stderr else 'probe failed')
+        return json.loads(result.stdout.strip().splitlines()[-1])
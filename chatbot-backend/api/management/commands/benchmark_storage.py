@@ -0,0 +1,100 @@
+"""
+Management command to benchmark compressed vector storage.
+
+Builds one index type with every combination of storage (float32, sq8, pq)
+and PCA dimension, and reports bytes per vector, p50/p99 single-query
+latency, recall@k against exact search and the recall lost relative to the
+uncompressed float32 index of the same type.
+"""
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from rag.index import INDEX_TYPES, STORAGE_TYPES, create_index, factory_string, index_params, train_index
+
+from .benchmark_ann import index_bytes, synthetic_corpus
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+
+class Command(BaseCommand):
+    help = 'Report memory per vector, latency and recall loss of int8/PQ/PCA index storage vs float32'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=100000, help='Corpus size')
+        parser.add_argument('--type', default='flat', choices=INDEX_TYPES, help='Index type')
+        parser.add_argument('--storages', default=','.join(STORAGE_TYPES),
+                            help='Comma-separated storage types')
+        parser.add_argument('--pca-dims', default='0,128', help='Comma-separated PCA dimensions (0 = no PCA)')
+        parser.add_argument('--dim', type=int, default=384)
+        parser.add_argument('--intrinsic-dim', type=int, default=64,
+                            help='Directions the synthetic cluster centres span')
+        parser.add_argument('--queries', type=int, default=500)
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if faiss is None:
+            raise CommandError('faiss is not installed')
+        storages = [s for s in options['storages'].split(',') if s]
+        unknown = set(storages) - set(STORAGE_TYPES)
+        if unknown:
+            raise CommandError(f"Unknown storage types: {', '.join(sorted(unknown))}")
+        pca_dims = [int(d) for d in options['pca_dims'].split(',') if d]
+        if options['size'] < 1 or options['queries'] < 1 or options['k'] < 1:
+            raise CommandError('--size, --queries and --k must be positive')
+        if any(not 0 <= d < options['dim'] for d in pca_dims):
+            raise CommandError('--pca-dims must be between 0 and --dim')
+
+        k, size = options['k'], options['size']
+        rng = np.random.default_rng(options['seed'])
+        vectors = synthetic_corpus(size + options['queries'], options['dim'], rng,
+                                   intrinsic_dim=options['intrinsic_dim'] or None)
+        corpus, queries = vectors[:size], vectors[size:]
+
+        exact = faiss.IndexFlatL2(options['dim'])
+        exact.add(corpus)
+        _, truth = exact.search(queries, k)
+        del exact
+
+        self.stdout.write(f"{options['type']} index over {size:,} x {options['dim']} vectors")
+        self.stdout.write(
+            f"  {'index':<28}{'B/vector':>10}{'p50 ms':>10}{'p99 ms':>10}"
+            f"{'recall@' + str(k):>11}{'loss':>8}{'build s':>9}"
+        )
+        baseline = None
+        for pca_dim in pca_dims:
+            for storage in storages:
+                params = index_params({'type': options['type'], 'storage': storage, 'pca_dim': pca_dim})
+                recall, latencies, per_vector, build = self._run(params, corpus, queries, truth, k)
+                if baseline is None and storage == 'float32' and not pca_dim:
+                    baseline = recall
+                loss = f'{baseline - recall:.3f}' if baseline is not None else '-'
+                self.stdout.write(
+                    f'  {factory_string(params):<28}{per_vector:>10.0f}{np.percentile(latencies, 50) * 1000:>10.3f}'
+                    f'{np.percentile(latencies, 99) * 1000:>10.3f}{recall:>11.3f}{loss:>8}{build:>9.1f}'
+                )
+
+    @staticmethod
+    def _run(params, corpus, queries, truth, k):
+        """Build and query one index: recall@k, per-query latencies (s), bytes per vector, build time (s)."""
+        started = time.perf_counter()
+        index = train_index(create_index(corpus.shape[1], params), corpus, params)
+        for start in range(0, len(corpus), 100000):
+            index.add_with_ids(corpus[start:start + 100000], np.arange(start, min(start + 100000, len(corpus))))
+        build = time.perf_counter() - started
+
+        latencies = np.empty(len(queries))
+        found = np.empty((len(queries), k), dtype=np.int64)
+        for i in range(len(queries)):
+            t0 = time.perf_counter()
+            _, ids = index.search(queries[i:i + 1], k)
+            latencies[i] = time.perf_counter() - t0
+            found[i] = ids[0]
+
+        recall = float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)]))
+        return recall, latencies, index_bytes(index) / len(corpus), build
@@ -0,0 +1,59 @@
+"""
+Management command to send queued emails from the outbox.
+
+Run it as its own long-lived process next to gunicorn (see the README
+section "Email Outbox"): web workers only queue emails, and the in-process
+scheduler that also drains the outbox runs under ``runserver`` only. With
+``--once`` it drains the due emails and exits, for cron-style scheduling.
+Several drain processes may run at once; claims never overlap.
+"""
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from tasks.outbox import drain_outbox
+
+
+class Command(BaseCommand):
+    help = 'Send due emails from the outbox, once or continuously as a worker process'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the due emails and exit')
+        parser.add_argument('--interval', type=float, default=None,
+                            help='Seconds between drain runs (defaults to EMAIL_OUTBOX_INTERVAL)')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Emails claimed per batch (defaults to EMAIL_OUTBOX_BATCH_SIZE)')
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        if interval is None:
+            interval = getattr(settings, 'EMAIL_OUTBOX_INTERVAL', 5)
+        if interval <= 0:
+            raise CommandError('--interval must be positive')
+        if options['batch_size'] is not None and options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        if options['once']:
+            stats = drain_outbox(options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f"{stats['sent']} sent, {stats['retrying']} to retry, {stats['failed']} failed"
+            ))
+            return
+
+        stop = threading.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: stop.set())
+        self.stdout.write(self.style.SUCCESS(f'Draining the email outbox every {interval:g}s'))
+        while not stop.is_set():
+            close_old_connections()  # Reconnect after the database dropped an idle connection
+            try:
+                drain_outbox(options['batch_size'])
+            except Exception as e:
+                # Keep the worker alive through database or mail outages; claimed emails expire and are retried
+                print(f"[Email] Outbox drain failed: {e}")
+            stop.wait(interval)
+        self.stdout.write('Stopped draining the email outbox')
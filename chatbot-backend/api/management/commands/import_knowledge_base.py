@@ -0,0 +1,82 @@
+"""
+Management command to bulk-import documents or FAQs from JSON Lines or CSV.
+
+The file is streamed in batches (see ``api.ingest``): rows are inserted
+with ``bulk_create`` and their embeddings computed and stored in batches,
+so web workers load them from the database without re-encoding. The command
+keeps no index of its own; it retires the current index snapshot instead,
+so workers started afterwards rebuild from the stored embeddings. With
+RAG_SHARED_MODE=sidecar the rows are added to the sidecar's live index.
+"""
+import sys
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.ingest import IMPORT_FORMATS, IMPORT_SOURCES, KnowledgeBaseImporter, read_records
+from rag.pipeline import RAGPipeline, get_rag_pipeline
+from rag.snapshot import invalidate_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Import documents or FAQs from a JSONL or CSV file, embedding and indexing them in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="JSONL or CSV file ('-' reads standard input)")
+        parser.add_argument('--type', dest='doc_type', choices=sorted(IMPORT_SOURCES), default='document',
+                            help='Kind of rows to import')
+        parser.add_argument('--format', choices=IMPORT_FORMATS, default=None,
+                            help='Input format (defaults to csv for .csv files, else jsonl)')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Rows per transaction (defaults to RAG_IMPORT_BATCH_SIZE)')
+        parser.add_argument('--no-embed', action='store_true',
+                            help='Only insert the rows; they are encoded at the next index load')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] is not None and options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+
+        sidecar = getattr(settings, 'RAG_SHARED_MODE', '') == 'sidecar'
+        rag = None
+        if not options['no_embed']:
+            # Outside sidecar mode the rows are only embedded: indexing them here would
+            # hold every vector and the keyword index in memory, only to throw them away
+            rag = get_rag_pipeline() if sidecar else RAGPipeline()
+            if not rag._can_embed():
+                self.stderr.write('Embedding model / FAISS are not available; rows are encoded at the next index load')
+                rag = None
+
+        try:
+            source = nullcontext(sys.stdin) if path == '-' else open(path, newline='', encoding='utf-8')
+        except OSError as e:
+            raise CommandError(f'Cannot read {path}: {e}')
+
+        importer = KnowledgeBaseImporter(options['doc_type'], rag=rag, batch_size=options['batch_size'],
+                                         progress=self._report, index=sidecar)
+        with source as lines:
+            stats = importer.run(read_records(lines, fmt))
+
+        if stats['created'] and not sidecar:
+            version = invalidate_snapshot()
+            if version is not None:
+                self.stdout.write(f'Retired index snapshot v{version}; run build_index to write a new one')
+        elif stats['created'] and rag is None:
+            get_rag_pipeline().load_documents_from_db()  # The sidecar reloads and encodes the new rows
+
+        for error in stats['errors'][:10]:
+            self.stderr.write(f"  line {error['line']}: {error['errors']}")
+        if stats['failed'] > 10:
+            self.stderr.write(f"  ... {stats['failed'] - 10} more invalid rows")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {stats['created']} of {stats['rows']} rows ({stats['indexed']} embedded, "
+            f"{stats['failed']} invalid) in {stats['seconds']:.1f}s, {stats['rows_per_sec']:.0f} rows/sec"
+        ))
+
+    def _report(self, stats):
+        self.stdout.write(
+            f"  {stats['rows']:>9,} rows  {stats['created']:>9,} created  {stats['failed']:>6,} invalid  "
+            f"{stats['seconds']:7.1f}s  {stats['rows_per_sec']:8.1f} rows/sec"
+        )
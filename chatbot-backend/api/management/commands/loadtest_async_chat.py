@@ -0,0 +1,113 @@
+"""
+Management command to load-test the async chat endpoint in one process.
+
+Requests go through Django's ASGI handler in-process (no network), and
+Gemini is replaced by a stub that sleeps for ``--llm-latency`` seconds, so
+the run shows how many slow LLM calls a single event loop keeps in flight.
+"""
+import asyncio
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, override_settings
+from django.urls import reverse
+
+from api.models import ChatSession
+from rag import pipeline as rag_pipeline
+
+TITLE_PREFIX = '[loadtest]'
+
+
+class SlowLLM:
+    """Gemini stand-in with a fixed generation latency."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    async def generate_content_async(self, prompt):
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+        return _Reply('This is a stubbed answer.')
+
+    def generate_content(self, prompt, stream=False):
+        time.sleep(self.latency)
+        return _Reply('This is a stubbed answer.')
+
+
+class _Reply:
+    def __init__(self, text):
+        self.text = text
+
+
+class Command(BaseCommand):
+    help = 'Load-test /api/chat/async/ in-process with a stubbed, slow LLM'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=300,
+                            help='Maximum requests in flight at once')
+        parser.add_argument('--llm-latency', type=float, default=2.0,
+                            help='Seconds the stubbed LLM takes per call')
+        parser.add_argument('--sync-workers', type=int, default=4,
+                            help='Worker threads of the sync deployment to compare against')
+        parser.add_argument('--keep', action='store_true',
+                            help='Keep the chat sessions created by the run')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1 or options['sync_workers'] < 1:
+            raise CommandError('--requests, --concurrency and --sync-workers must be positive')
+
+        rag = rag_pipeline.get_rag_pipeline()
+        llm = SlowLLM(options['llm_latency'])
+        original = rag.gemini_model, rag.answer_cache.maxsize
+        rag.gemini_model = llm
+        rag.answer_cache.maxsize = 0  # Every request must reach the LLM
+        try:
+            # Outside the test runner the client's 'testserver' host is not allowed
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                latencies, wall = asyncio.run(self._run(options['requests'], options['concurrency']))
+        finally:
+            rag.gemini_model, rag.answer_cache.maxsize = original
+            if not options['keep']:
+                ChatSession.objects.filter(title__startswith=TITLE_PREFIX).delete()
+
+        sync_wall = -(-options['requests'] // options['sync_workers']) * options['llm_latency']
+        self.stdout.write(f"Requests:          {options['requests']} (concurrency {options['concurrency']})")
+        self.stdout.write(f'Peak LLM in flight: {llm.peak_in_flight}')
+        self.stdout.write(f'Wall time:         {wall:.2f}s ({options["requests"] / wall:.1f} req/s)')
+        self.stdout.write(
+            f'Latency:           p50 {np.percentile(latencies, 50):.2f}s  '
+            f'p99 {np.percentile(latencies, 99):.2f}s  max {max(latencies):.2f}s'
+        )
+        self.stdout.write(
+            f'Sync view with {options["sync_workers"]} worker threads would need >= {sync_wall:.1f}s '
+            f'for the LLM calls alone'
+        )
+
+    async def _run(self, total, concurrency):
+        client = AsyncClient()
+        url = reverse('chat-async')
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def one(i):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post(
+                    url, {'message': f'{TITLE_PREFIX} question {i}'}, content_type='application/json'
+                )
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise CommandError(f'Request {i} failed with {response.status_code}: {response.content[:200]}')
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        return latencies, time.perf_counter() - started
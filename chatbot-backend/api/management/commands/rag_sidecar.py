@@ -0,0 +1,38 @@
+"""
+Management command to run the shared embedding/search sidecar.
+
+Start it next to gunicorn and set RAG_SHARED_MODE=sidecar for the web
+workers; see the README section "Sharing the model across workers".
+"""
+import signal
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rag.pipeline import load_rag_pipeline
+from rag.sidecar import SidecarServer, sidecar_address
+
+
+class Command(BaseCommand):
+    help = 'Serve the RAG embedding model and vector index to web workers over a Unix socket'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', default=None,
+                            help='Socket path (defaults to RAG_SIDECAR_SOCKET)')
+
+    def handle(self, *args, **options):
+        rag = load_rag_pipeline()
+        if not rag._can_embed():
+            raise CommandError('Embedding model / FAISS are not available')
+
+        server = SidecarServer(rag, options['socket'] or sidecar_address())
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        self.stdout.write(self.style.SUCCESS(
+            f'RAG sidecar serving {rag.document_count()} documents on {server.address}'
+        ))
+        try:
+            server.serve_forever()
+        except (KeyboardInterrupt, SystemExit):
+            pass
+        finally:
+            server.close()
@@ -0,0 +1,38 @@
+"""
+Management command to write an on-disk snapshot of the RAG vector index.
+"""
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rag.pipeline import RAGPipeline
+from rag.snapshot import knowledge_base_state, snapshot_dir, write_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Build the RAG index from the database and write a versioned snapshot plus doc-id mapping'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', type=Path, default=None,
+                            help='Snapshot directory (defaults to RAG_INDEX_DIR)')
+        parser.add_argument('--keep', type=int, default=3,
+                            help='Number of snapshot versions to keep')
+
+    def handle(self, *args, **options):
+        if options['keep'] < 1:
+            raise CommandError('--keep must be at least 1')
+
+        rag = RAGPipeline()
+        if not rag._can_embed():
+            raise CommandError('Embedding model / FAISS are not available')
+
+        # Capture the DB state first so edits made during the build make the snapshot stale
+        state = knowledge_base_state()
+        self.stdout.write('Building index from the database...')
+        rag.load_documents_from_db()
+
+        directory = options['dir'] or snapshot_dir()
+        version = write_snapshot(rag, state, directory, keep=options['keep'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote index snapshot v{version} ({rag.index.ntotal} vectors) to {directory}'
+        ))
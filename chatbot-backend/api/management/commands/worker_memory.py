@@ -0,0 +1,77 @@
+"""
+Management command to report the memory of gunicorn workers (Linux only).
+
+RSS counts shared pages in every process that maps them, so summing it
+over workers overstates the real footprint. PSS divides each shared page
+between the processes that map it (the sum is the true total) and USS is
+memory private to the process (what killing it would free).
+"""
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+FIELDS = ('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty')
+
+
+def read_smaps_rollup(pid):
+    """Memory counters of a process in kB, from /proc/<pid>/smaps_rollup."""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            name, _, rest = line.partition(':')
+            if name in FIELDS:
+                values[name] = int(rest.split()[0])
+    return values
+
+
+def children(pid):
+    """Direct child pids, from /proc/<pid>/task/*/children."""
+    found = []
+    for task in os.listdir(f'/proc/{pid}/task'):
+        with open(f'/proc/{pid}/task/{task}/children') as f:
+            found.extend(int(child) for child in f.read().split())
+    return found
+
+
+def command_line(pid):
+    with open(f'/proc/{pid}/cmdline', 'rb') as f:
+        return f.read().replace(b'\0', b' ').decode(errors='replace').strip()
+
+
+class Command(BaseCommand):
+    help = 'Report RSS/PSS/USS of a gunicorn master and its workers (plus e.g. the RAG sidecar)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--master', type=int, help='gunicorn master pid; its workers are included')
+        parser.add_argument('--pids', default='', help='Extra comma-separated pids, e.g. the sidecar')
+
+    def handle(self, *args, **options):
+        if not os.path.exists('/proc/self/smaps_rollup'):
+            raise CommandError('/proc/<pid>/smaps_rollup is not available (Linux 4.14+ only)')
+        pids = [int(p) for p in options['pids'].split(',') if p]
+        if options['master']:
+            pids = [options['master'], *children(options['master']), *pids]
+        if not pids:
+            raise CommandError('Pass --master and/or --pids')
+
+        self.stdout.write(f"{'pid':>8}{'RSS MB':>10}{'PSS MB':>10}{'USS MB':>10}{'shared MB':>11}  command")
+        totals = dict.fromkeys(('rss', 'pss', 'uss'), 0)
+        for pid in pids:
+            try:
+                mem = read_smaps_rollup(pid)
+                cmd = command_line(pid)
+            except OSError as e:
+                raise CommandError(f'Cannot read process {pid}: {e}')
+            uss = mem['Private_Clean'] + mem['Private_Dirty']
+            shared = mem['Shared_Clean'] + mem['Shared_Dirty']
+            totals['rss'] += mem['Rss']
+            totals['pss'] += mem['Pss']
+            totals['uss'] += uss
+            self.stdout.write(
+                f"{pid:>8}{mem['Rss'] / 1024:>10.1f}{mem['Pss'] / 1024:>10.1f}{uss / 1024:>10.1f}"
+                f"{shared / 1024:>11.1f}  {cmd[:60]}"
+            )
+        self.stdout.write(
+            f"{'total':>8}{totals['rss'] / 1024:>10.1f}{totals['pss'] / 1024:>10.1f}{totals['uss'] / 1024:>10.1f}"
+            f"  (PSS total is the real footprint)"
+        )
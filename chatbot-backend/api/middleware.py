@@ -0,0 +1,40 @@
+"""
+Custom middleware for the API.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise that can sit in an async middleware chain.
+
+    WhiteNoise's own middleware is sync-only, which makes Django run every
+    view below it - async ones included - through a single thread under
+    ASGI, serializing concurrent requests. Static file lookups are in-memory
+    (or a stat() with autorefresh in DEBUG), so they are done inline and
+    other requests are passed on to the async handler.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None):
+        super().__init__(get_response)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
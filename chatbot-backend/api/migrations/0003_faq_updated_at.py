@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 17:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_document_faq_embedding_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='faq',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.30 on 2026-10-17 18:09
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Left
+
+
+def backfill_message_stats(apps, schema_editor):
+    """Same as ChatSession.objects.refresh_message_stats(), on the historical models."""
+    ChatSession = apps.get_model('api', 'ChatSession')
+    ChatMessage = apps.get_model('api', 'ChatMessage')
+    messages = ChatMessage.objects.filter(session=OuterRef('pk'))
+    latest = messages.order_by('-created_at', '-id')
+    ChatSession.objects.update(
+        message_count=Coalesce(
+            Subquery(messages.order_by().values('session').annotate(n=Count('*')).values('n')),
+            0,
+        ),
+        last_message_at=Subquery(latest.values('created_at')[:1]),
+        last_message_preview=Coalesce(
+            Subquery(latest.annotate(preview=Left('content', 101)).values('preview')[:1]),
+            Value(''),
+        ),
+        last_message_role=Coalesce(Subquery(latest.values('role')[:1]), Value('')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_faq_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatsession',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='last_message_preview',
+            field=models.CharField(blank=True, max_length=101),
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='last_message_role',
+            field=models.CharField(blank=True, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='message_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['session', 'created_at'], name='chatmessage_session_created'),
+        ),
+        migrations.RunPython(backfill_message_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-17 18:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_chatsession_message_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['created_at'], name='chatmessage_created'),
+        ),
+        migrations.AddIndex(
+            model_name='chatsession',
+            index=models.Index(fields=['user', '-updated_at'], name='chatsession_user_updated'),
+        ),
+        migrations.AddIndex(
+            model_name='chatsession',
+            index=models.Index(fields=['updated_at', 'is_active'], name='chatsession_updated_active'),
+        ),
+    ]
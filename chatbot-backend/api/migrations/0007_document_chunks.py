@@ -0,0 +1,51 @@
+# Generated by Django 4.2.30 on 2026-10-17 18:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_outbound_email'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='document',
+            name='content_hash',
+        ),
+        migrations.RemoveField(
+            model_name='document',
+            name='embedding',
+        ),
+        migrations.RemoveField(
+            model_name='document',
+            name='embedding_dim',
+        ),
+        migrations.RemoveField(
+            model_name='document',
+            name='embedding_model',
+        ),
+        migrations.CreateModel(
+            name='DocumentChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ordinal', models.PositiveIntegerField()),
+                ('start', models.PositiveIntegerField()),
+                ('end', models.PositiveIntegerField()),
+                ('embedding', models.BinaryField(blank=True, null=True)),
+                ('embedding_model', models.CharField(blank=True, max_length=100)),
+                ('embedding_dim', models.PositiveIntegerField(blank=True, null=True)),
+                ('content_hash', models.CharField(blank=True, max_length=64)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='api.document')),
+            ],
+            options={
+                'ordering': ['document', 'ordinal'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='documentchunk',
+            constraint=models.UniqueConstraint(fields=('document', 'ordinal'), name='documentchunk_document_ordinal'),
+        ),
+    ]
@@ -1,7 +1,10 @@
 """
 Database models for the chatbot application.
 """
-from django.db import models
+from asgiref.sync import sync_to_async
+from django.db import models, transaction
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, Left
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 
@@ -21,6 +24,33 @@ class User(AbstractUser):
         return self.email
 
 
+PREVIEW_LENGTH = 100  # Characters of the last message shown when listing sessions
+
+
+class ChatSessionQuerySet(models.QuerySet):
+
+    def refresh_message_stats(self):
+        """
+        Recompute ``message_count`` and the ``last_message_*`` fields from the
+        messages table, e.g. after bulk inserts or deletes that bypassed
+        :meth:`ChatSession.add_message`. Returns the number of sessions updated.
+        """
+        messages = ChatMessage.objects.filter(session=OuterRef('pk'))
+        latest = messages.order_by('-created_at', '-id')
+        return self.update(
+            message_count=Coalesce(
+                Subquery(messages.order_by().values('session').annotate(n=Count('*')).values('n')),
+                0,
+            ),
+            last_message_at=Subquery(latest.values('created_at')[:1]),
+            last_message_preview=Coalesce(
+                Subquery(latest.annotate(preview=Left('content', PREVIEW_LENGTH + 1)).values('preview')[:1]),
+                Value(''),
+            ),
+            last_message_role=Coalesce(Subquery(latest.values('role')[:1]), Value('')),
+        )
+
+
 class ChatSession(models.Model):
     """Represents a chat session/conversation. User is optional for anonymous chats."""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_sessions', null=True, blank=True)
@@ -28,14 +58,64 @@ class ChatSession(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
+    # Denormalized from the messages, kept current by add_message()
+    message_count = models.PositiveIntegerField(default=0)
+    last_message_at = models.DateTimeField(blank=True, null=True)
+    last_message_preview = models.CharField(max_length=PREVIEW_LENGTH + 1, blank=True)  # One extra char flags truncation
+    last_message_role = models.CharField(max_length=10, blank=True)
+
+    objects = ChatSessionQuerySet.as_manager()
 
     class Meta:
         ordering = ['-updated_at']
+        indexes = [
+            models.Index(fields=['user', '-updated_at'], name='chatsession_user_updated'),  # Chat history list
+            models.Index(fields=['updated_at', 'is_active'], name='chatsession_updated_active'),  # Retention
+        ]
 
     def __str__(self):
         user_email = self.user.email if self.user else 'Anonymous'
         return f"{user_email} - {self.title}"
 
+    def add_message(self, role, content, **fields) -> 'ChatMessage':
+        """
+        Save a message and update this session's counters in one transaction.
+
+        The counters are changed with a single UPDATE using F() expressions,
+        so concurrent writers to the same session never lose an increment,
+        and the ``last_message_*`` fields only move forward in time. Only the
+        database row is updated; reload the instance to read the new values.
+        """
+        with transaction.atomic():
+            message = ChatMessage.objects.create(session=self, role=role, content=content, **fields)
+            is_latest = Q(last_message_at__isnull=True) | Q(last_message_at__lte=message.created_at)
+
+            def latest(field, value):
+                return Case(When(is_latest, then=Value(value)), default=F(field))
+
+            ChatSession.objects.filter(pk=self.pk).update(
+                message_count=F('message_count') + 1,
+                last_message_at=latest('last_message_at', message.created_at),
+                last_message_preview=latest('last_message_preview', content[:PREVIEW_LENGTH + 1]),
+                last_message_role=latest('last_message_role', role),
+                updated_at=timezone.now(),
+            )
+        return message
+
+    async def aadd_message(self, role, content, **fields) -> 'ChatMessage':
+        return await sync_to_async(self.add_message)(role, content, **fields)
+
+    def recent_messages(self, limit, exclude=None):
+        """
+        ``role``/``content`` of the latest ``limit`` messages, *newest first*
+        (reverse the result for chronological order). Served by the
+        (session, created_at) index without reading older history.
+        """
+        messages = self.messages.order_by('-created_at', '-id')
+        if exclude is not None:
+            messages = messages.exclude(pk=exclude)
+        return messages.values('role', 'content')[:limit]
+
 
 class ChatMessage(models.Model):
     """Stores individual chat messages."""
@@ -52,17 +132,20 @@ class ChatMessage(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['session', 'created_at'], name='chatmessage_session_created'),  # Chat history
+            models.Index(fields=['created_at'], name='chatmessage_created'),  # Retention
+        ]
 
     def __str__(self):
         return f"{self.role}: {self.content[:50]}..."
 
 
 class Document(models.Model):
-    """Documents for the RAG knowledge base."""
+    """Documents for the RAG knowledge base, embedded per chunk (see DocumentChunk)."""
     title = models.CharField(max_length=255)
     content = models.TextField()
     category = models.CharField(max_length=100, blank=True)
-    embedding = models.BinaryField(blank=True, null=True)  # Store FAISS embedding
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -70,13 +153,69 @@ class Document(models.Model):
         return self.title
 
 
+class DocumentChunk(models.Model):
+    """A passage of a Document's content, indexed with its own embedding."""
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='chunks')
+    ordinal = models.PositiveIntegerField()  # Position within the document
+    start = models.PositiveIntegerField()  # Character offsets into Document.content
+    end = models.PositiveIntegerField()
+    embedding = models.BinaryField(blank=True, null=True)  # Store FAISS embedding
+    embedding_model = models.CharField(max_length=100, blank=True)  # Model that produced `embedding`
+    embedding_dim = models.PositiveIntegerField(blank=True, null=True)
+    content_hash = models.CharField(max_length=64, blank=True)  # SHA-256 of the embedded text
+
+    class Meta:
+        ordering = ['document', 'ordinal']
+        constraints = [
+            models.UniqueConstraint(fields=['document', 'ordinal'], name='documentchunk_document_ordinal'),
+        ]
+
+    def __str__(self):
+        return f"{self.document_id}#{self.ordinal} [{self.start}:{self.end}]"
+
+
 class FAQ(models.Model):
     """Frequently Asked Questions for quick retrieval."""
     question = models.TextField()
     answer = models.TextField()
     category = models.CharField(max_length=100, blank=True)
     embedding = models.BinaryField(blank=True, null=True)
+    embedding_model = models.CharField(max_length=100, blank=True)
+    embedding_dim = models.PositiveIntegerField(blank=True, null=True)
+    content_hash = models.CharField(max_length=64, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.question[:50]
+
+
+class OutboundEmail(models.Model):
+    """An email in the outbox; ``tasks.outbox.drain_outbox`` sends it and records the outcome."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    to_email = models.EmailField()
+    from_email = models.CharField(max_length=255)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)  # For 'sending', when the claim expires
+    claim_token = models.CharField(max_length=32, blank=True)  # Drain run that claimed the email
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_next_attempt'),
+        ]
+
+    def __str__(self):
+        return f"{self.to_email}: {self.subject} ({self.status})"
@@ -0,0 +1,12 @@
+"""
+Pagination classes for the chatbot API.
+"""
+from rest_framework.pagination import CursorPagination
+
+
+class ChatSessionCursorPagination(CursorPagination):
+    """Keyset pagination over a user's sessions, most recently active first."""
+    ordering = ('-updated_at', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
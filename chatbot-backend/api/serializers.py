@@ -4,7 +4,7 @@ Serializers for the chatbot API.
 from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password
 from django.contrib.auth import authenticate
-from .models import User, ChatSession, ChatMessage, Document, FAQ
+from .models import PREVIEW_LENGTH, User, ChatSession, ChatMessage, Document, FAQ
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -72,38 +72,54 @@ class ChatMessageSerializer(serializers.ModelSerializer):
 class ChatSessionSerializer(serializers.ModelSerializer):
     """Serializer for chat sessions."""
     messages = ChatMessageSerializer(many=True, read_only=True)
-    message_count = serializers.SerializerMethodField()
 
     class Meta:
         model = ChatSession
         fields = ['id', 'title', 'created_at', 'updated_at', 'is_active', 'messages', 'message_count']
-        read_only_fields = ['id', 'created_at', 'updated_at']
-
-    def get_message_count(self, obj):
-        return obj.messages.count()
+        read_only_fields = ['id', 'created_at', 'updated_at', 'message_count']
 
 
 class ChatSessionListSerializer(serializers.ModelSerializer):
-    """Lightweight serializer for listing chat sessions."""
-    message_count = serializers.SerializerMethodField()
+    """
+    Lightweight serializer for listing chat sessions.
+
+    Reads the session's denormalized ``message_count`` and ``last_message_*``
+    fields, so listing sessions never queries messages per session.
+    """
     last_message = serializers.SerializerMethodField()
 
     class Meta:
         model = ChatSession
         fields = ['id', 'title', 'created_at', 'updated_at', 'message_count', 'last_message']
 
-    def get_message_count(self, obj):
-        return obj.messages.count()
-
     def get_last_message(self, obj):
-        last_msg = obj.messages.last()
-        if last_msg:
-            return {
-                'content': last_msg.content[:100] + '...' if len(last_msg.content) > 100 else last_msg.content,
-                'role': last_msg.role,
-                'created_at': last_msg.created_at
-            }
-        return None
+        if obj.last_message_at is None:
+            return None
+        content = obj.last_message_preview
+        return {
+            'content': content[:PREVIEW_LENGTH] + '...' if len(content) > PREVIEW_LENGTH else content,
+            'role': obj.last_message_role,
+            'created_at': obj.last_message_at
+        }
+
+
+class ChatSessionDetailSerializer(ChatSessionListSerializer):
+    """Session header for the detail view; messages are paginated separately."""
+
+    class Meta(ChatSessionListSerializer.Meta):
+        fields = ['id', 'title', 'created_at', 'updated_at', 'is_active', 'message_count']
+
+
+class MessagePageSerializer(serializers.Serializer):
+    """Query parameters for paging through a session's messages."""
+    before = serializers.IntegerField(required=False, min_value=1)
+    after = serializers.IntegerField(required=False, min_value=0)
+    limit = serializers.IntegerField(required=False, default=50, min_value=1, max_value=200)
+
+    def validate(self, attrs):
+        if 'before' in attrs and 'after' in attrs:
+            raise serializers.ValidationError("Pass either 'before' or 'after', not both.")
+        return attrs
 
 
 class ChatInputSerializer(serializers.Serializer):
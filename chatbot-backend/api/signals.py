@@ -0,0 +1,75 @@
+"""
+Signal handlers for the chatbot application.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Document, FAQ
+
+
+@receiver(post_save, sender=Document)
+@receiver(post_save, sender=FAQ)
+def index_knowledge_base_entry(sender, instance, raw=False, **kwargs):
+    """
+    Add a created Document/FAQ to the vector index, or replace the entry of
+    a changed one, once the transaction commits. The embedding is stored on
+    the row as well.
+
+    Only done when this process already has the RAG pipeline loaded, so that
+    saving a row never pulls the embedding model in. Rows saved elsewhere keep
+    a stale content hash and are re-encoded on the next index load.
+    """
+    if raw:
+        return
+
+    from rag.pipeline import get_loaded_rag_pipeline
+
+    rag = get_loaded_rag_pipeline()
+    if rag is None:
+        return
+
+    def upsert():
+        try:
+            rag.upsert_instances(sender._meta.model_name, [instance])
+        except Exception as e:
+            print(f"Failed to index {sender.__name__} {instance.pk}: {e}")
+
+    transaction.on_commit(upsert)
+
+
+@receiver(post_delete, sender=Document)
+@receiver(post_delete, sender=FAQ)
+def remove_knowledge_base_entry(sender, instance, **kwargs):
+    """Remove a deleted Document/FAQ from the vector index once the transaction commits."""
+    from rag.pipeline import get_loaded_rag_pipeline
+
+    rag = get_loaded_rag_pipeline()
+    if rag is None:
+        return
+    row_id = instance.pk
+
+    def remove():
+        try:
+            rag.remove_instances(sender._meta.model_name, [row_id])
+        except Exception as e:
+            print(f"Failed to remove {sender.__name__} {row_id} from the index: {e}")
+
+    transaction.on_commit(remove)
+
+
+@receiver(post_save, sender=Document)
+@receiver(post_save, sender=FAQ)
+@receiver(post_delete, sender=Document)
+@receiver(post_delete, sender=FAQ)
+def invalidate_cached_answers(sender, raw=False, **kwargs):
+    """Answers cached by the RAG pipeline may cite the changed row."""
+    if raw:
+        return
+
+    from rag.pipeline import invalidate_answer_cache
+
+    try:
+        invalidate_answer_cache()
+    except Exception as e:
+        print(f"Failed to invalidate answer cache: {e}")
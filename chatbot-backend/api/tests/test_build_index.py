@@ -0,0 +1,117 @@
+"""
+Tests for sharded offline index builds (``rag.build`` and ``manage.py build_index``).
+"""
+import io
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from api.models import Document, DocumentChunk, FAQ
+from api.tests.test_pipeline import faiss, make_pipeline
+from rag import pipeline as rag_pipeline
+from rag import snapshot
+from rag import build as rag_build
+from rag.build import IndexOnlyPipeline, build_index, shard_ranges
+
+
+class InlinePool:
+    """Runs a spawn pool's tasks in this process, for workers that cannot load the real model."""
+
+    def __init__(self, processes, initializer=None, initargs=()):
+        self.processes = processes
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def imap(self, func, tasks):
+        return map(func, tasks)
+
+
+@unittest.skipIf(faiss is None, 'faiss is not installed')
+@override_settings(RAG_CHUNK_SIZE=200, RAG_CHUNK_OVERLAP=20)
+class BuildIndexTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(rag_pipeline, 'FAISS_AVAILABLE', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        Document.objects.bulk_create(
+            Document(title=f'Course {i}', content=f'Lesson {i} covers enrollment and quizzes. ' * (1 + i % 5))
+            for i in range(23)
+        )
+        FAQ.objects.bulk_create(FAQ(question=f'Refund {i}?', answer='Within 7 days.') for i in range(9))
+        Document.objects.filter(pk__in=Document.objects.order_by('pk').values('pk')[5:8]).delete()  # Id gaps
+
+    def test_shard_ranges_cover_every_row_once(self):
+        ranges = shard_ranges('document', 6)
+        ids = list(Document.objects.order_by('pk').values_list('pk', flat=True))
+
+        self.assertEqual(len(ranges), 4)
+        self.assertEqual([sum(lo <= pk < hi for lo, hi in ranges) for pk in ids], [1] * len(ids))
+        self.assertEqual([sum(lo <= pk < hi for pk in ids) for lo, hi in ranges], [6, 6, 6, 2])
+        self.assertEqual(shard_ranges('faq', 100), [(FAQ.objects.first().pk, FAQ.objects.last().pk + 1)])
+
+    def test_sharded_build_matches_full_load(self):
+        expected = make_pipeline()
+        expected.load_documents_from_db()
+        rag = make_pipeline()
+        rag.add_documents([{'title': 'Stale', 'content': 'gone', 'type': 'faq', 'id': 999}])
+
+        shards = build_index(rag, workers=1, shard_size=4)
+
+        self.assertEqual([s['type'] for s in shards], ['document'] * 5 + ['faq'] * 3)
+        self.assertEqual(sum(s['rows'] for s in shards), 29)
+        self.assertEqual(sum(s['entries'] for s in shards), rag.index.ntotal)
+        self.assertEqual(sum(s['encoded'] for s in shards), 0)  # Stored by the full load
+        self.assertEqual(rag.documents, expected.documents)
+        self.assertTrue(np.array_equal(faiss.vector_to_array(rag.index.id_map),
+                                       faiss.vector_to_array(expected.index.id_map)))
+        self.assertEqual(rag.retrieve('Refund 3?', top_k=2), expected.retrieve('Refund 3?', top_k=2))
+
+    def test_parallel_build_parent_loads_no_model(self):
+        expected = make_pipeline()
+        expected.load_documents_from_db()
+        rag = IndexOnlyPipeline()
+        context = mock.Mock(Pool=InlinePool)
+
+        with mock.patch.object(rag_build, '_worker_pipeline', make_pipeline()), \
+                mock.patch.object(rag_build.multiprocessing, 'get_context', return_value=context), \
+                mock.patch('django.db.connections.close_all'):
+            shards = build_index(rag, workers=3, shard_size=4)
+
+        self.assertIsNone(rag.embedding_model)
+        self.assertEqual(len(shards), 8)
+        self.assertEqual(rag.documents, expected.documents)
+        self.assertEqual(rag.lexical.search('Refund 3', 2), expected.lexical.search('Refund 3', 2))
+        self.assertTrue(np.array_equal(faiss.vector_to_array(rag.index.id_map),
+                                       faiss.vector_to_array(expected.index.id_map)))
+
+    def test_stale_rows_are_encoded_and_stored(self):
+        rag = make_pipeline()
+
+        shards = build_index(rag, workers=1, shard_size=10)
+
+        self.assertEqual(sum(s['encoded'] for s in shards), rag.index.ntotal)
+        self.assertFalse(DocumentChunk.objects.filter(embedding=None).exists())
+        self.assertFalse(FAQ.objects.filter(embedding=None).exists())
+
+    def test_command_writes_a_loadable_snapshot(self):
+        rag = make_pipeline()
+        out = io.StringIO()
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch('api.management.commands.build_index.RAGPipeline', return_value=rag):
+            call_command('build_index', '--workers', '1', '--shard-size', '8', '--dir', directory, stdout=out)
+            loaded = make_pipeline()
+            self.assertTrue(snapshot.load_snapshot(loaded, Path(directory)))
+
+        self.assertEqual(loaded.documents, rag.documents)
+        self.assertEqual(out.getvalue().count('rows/sec'), 6)  # 3 + 2 shards and the summary
+        self.assertIn('29 rows', out.getvalue())
@@ -0,0 +1,119 @@
+"""
+Tests for the RAG pipeline caches.
+"""
+from unittest import mock
+
+import numpy as np
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from rag.cache import QueryEmbeddingCache, SemanticResponseCache, normalize_query
+
+
+class QueryEmbeddingCacheTests(SimpleTestCase):
+
+    def test_normalized_queries_share_an_entry(self):
+        cache = QueryEmbeddingCache(maxsize=4)
+        cache.put('How do I get a  Certificate?', np.ones(3))
+
+        self.assertIsNotNone(cache.get('  how do i get a certificate? '))
+        self.assertEqual(normalize_query(' Refund\n Policy '), 'refund policy')
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = QueryEmbeddingCache(maxsize=2)
+        cache.put('a', np.zeros(3))
+        cache.put('b', np.zeros(3))
+        cache.get('a')
+        cache.put('c', np.zeros(3))
+
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertEqual(cache.stats()['size'], 2)
+
+    def test_expired_entries_are_misses(self):
+        cache = QueryEmbeddingCache(maxsize=2, ttl=10)
+        with mock.patch('rag.cache.time.monotonic', return_value=100):
+            cache.put('refund policy', np.zeros(3))
+        with mock.patch('rag.cache.time.monotonic', return_value=111):
+            self.assertIsNone(cache.get('refund policy'))
+
+        self.assertEqual(cache.stats(), {'size': 0, 'maxsize': 2, 'hits': 0, 'misses': 1, 'hit_rate': 0.0})
+
+    def test_zero_size_disables_cache(self):
+        cache = QueryEmbeddingCache(maxsize=0)
+        cache.put('a', np.zeros(3))
+
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['misses'], 0)
+
+
+class SemanticResponseCacheTests(SimpleTestCase):
+
+    def vector(self, *values):
+        return np.array(values, dtype=np.float32)
+
+    def test_close_query_hits_and_distant_query_misses(self):
+        cache = SemanticResponseCache(max_distance=0.05, maxsize=4)
+        cache.put('refund policy?', self.vector(1, 0, 0), 'Within 7 days.', [{'title': 'Refunds'}])
+
+        hit = cache.get(self.vector(0.99, 0.05, 0))
+        miss = cache.get(self.vector(0, 1, 0))
+
+        self.assertEqual(hit['answer'], 'Within 7 days.')
+        self.assertEqual(hit['context'], [{'title': 'Refunds'}])
+        self.assertIsNone(miss)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_least_recently_used_answer_is_evicted(self):
+        cache = SemanticResponseCache(maxsize=2)
+        cache.put('a', self.vector(1, 0, 0), 'A', [])
+        cache.put('b', self.vector(0, 1, 0), 'B', [])
+        cache.get(self.vector(1, 0, 0))
+        cache.put('c', self.vector(0, 0, 1), 'C', [])
+
+        self.assertIsNone(cache.get(self.vector(0, 1, 0)))
+        self.assertEqual(cache.get(self.vector(1, 0, 0))['answer'], 'A')
+
+    def test_expired_answers_are_ignored(self):
+        cache = SemanticResponseCache(maxsize=2, ttl=10)
+        with mock.patch('rag.cache.time.time', return_value=100):
+            cache.put('a', self.vector(1, 0, 0), 'A', [])
+        with mock.patch('rag.cache.time.time', return_value=111):
+            self.assertIsNone(cache.get(self.vector(1, 0, 0)))
+
+    @override_settings(CACHES={'answers': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_django_cache_backend_is_shared_and_invalidated(self):
+        writer = SemanticResponseCache(backend='answers')
+        reader = SemanticResponseCache(backend='answers')
+        writer.put('a', self.vector(1, 0, 0), 'A', [])
+
+        self.assertEqual(reader.get(self.vector(1, 0, 0))['answer'], 'A')
+
+        reader.invalidate()
+        self.assertIsNone(writer.get(self.vector(1, 0, 0)))
+
+    @override_settings(CACHES={'answers': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                           'LOCATION': 'shared_puts_from_several_workers_are_all_kept'}})
+    def test_shared_puts_from_several_workers_are_all_kept(self):
+        workers = [SemanticResponseCache(backend='answers', maxsize=4) for _ in range(2)]
+        vectors = [self.vector(1, 0, 0), self.vector(0, 1, 0), self.vector(0, 0, 1)]
+        for i, vector in enumerate(vectors):
+            workers[i % 2].put(str(i), vector, f'A{i}', [])
+
+        self.assertEqual([workers[0].get(vector)['answer'] for vector in vectors], ['A0', 'A1', 'A2'])
+
+    @override_settings(CACHES={'answers': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                           'LOCATION': 'shared_hits_do_not_write_and_oldest_answer_is_evicted'}})
+    def test_shared_hits_do_not_write_and_oldest_answer_is_evicted(self):
+        cache = SemanticResponseCache(backend='answers', maxsize=2)
+        cache.put('a', self.vector(1, 0, 0), 'A', [])
+        cache.put('b', self.vector(0, 1, 0), 'B', [])
+
+        with mock.patch.object(caches['answers'], 'set') as store_set:
+            self.assertEqual(cache.get(self.vector(1, 0, 0))['answer'], 'A')
+        store_set.assert_not_called()
+
+        cache.put('c', self.vector(0, 0, 1), 'C', [])
+        self.assertIsNone(cache.get(self.vector(1, 0, 0)))
+        self.assertEqual(cache.get(self.vector(0, 1, 0))['answer'], 'B')
@@ -0,0 +1,46 @@
+"""
+Tests for splitting documents into overlapping chunks.
+"""
+from django.test import SimpleTestCase
+
+from rag.chunking import chunk_spans
+
+
+class ChunkSpanTests(SimpleTestCase):
+
+    def spans(self, text, size=100, overlap=20):
+        return list(chunk_spans(text, size, overlap))
+
+    def test_chunks_cover_text_within_size(self):
+        text = ' '.join(f'word{i}' for i in range(500))
+
+        spans = self.spans(text)
+
+        self.assertEqual(spans[0][0], 0)
+        self.assertEqual(spans[-1][1], len(text))
+        for (start, end), (next_start, _) in zip(spans, spans[1:]):
+            self.assertLessEqual(end - start, 100)
+            self.assertLess(next_start, end)  # Consecutive chunks overlap
+            self.assertGreaterEqual(next_start, end - 20)
+
+    def test_chunks_break_at_paragraphs_and_words(self):
+        paragraphs = ['alpha ' * 12, 'beta ' * 12, 'gamma ' * 12]
+        text = '\n\n'.join(p.strip() for p in paragraphs)
+
+        spans = self.spans(text, size=100, overlap=10)
+
+        self.assertTrue(text[:spans[0][1]].endswith('\n\n'))
+        for start, end in spans:
+            self.assertTrue(start == 0 or text[start - 1].isspace())
+            self.assertTrue(end == len(text) or text[end - 1].isspace())
+
+    def test_short_and_empty_text_is_one_chunk(self):
+        self.assertEqual(self.spans('A short answer.'), [(0, 15)])
+        self.assertEqual(self.spans(''), [(0, 0)])
+
+    def test_unbroken_text_is_split_at_size(self):
+        self.assertEqual(self.spans('x' * 250, size=100, overlap=20), [(0, 100), (80, 180), (160, 250)])
+
+    def test_overlap_must_be_smaller_than_size(self):
+        with self.assertRaises(ValueError):
+            self.spans('text', size=10, overlap=10)
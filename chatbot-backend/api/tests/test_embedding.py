@@ -0,0 +1,61 @@
+"""
+Tests for the embedding backends.
+
+The parity tests load the real model with each backend and only run where
+sentence-transformers and ONNX Runtime are installed.
+"""
+import importlib.util
+import unittest
+
+import numpy as np
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from rag.embedding import load_embedding_model
+
+ONNX_AVAILABLE = all(
+    importlib.util.find_spec(module) is not None for module in ('sentence_transformers', 'onnxruntime', 'optimum')
+)
+
+SENTENCES = [
+    'How do I get a refund for a course?',
+    'Certificates can be downloaded from the dashboard once every module is complete.',
+    'Stripe and PayPal are accepted for subscriptions.',
+    'CS205 meets in the spring term with weekly labs and a final project.',
+    'Reset your password from the login page.',
+    'Quiz retakes are allowed after 24 hours.',
+]
+
+
+class EmbeddingBackendTests(SimpleTestCase):
+
+    @override_settings(RAG_EMBEDDING_BACKEND='tensorrt')
+    def test_unknown_backend_is_rejected(self):
+        with self.assertRaises(ValueError):
+            load_embedding_model('all-MiniLM-L6-v2')
+
+
+@unittest.skipUnless(ONNX_AVAILABLE, 'sentence-transformers[onnx] is not installed')
+class EmbeddingParityTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.name = getattr(settings, 'RAG_EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+        cls.reference = cls.encode(load_embedding_model(cls.name, 'torch'))
+
+    @staticmethod
+    def encode(model):
+        return model.encode(SENTENCES, normalize_embeddings=True, show_progress_bar=False)
+
+    def assert_parity(self, backend):
+        vectors = self.encode(load_embedding_model(self.name, backend))
+
+        self.assertEqual(vectors.shape, self.reference.shape)
+        self.assertGreater(np.sum(vectors * self.reference, axis=1).min(), 0.99)
+
+    def test_onnx_matches_torch(self):
+        self.assert_parity('onnx')
+
+    def test_int8_onnx_matches_torch(self):
+        self.assert_parity('onnx-int8')
@@ -0,0 +1,186 @@
+"""
+Tests for bulk knowledge-base import (API endpoint and management command).
+"""
+import io
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from api.ingest import KnowledgeBaseImporter, read_records
+from api.models import Document, DocumentChunk, FAQ, User
+from api.tests.test_pipeline import faiss, make_pipeline
+from rag import pipeline as rag_pipeline
+from rag.pipeline import document_label
+
+
+def jsonl(records):
+    return ''.join(json.dumps(record) + '\n' for record in records)
+
+
+class ReadRecordsTests(SimpleTestCase):
+
+    def test_jsonl_skips_blank_lines_and_reports_bad_ones(self):
+        lines = [b'{"question": "Q1", "answer": "A1"}\n', b'\n', b'{not json\n', b'[1, 2]\n', '{"question": "Q2"}\n']
+
+        records = list(read_records(lines, 'jsonl'))
+
+        self.assertEqual([number for number, _ in records], [1, 3, 4, 5])
+        self.assertEqual(records[0][1], {'question': 'Q1', 'answer': 'A1'})
+        self.assertIsInstance(records[1][1], ValueError)
+        self.assertIsInstance(records[2][1], ValueError)
+        self.assertEqual(records[3][1], {'question': 'Q2'})
+
+    def test_csv_rows_keep_their_line_numbers(self):
+        text = 'question,answer,category\nQ1,A1,Billing\n"Multi\nline",A2,\n'
+
+        records = list(read_records(io.StringIO(text, newline=''), 'csv'))
+
+        self.assertEqual(records, [
+            (2, {'question': 'Q1', 'answer': 'A1', 'category': 'Billing'}),
+            (4, {'question': 'Multi\nline', 'answer': 'A2', 'category': ''}),
+        ])
+
+
+@unittest.skipIf(faiss is None, 'faiss is not installed')
+class KnowledgeBaseImporterTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(rag_pipeline, 'FAISS_AVAILABLE', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.rag = make_pipeline()
+
+    def test_rows_are_created_embedded_and_indexed_in_batches(self):
+        records = [{'title': f'Guide {i}', 'content': f'Course guide number {i}. ' * 60} for i in range(7)]
+        records.insert(3, {'title': 'No content'})
+        progress = []
+
+        importer = KnowledgeBaseImporter('document', rag=self.rag, batch_size=3, progress=progress.append)
+        stats = importer.run(enumerate(records, 1))
+
+        self.assertEqual((stats['rows'], stats['created'], stats['indexed'], stats['failed']), (8, 7, 7, 1))
+        self.assertEqual(stats['errors'], [{'line': 4, 'errors': {'content': ['This field is required.']}}])
+        self.assertEqual([p['created'] for p in progress], [3, 5, 7])
+        self.assertEqual(Document.objects.count(), 7)
+        chunks = DocumentChunk.objects.all()
+        self.assertGreater(len(chunks), 7)  # Long documents are split
+        self.assertTrue(all(chunk.embedding for chunk in chunks))
+        self.assertEqual(len(self.rag.documents), len(chunks))
+        self.assertIn(document_label('document', Document.objects.first().pk), self.rag.documents)
+
+    def test_without_pipeline_rows_are_only_inserted(self):
+        stats = KnowledgeBaseImporter('faq').run(enumerate([{'question': 'Q', 'answer': 'A'}], 1))
+
+        self.assertEqual((stats['created'], stats['indexed']), (1, 0))
+        self.assertIsNone(FAQ.objects.get().embedding)
+
+
+@unittest.skipIf(faiss is None, 'faiss is not installed')
+class BulkImportViewTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(rag_pipeline, 'FAISS_AVAILABLE', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.rag = make_pipeline()
+        patcher = mock.patch('api.views.get_rag_pipeline', return_value=self.rag)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='admin', email='a@example.com', password='x'))
+
+    def test_jsonl_body_is_imported_and_indexed(self):
+        topics = ['refund', 'certificate', 'enrollment', 'quiz', 'payment']
+        body = jsonl([{'question': f'Where is my {topic}', 'answer': 'On the dashboard.'} for topic in topics])
+
+        response = self.client.post(reverse('faqs-bulk'), body, content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['indexed']), (5, 5))
+        self.assertEqual(FAQ.objects.count(), 5)
+        self.assertEqual(len(self.rag.documents), 5)
+        self.assertEqual(self.rag.retrieve('quiz', top_k=1)[0]['title'], 'Where is my quiz')
+
+    def test_csv_body(self):
+        body = 'title,content,category\nRefunds,Within 7 days.,Payments\nCertificates,From your profile.,\n'
+
+        response = self.client.post(reverse('documents-bulk'), body, content_type='text/csv; charset=utf-8')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(list(Document.objects.values_list('title', 'category')),
+                         [('Refunds', 'Payments'), ('Certificates', '')])
+
+    def test_only_invalid_rows_is_a_bad_request(self):
+        response = self.client.post(reverse('faqs-bulk'), '{"question": "Q"}\n', content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['failed'], 1)
+        self.assertFalse(FAQ.objects.exists())
+
+    def test_requires_authentication(self):
+        response = APIClient().post(reverse('faqs-bulk'), jsonl([{'question': 'Q', 'answer': 'A'}]),
+                                    content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(FAQ.objects.exists())
+
+
+@unittest.skipIf(faiss is None, 'faiss is not installed')
+class ImportCommandTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(rag_pipeline, 'FAISS_AVAILABLE', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.rag = make_pipeline()
+        patcher = mock.patch('api.management.commands.import_knowledge_base.RAGPipeline', return_value=self.rag)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+
+    def test_jsonl_file_is_imported_with_progress(self):
+        path = self.dir / 'faqs.jsonl'
+        path.write_text(jsonl([{'question': f'Q{i}', 'answer': f'A{i}'} for i in range(5)]) + 'oops\n')
+        out, err = io.StringIO(), io.StringIO()
+
+        with override_settings(RAG_INDEX_DIR=self.dir):
+            call_command('import_knowledge_base', str(path), '--type', 'faq', '--batch-size', '2', stdout=out, stderr=err)
+
+        self.assertEqual(FAQ.objects.count(), 5)
+        self.assertTrue(all(FAQ.objects.values_list('embedding', flat=True)))
+        self.assertEqual(self.rag.documents, {})  # Embedded only, not indexed
+        self.assertEqual(out.getvalue().count('rows/sec'), 4)  # Three batches and the summary
+        self.assertIn('Imported 5 of 6 rows (5 embedded, 1 invalid)', out.getvalue())
+        self.assertIn('line 6:', err.getvalue())
+
+    @override_settings(RAG_IMPORT_BATCH_SIZE=100)
+    def test_csv_is_detected_from_the_extension(self):
+        path = self.dir / 'docs.csv'
+        path.write_text('title,content\nGuide,Read the guide.\n')
+
+        with override_settings(RAG_INDEX_DIR=self.dir):
+            call_command('import_knowledge_base', str(path), '--no-embed', stdout=io.StringIO())
+
+        self.assertEqual(Document.objects.get().title, 'Guide')
+        self.assertFalse(DocumentChunk.objects.exists())
+
+    def test_current_snapshot_is_retired(self):
+        path = self.dir / 'faqs.jsonl'
+        path.write_text(jsonl([{'question': 'Q', 'answer': 'A'}]))
+        (self.dir / 'CURRENT').write_text('4')
+        out = io.StringIO()
+
+        with override_settings(RAG_INDEX_DIR=self.dir):
+            call_command('import_knowledge_base', str(path), '--type', 'faq', stdout=out)
+
+        self.assertFalse((self.dir / 'CURRENT').exists())
+        self.assertIn('Retired index snapshot v4', out.getvalue())
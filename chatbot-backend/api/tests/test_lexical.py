@@ -0,0 +1,98 @@
+"""
+Tests for the BM25 keyword index and reciprocal-rank fusion.
+"""
+import random
+import tempfile
+from pathlib import Path
+
+from django.test import SimpleTestCase
+
+from rag.lexical import LexicalIndex, reciprocal_rank_fusion, tokenize
+
+
+def random_corpus(count, seed=7):
+    """Documents over a small vocabulary with a few very common words."""
+    rng = random.Random(seed)
+    common = ['course', 'lesson', 'quiz', 'video']
+    rare = [f'topic{i}' for i in range(300)]
+    return [
+        ' '.join(rng.choices(common, k=rng.randint(3, 12)) + rng.choices(rare, k=rng.randint(1, 6)))
+        for _ in range(count)
+    ]
+
+
+class LexicalIndexTests(SimpleTestCase):
+
+    def build(self, texts, **kwargs):
+        index = LexicalIndex(**kwargs)
+        index.add(range(len(texts)), texts)
+        return index
+
+    def test_exact_terms_rank_first(self):
+        index = self.build([
+            'Paying for a course with a card',
+            'Stripe payments are refunded within five days',
+            'Course codes like CS101 are listed on the syllabus',
+        ])
+
+        self.assertEqual(index.search('Is Stripe supported?', 3), [1])
+        self.assertEqual(index.search('what is cs101', 3), [2])
+        self.assertEqual(index.search('course', 3), [0, 2])
+        self.assertEqual(index.search('the of and', 3), [])
+        self.assertEqual(tokenize('How do I pay for CS-101?'), ['pay', 'cs', '101'])
+
+    def test_common_term_pruning_matches_full_scoring(self):
+        texts = random_corpus(2000)
+        pruned, full = self.build(texts, common_ratio=0.05), self.build(texts, common_ratio=1.0)
+
+        for query in ['course topic7', 'quiz video topic12 topic40', 'lesson course quiz', 'topic3']:
+            with self.subTest(query=query):
+                self.assertEqual(pruned.search(query, 10), full.search(query, 10))
+
+    def test_replaced_and_removed_documents(self):
+        index = self.build(['refund policy', 'certificate download', 'refund window'])
+
+        index.add([0], ['certificate reissue'])
+        index.remove([2, 99])
+
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.search('refund', 5), [])
+        self.assertEqual(index.search('certificate', 5), [1, 0])
+
+    def test_compaction_keeps_results(self):
+        texts = random_corpus(500)
+        index = self.build(texts, compact_ratio=0.2)
+        index.remove(range(0, 500, 3))  # A third of the documents: compacts
+
+        remaining = [i for i in range(500) if i % 3]
+        fresh = LexicalIndex()
+        fresh.add(remaining, [texts[i] for i in remaining])
+
+        self.assertEqual(index._size, len(remaining))
+        for query in ['course topic7', 'quiz topic100 topic5']:
+            self.assertEqual(index.search(query, 10), fresh.search(query, 10))
+
+    def test_serialized_index_round_trip(self):
+        texts = random_corpus(300)
+        index = self.build(texts)
+        index.remove([5, 6])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'index.bm25'
+            path.write_bytes(index.to_bytes())
+            loaded = LexicalIndex()
+            loaded.load(str(path))
+
+        self.assertEqual(len(loaded), 298)
+        for query in ['course topic7', 'video topic250']:
+            self.assertEqual(loaded.search(query, 10), index.search(query, 10))
+
+
+class ReciprocalRankFusionTests(SimpleTestCase):
+
+    def test_documents_ranked_by_both_lists_win(self):
+        fused = reciprocal_rank_fusion([[1, 2, 3], [3, 4, 1]], k=60)
+
+        self.assertEqual([label for label, _ in fused], [1, 3, 2, 4])
+        self.assertAlmostEqual(fused[0][1], 1 / 61 + 1 / 63)
+        self.assertEqual(reciprocal_rank_fusion([[5, 6], []], limit=1), [(5, 1 / 61)])
@@ -0,0 +1,137 @@
+"""
+Tests for the outbound email queue, against a local SMTP stand-in.
+"""
+import io
+from datetime import timedelta
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.management.commands.benchmark_outbox import SMTPSink
+from api.models import OutboundEmail
+from tasks.outbox import claim_batch, drain_outbox, queue_email
+
+
+@override_settings(EMAIL_OUTBOX_BATCH_SIZE=10, EMAIL_OUTBOX_MAX_ATTEMPTS=3, EMAIL_OUTBOX_RETRY_DELAY=60)
+class OutboxTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch('builtins.print')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def queue(self, count, start=0):
+        return [queue_email(f'user{i}@example.com', 'Verify', f'Body {i}') for i in range(start, start + count)]
+
+    def test_drains_batches_over_one_connection(self):
+        self.queue(25)
+
+        with SMTPSink() as sink, sink.settings():
+            stats = drain_outbox()
+
+        self.assertEqual(stats, {'sent': 25, 'retrying': 0, 'failed': 0})
+        self.assertEqual(sink.connections, 1)
+        self.assertEqual(sorted(sink.messages), sorted(f'user{i}@example.com' for i in range(25)))
+        self.assertEqual(OutboundEmail.objects.filter(status='sent', attempts=1, sent_at__isnull=False).count(), 25)
+
+    def test_rejected_email_backs_off_then_fails(self):
+        self.queue(3)
+
+        with SMTPSink(reject={'user1@example.com'}) as sink, sink.settings():
+            first = drain_outbox()
+            rejected = OutboundEmail.objects.get(to_email='user1@example.com')
+            self.assertEqual((rejected.status, rejected.attempts), ('pending', 1))
+            self.assertGreater(rejected.next_attempt_at, timezone.now() + timedelta(seconds=50))
+            self.assertIn('SMTPRecipientsRefused', rejected.last_error)
+
+            self.assertEqual(drain_outbox()['retrying'], 0)  # Not due yet
+            for _ in range(2):
+                OutboundEmail.objects.filter(pk=rejected.pk).update(next_attempt_at=timezone.now())
+                last = drain_outbox()
+
+        self.assertEqual(first, {'sent': 2, 'retrying': 1, 'failed': 0})
+        self.assertEqual(last, {'sent': 0, 'retrying': 0, 'failed': 1})
+        rejected.refresh_from_db()
+        self.assertEqual((rejected.status, rejected.attempts), ('failed', 3))
+        self.assertEqual(sorted(sink.messages), ['user0@example.com', 'user2@example.com'])
+
+    def test_unreachable_server_keeps_attempts(self):
+        self.queue(2)
+
+        with SMTPSink() as sink, sink.settings():
+            port = sink.server_address[1]
+        with override_settings(EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                               EMAIL_HOST='127.0.0.1', EMAIL_PORT=port, EMAIL_USE_TLS=False, EMAIL_TIMEOUT=1):
+            stats = drain_outbox()
+
+        self.assertEqual(stats, {'sent': 0, 'retrying': 0, 'failed': 0})
+        self.assertEqual(
+            list(OutboundEmail.objects.values_list('status', 'attempts', 'claim_token')), [('pending', 0, '')] * 2
+        )
+        self.assertFalse(OutboundEmail.objects.filter(next_attempt_at__lte=timezone.now()).exists())
+
+    def test_claims_do_not_overlap_and_expire(self):
+        self.queue(15)
+
+        first, second = claim_batch(10), claim_batch(10)
+
+        self.assertEqual(len(first), 10)
+        self.assertEqual(len(second), 5)
+        self.assertFalse({e.pk for e in first} & {e.pk for e in second})
+        self.assertEqual(claim_batch(10), [])
+
+        # A run that died leaves its emails in 'sending' until the lease runs out
+        OutboundEmail.objects.filter(pk__in=[e.pk for e in first]).update(next_attempt_at=timezone.now())
+        self.assertEqual({e.pk for e in claim_batch(10)}, {e.pk for e in first})
+
+
+class DrainOutboxCommandTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch('builtins.print')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_once_sends_due_emails_and_exits(self):
+        queue_email('user@example.com', 'Verify', 'Body')
+        out = io.StringIO()
+
+        with SMTPSink() as sink, sink.settings():
+            call_command('drain_outbox', '--once', stdout=out)
+
+        self.assertEqual(sink.messages, ['user@example.com'])
+        self.assertIn('1 sent, 0 to retry, 0 failed', out.getvalue())
+
+    def test_worker_keeps_draining_after_a_failed_run(self):
+        runs = mock.Mock(side_effect=[RuntimeError('database is locked'), {}, KeyboardInterrupt])
+
+        with mock.patch('api.management.commands.drain_outbox.drain_outbox', runs), \
+                mock.patch('api.management.commands.drain_outbox.signal.signal'), \
+                self.assertRaises(KeyboardInterrupt):
+            call_command('drain_outbox', '--interval', '0.01', stdout=io.StringIO())
+
+        self.assertEqual(runs.call_count, 3)
+
+
+class SignUpEmailTests(TestCase):
+
+    def test_signup_queues_verification_email(self):
+        with mock.patch('builtins.print'), mock.patch('tasks.scheduler.scheduler') as scheduler, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = APIClient().post(reverse('signup'), {
+                'username': 'learner',
+                'email': 'learner@example.com',
+                'password': 'A-long-passphrase-1',
+                'password_confirm': 'A-long-passphrase-1',
+            }, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        email = OutboundEmail.objects.get()
+        self.assertEqual((email.to_email, email.status), ('learner@example.com', 'pending'))
+        self.assertIn('verify-email?token=', email.body)
+        scheduler.add_job.assert_not_called()
+        scheduler.modify_job.assert_called_once()
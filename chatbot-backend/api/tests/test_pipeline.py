@@ -0,0 +1,795 @@
+"""
+Tests for the RAG pipeline ingestion path.
+
+The embedding model is replaced with a deterministic stub so the tests only
+need FAISS and NumPy, not sentence-transformers.
+"""
+import hashlib
+import io
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from api.models import Document, DocumentChunk, FAQ
+from rag import pipeline as rag_pipeline
+from rag import snapshot
+from rag.index import base_index, create_index, storage_index
+from rag.pipeline import RAGPipeline, content_hash, document_label
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+
+DIM = 384
+
+
+class StubEncoder:
+    """Bag-of-words hashing encoder that mimics SentenceTransformer.encode."""
+
+    def __init__(self):
+        self.calls = 0
+        self.encoded = 0
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, show_progress_bar=False, **kwargs):
+        self.calls += 1
+        self.encoded += len(texts)
+        vectors = np.zeros((len(texts), DIM), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                bucket = int(hashlib.md5(word.encode()).hexdigest()[:8], 16) % DIM
+                vectors[row, bucket] += 1.0
+            norm = np.linalg.norm(vectors[row])
+            if norm:
+                vectors[row] /= norm
+        return vectors
+
+
+def make_pipeline():
+    """Build a RAGPipeline with a stub encoder and a fresh flat index."""
+    with mock.patch.object(RAGPipeline, '_initialize'):
+        rag = RAGPipeline()
+    rag.embedding_model = StubEncoder()
+    rag.index = create_index(DIM)
+    return rag
+
+
+def make_documents(count):
+    topics = ['refund policy', 'certificate download', 'course enrollment', 'quiz retake', 'stripe payment']
+    return [
+        {
+            'title': f'{topics[i % len(topics)]} {i}',
+            'content': f'{topics[i % len(topics)]} details for entry {i} ' * (1 + i % 4),
+            'type': 'document',
+            'id': i,
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+@unittest.skipIf(faiss is None, 'faiss is not installed')
+@mock.patch.object(rag_pipeline, 'FAISS_AVAILABLE', True)
+class BatchedIngestionTests(SimpleTestCase):
+
+    def legacy_ingest(self, rag, documents):
+        """The original one-encode-one-add-per-document loop."""
+        for doc in documents:
+            embedding = rag.embedding_model.encode([rag._document_text(doc)])[0]
+            label = document_label(doc['type'], doc['id'])
+            rag.index.add_with_ids(np.array([embedding], dtype=np.float32), np.array([label], dtype=np.int64))
+            rag.documents[label] = doc
+
+    def test_batched_ingestion_keeps_index_and_documents_in_sync(self):
+        rag = make_pipeline()
+        documents = make_documents(70)
+
+        rag.add_documents(documents, batch_size=16)
+
+        self.assertEqual(rag.index.ntotal, len(rag.documents))
+        self.assertEqual(  # Short documents are indexed as a single chunk
+            [(doc['id'], doc['chunk'], doc['content']) for doc in rag.documents.values()],
+            [(doc['id'], 0, doc['content'].strip()) for doc in documents],
+        )
+        self.assertEqual(rag.embedding_model.calls, 5)
+
+    @override_settings(RAG_HYBRID_SEARCH=False)  # The loop only fills the vector index
+    def test_batched_ingestion_matches_per_document_loop(self):
+        documents = make_documents(40)
+        batched, legacy = make_pipeline(), make_pipeline()
+
+        batched.add_documents(documents, batch_size=8)
+        self.legacy_ingest(legacy, documents)
+
+        for query in ['refund policy', 'how do I download my certificate', 'stripe']:
+            self.assertEqual(
+                [(d['id'], round(d['score'], 5)) for d in batched.retrieve(query, top_k=5)],
+                [(d['id'], round(d['score'], 5)) for d in legacy.retrieve(query, top_k=5)],
+            )
+
+    def test_add_documents_without_index_is_a_no_op(self):
+        rag = make_pipeline()
+        rag.index = None
+
+        rag.add_documents(make_documents(3))
+
+        self.assertEqual(rag.documents, {})
+        self.assertEqual(rag.embedding_model.calls, 0)
+
+    def test_load_documents_from_db_skips_database_without_model(self):
+        rag = make_pipeline()
+        rag.embedding_model = None
+
+        with mock.patch.object(RAGPipeline, '_iter_knowledge_base') as iter_rows:
+            rag.load_documents_from_db()
+
+        iter_rows.assert_not_called()
+        self.assertEqual(rag.index.ntotal, 0)
+
+
+@unittest.skipIf(faiss is None, 'faiss is not installed')
+@mock.patch.object(rag_pipeline, 'FAISS_AVAILABLE', True)
+class StoredEmbeddingTests(TestCase):
+
+    def setUp(self):
+        for i in range(5):
+            Document.objects.create(title=f'Refund policy {i}', content=f'Refunds within {i + 7} days.')
+        FAQ.objects.create(question='How do I get a certificate?', answer='Finish every module.')
+
+    def test_first_load_encodes_and_stores_every_row(self):
+        rag = make_pipeline()
+
+        rag.load_documents_from_db()
+
+        self.assertEqual(rag.embedding_model.encoded, 6)
+        self.assertEqual(rag.index.ntotal, 6)
+        self.assertEqual(DocumentChunk.objects.count(), 5)
+        chunk = DocumentChunk.objects.select_related('document').first()
+        doc = chunk.document
+        self.assertEqual((chunk.ordinal, chunk.start, chunk.end), (0, 0, len(doc.content)))
+        self.assertEqual(chunk.embedding_model, rag.embedding_model_name)
+        self.assertEqual(chunk.embedding_dim, DIM)
+        self.assertEqual(chunk.content_hash, content_hash(f'{doc.title} {doc.content}'))
+        self.assertEqual(len(chunk.embedding), DIM * 4)
+
+    def test_reload_reuses_stored_vectors(self):
+        make_pipeline().load_documents_from_db()
+        rag = make_pipeline()
+
+        rag.load_documents_from_db()
+
+        self.assertEqual(rag.embedding_model.encoded, 0)
+        self.assertEqual(rag.index.ntotal, 6)
+        self.assertEqual(rag.retrieve('How do I get a certificate?', top_k=1)[0]['type'], 'faq')
+
+    def test_only_changed_rows_are_reencoded(self):
+        make_pipeline().load_documents_from_db()
+        Document.objects.filter(pk=Document.objects.first().pk).update(content='Changed text')
+        rag = make_pipeline()
+
+        rag.load_documents_from_db()
+
+        self.assertEqual(rag.embedding_model.encoded, 1)
+
+    def test_model_change_reencodes_everything(self):
+        make_pipeline().load_documents_from_db()
+        rag = make_pipeline()
+        rag.embedding_model_name = 'another-model'
+
+        rag.load_documents_from_db()
+
+        self.assertEqual(rag.embedding_model.encoded, 6)
+        self.assertEqual(set(DocumentChunk.objects.values_list('embedding_model', flat=True)), {'another-model'})
+
+    def test_save_stores_embedding_when_pipeline_is_loaded(self):
+        rag = make_pipeline()
+
+        with mock.patch.object(rag_pipeline, '_rag_pipeline', rag), self.captureOnCommitCallbacks(execute=True):
+            faq = FAQ.objects.create(question='Refund?', answer='Within 7 days.')
+
+        faq.refresh_from_db()
+        self.assertEqual(faq.content_hash, content_hash('Refund? Within 7 days.'))
+        self.assertEqual(faq.embedding_model, rag.embedding_model_name)
+        self.assertEqual(rag.embedding_model.encoded, 1)
+        self.assertEqual(rag.index.ntotal, 1)
+
+
+@unittest.skipIf(faiss is None, 'faiss is not installed')
+@mock.patch.object(rag_pipeline, 'FAISS_AVAILABLE', True)
+@mock.patch.object(rag_pipeline, 'faiss', faiss, create=True)
+class IndexSnapshotTests(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.directory = Path(self.tmp.name)
+        for i in range(4):
+            Document.objects.create(title=f'Course {i}', content=f'Enrollment details {i}')
+        FAQ.objects.create(question='Refund?', answer='Within 7 days.')
+
+    def write(self):
+        state = snapshot.knowledge_base_state()
+        rag = make_pipeline()
+        rag.load_documents_from_db()
+        return rag, snapshot.write_snapshot(rag, state, self.directory, keep=2)
+
+    def test_snapshot_round_trip_is_memory_mapped(self):
+        built, version = self.write()
+        rag = make_pipeline()
+
+        self.assertTrue(snapshot.load_snapshot(rag, self.directory))
+
+        self.assertEqual(version, 1)
+        self.assertIsNotNone(rag.index_path)
+        self.assertEqual(rag.documents, built.documents)
+        self.assertEqual(rag.retrieve('Refund?', top_k=1), built.retrieve('Refund?', top_k=1))
+        self.assertEqual(rag.lexical.search('enrollment details 2', 5), built.lexical.search('enrollment details 2', 5))
+
+    def test_missing_keyword_index_is_rebuilt(self):
+        built, version = self.write()
+        (self.directory / f'index-v{version}.bm25').unlink()
+        rag = make_pipeline()
+
+        with mock.patch('builtins.print'):
+            self.assertTrue(snapshot.load_snapshot(rag, self.directory))
+
+        self.assertEqual(len(rag.lexical), 5)
+        self.assertEqual(rag.lexical.search('refund', 5), built.lexical.search('refund', 5))
+
+    def test_changed_rows_make_snapshot_stale(self):
+        self.write()
+        Document.objects.first().save()  # Bumps updated_at
+
+        self.assertFalse(snapshot.load_snapshot(make_pipeline(), self.directory))
+
+    def test_deleted_rows_make_snapshot_stale(self):
+        self.write()
+        FAQ.objects.all().delete()
+
+        self.assertFalse(snapshot.load_snapshot(make_pipeline(), self.directory))
+
+    def test_mapped_index_is_copied_before_adding(self):
+        self.write()
+        rag = make_pipeline()
+        snapshot.load_snapshot(rag, self.directory)
+
+        rag.add_documents([{'title': 'New', 'content': 'entry', 'type': 'document', 'id': 99}])
+
+        self.assertIsNone(rag.index_path)
+        self.assertEqual(rag.index.ntotal, 6)
+
+    def test_old_versions_are_pruned(self):
+        for _ in range(3):
+            _, version = self.write()
+
+        self.assertEqual(version, 3)
+        self.assertEqual(snapshot.current_version(self.directory), 3)
+        self.assertEqual(sorted(p.name for p in self.directory.glob('*.faiss')), ['index-v2.faiss', 'index-v3.faiss'])
+
+
+@unittest.skipIf(faiss is None, 'faiss is not installed')
+@mock.patch.object(rag_pipeline, 'FAISS_AVAILABLE', True)
+class IndexTypeTests(TestCase):
+
+    def setUp(self):
+        Document.objects.bulk_create(
+            Document(title=f'Topic {i}', content=f'course {i % 7} lesson {i % 11} quiz {i % 5}')
+            for i in range(300)
+        )
+
+    def loaded_pipeline(self):
+        rag = make_pipeline()
+        rag.load_documents_from_db()
+        return rag
+
+    @override_settings(RAG_INDEX_TYPE='ivf_flat', RAG_IVF_NLIST=8, RAG_IVF_NPROBE=8)
+    def test_ivf_index_is_trained_on_load(self):
+        rag = self.loaded_pipeline()
+
+        self.assertIsInstance(base_index(rag.index), faiss.IndexIVFFlat)
+        self.assertTrue(rag.index.is_trained)
+        self.assertEqual(rag.index.ntotal, 300)
+        self.assertEqual(faiss.extract_index_ivf(rag.index).nprobe, 8)
+        self.assertEqual(rag.retrieve('course 3 lesson 3 quiz 3', top_k=1)[0]['title'], 'Topic 3')
+
+    @override_settings(RAG_INDEX_TYPE='ivf_flat', RAG_IVF_NLIST=64, RAG_IVF_NPROBE=1, RAG_HYBRID_SEARCH=False)
+    def test_unfilled_ann_results_are_skipped(self):
+        rag = self.loaded_pipeline()
+
+        results = rag.retrieve('course 3 lesson 3 quiz 3', top_k=300)
+
+        self.assertEqual(len({doc['id'] for doc in results}), len(results))
+        self.assertLess(len(results), 300)
+
+    @override_settings(RAG_INDEX_TYPE='hnsw', RAG_HNSW_M=16, RAG_HNSW_EF_CONSTRUCTION=40, RAG_HNSW_EF_SEARCH=40)
+    def test_hnsw_index(self):
+        rag = self.loaded_pipeline()
+
+        self.assertEqual(base_index(rag.index).hnsw.efSearch, 40)
+        self.assertEqual(rag.index.ntotal, 300)
+
+    @override_settings(RAG_INDEX_TYPE='ivf_pq', RAG_IVF_NLIST=4, RAG_PQ_M=16, RAG_PQ_NBITS=10)
+    def test_too_few_vectors_fall_back_to_flat(self):
+        rag = self.loaded_pipeline()
+
+        self.assertIsInstance(base_index(rag.index), faiss.IndexFlatL2)
+        self.assertEqual(rag.index.ntotal, 300)
+
+    @override_settings(RAG_INDEX_STORAGE='sq8', RAG_INDEX_PCA_DIM=64)
+    def test_quantized_storage_after_pca(self):
+        rag = self.loaded_pipeline()
+
+        self.assertIsInstance(base_index(rag.index), faiss.IndexPreTransform)
+        self.assertIsInstance(storage_index(rag.index), faiss.IndexScalarQuantizer)
+        self.assertEqual((rag.index.d, rag.index.ntotal), (DIM, 300))
+        self.assertEqual(rag.retrieve('course 3 lesson 3 quiz 3', top_k=1)[0]['title'], 'Topic 3')
+
+    @override_settings(RAG_INDEX_TYPE='hnsw', RAG_HNSW_M=16, RAG_HNSW_EF_CONSTRUCTION=40, RAG_INDEX_STORAGE='pq',
+                       RAG_PQ_M=16, RAG_PQ_NBITS=6, RAG_INDEX_PCA_DIM=128, RAG_INDEX_COMPACT_RATIO=0.005)
+    def test_compressed_hnsw_tombstones_and_compaction(self):
+        rag = self.loaded_pipeline()
+        self.assertIsInstance(storage_index(rag.index), faiss.IndexHNSWPQ)
+
+        rag.remove_instances('document', [Document.objects.get(title='Topic 3').pk])
+        self.assertEqual(len(rag.tombstones), 1)
+        self.assertNotEqual(rag.retrieve('course 3 lesson 3 quiz 3', top_k=1)[0]['title'], 'Topic 3')
+
+        rag.remove_instances('document', list(Document.objects.filter(title__in=['Topic 4', 'Topic 5']).values_list('pk', flat=True)))
+        self.assertEqual((len(rag.tombstones), rag.index.ntotal), (0, 297))  # Compacted, keeping PCA and codebooks
+        self.assertIsInstance(storage_index(rag.index), faiss.IndexHNSWPQ)
+        self.assertEqual(rag.retrieve('course 10 lesson 10 quiz 0', top_k=1)[0]['title'], 'Topic 10')
+
+    @override_settings(RAG_INDEX_TYPE='annoy')
+    def test_unknown_index_type_is_rejected(self):
+        with self.assertRaises(ValueError):
+            create_index(DIM)
+
+
+@unittest.skipIf(faiss is None, 'faiss is not installed')
+@override_settings(RAG_IVF_NLIST=8, RAG_HNSW_EF_CONSTRUCTION=40, RAG_PQ_M=8, RAG_PQ_NBITS=4)
+class BenchmarkCommandTests(SimpleTestCase):
+    """Smoke tests so index refactors cannot silently break the benchmarks."""
+
+    def test_benchmark_ann(self):
+        out = io.StringIO()
+
+        call_command('benchmark_ann', '--sizes', '2000', '--queries', '20', '--dim', '32', stdout=out)
+
+        rows = [line.split() for line in out.getvalue().splitlines()[-4:]]
+        self.assertEqual([row[0] for row in rows], ['flat', 'ivf_flat', 'hnsw', 'ivf_pq'])
+        self.assertEqual(float(rows[0][1]), 1.0)  # Exact search
+
+    def test_benchmark_storage(self):
+        out = io.StringIO()
+
+        call_command('benchmark_storage', '--size', '2000', '--queries', '20', '--dim', '32',
+                     '--pca-dims', '0,16', '--intrinsic-dim', '8', stdout=out)
+
+        self.assertIn('PCA16,PQ8x4', out.getvalue())
+
+
+@unittest.skipIf(faiss is None, 'faiss is not installed')
+@mock.patch.object(rag_pipeline, 'FAISS_AVAILABLE', True)
+@mock.patch.object(rag_pipeline, 'faiss', faiss, create=True)
+class IncrementalIndexTests(TestCase):
+
+    def setUp(self):
+        for i in range(5):
+            Document.objects.create(title=f'Course {i}', content=f'Enrollment details {i}')
+        self.faq = FAQ.objects.create(question='Refund?', answer='Within 7 days.')
+
+    def loaded_pipeline(self):
+        rag = make_pipeline()
+        rag.load_documents_from_db()
+        patcher = mock.patch.object(rag_pipeline, '_rag_pipeline', rag)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return rag
+
+    def test_edit_replaces_entry_in_place(self):
+        rag = self.loaded_pipeline()
+        doc = Document.objects.get(title='Course 2')
+        encoded = rag.embedding_model.encoded
+
+        with self.captureOnCommitCallbacks(execute=True):
+            doc.content = 'Stripe payment methods'
+            doc.save()
+
+        self.assertEqual(rag.embedding_model.encoded, encoded + 1)
+        self.assertEqual(rag.index.ntotal, 6)
+        best = rag.retrieve('Course 2 Stripe payment methods', top_k=1)[0]
+        self.assertEqual((best['id'], best['content']), (doc.pk, 'Stripe payment methods'))
+
+    def test_delete_removes_entry(self):
+        rag = self.loaded_pipeline()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.faq.delete()
+
+        self.assertEqual(rag.index.ntotal, 5)
+        self.assertEqual(len(rag.documents), 5)
+        self.assertNotIn('faq', {doc['type'] for doc in rag.retrieve('Refund? Within 7 days.', top_k=5)})
+
+    def test_rolled_back_save_leaves_index_alone(self):
+        rag = self.loaded_pipeline()
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            Document.objects.create(title='Draft', content='Never committed')
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(rag.index.ntotal, 6)
+
+    @override_settings(RAG_INDEX_TYPE='hnsw', RAG_HNSW_M=16, RAG_HNSW_EF_CONSTRUCTION=40, RAG_INDEX_COMPACT_RATIO=0.5)
+    def test_hnsw_tombstones_then_compacts(self):
+        rag = self.loaded_pipeline()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.faq.delete()
+
+        self.assertEqual(len(rag.tombstones), 1)
+        self.assertEqual(rag.index.ntotal, 6)
+        self.assertNotIn('faq', {doc['type'] for doc in rag.retrieve('Refund? Within 7 days.', top_k=5)})
+        self.assertEqual(len(rag.retrieve('Enrollment details', top_k=5)), 5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Document.objects.filter(title__in=['Course 0', 'Course 1', 'Course 2']).delete()
+
+        self.assertEqual(len(rag.tombstones), 0)
+        self.assertEqual(rag.index.ntotal, 2)
+        self.assertEqual({doc['title'] for doc in rag.retrieve('Enrollment details', top_k=5)}, {'Course 3', 'Course 4'})
+
+    @override_settings(RAG_INDEX_TYPE='hnsw', RAG_HNSW_M=16, RAG_HNSW_EF_CONSTRUCTION=40)
+    def test_snapshot_keeps_tombstones(self):
+        rag = self.loaded_pipeline()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.faq.delete()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        snapshot.write_snapshot(rag, snapshot.knowledge_base_state(), Path(tmp.name))
+
+        loaded = make_pipeline()
+        self.assertTrue(snapshot.load_snapshot(loaded, Path(tmp.name)))
+
+        self.assertEqual(loaded.tombstones.positions, rag.tombstones.positions)
+        self.assertEqual(loaded.retrieve('Refund? Within 7 days.', top_k=5), rag.retrieve('Refund? Within 7 days.', top_k=5))
+
+
+def long_text(topics, words=20):
+    """One paragraph of distinct words per topic."""
+    return '\n\n'.join(' '.join(f'{topic}{i}' for i in range(words)) + '.' for topic in topics)
+
+
+@unittest.skipIf(faiss is None, 'faiss is not installed')
+@override_settings(RAG_CHUNK_SIZE=200, RAG_CHUNK_OVERLAP=40)
+class DocumentChunkingTests(TestCase):
+    topics = ['refund', 'certificate', 'enrollment', 'quiz', 'stripe', 'forum', 'mobile', 'password']
+
+    def setUp(self):
+        patcher = mock.patch.object(rag_pipeline, 'FAISS_AVAILABLE', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.doc = Document.objects.create(title='Handbook', content=long_text(self.topics))
+
+    def loaded_pipeline(self):
+        rag = make_pipeline()
+        rag.load_documents_from_db()
+        patcher = mock.patch.object(rag_pipeline, '_rag_pipeline', rag)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return rag
+
+    def test_long_document_is_retrieved_by_matching_chunk(self):
+        rag = self.loaded_pipeline()
+
+        chunks = DocumentChunk.objects.filter(document=self.doc)
+        self.assertGreaterEqual(chunks.count(), len(self.topics))
+        self.assertEqual(rag.index.ntotal, chunks.count())
+        best = rag.retrieve('stripe3 stripe7 stripe12', top_k=1)[0]
+        self.assertEqual((best['type'], best['id']), ('document', self.doc.pk))
+        self.assertIn('stripe12', best['content'])
+        self.assertLessEqual(len(best['content']), 200)
+        self.assertEqual(best['content'], self.doc.content[best['start']:best['end']].strip())
+
+    def test_reload_reuses_stored_chunk_vectors(self):
+        first = self.loaded_pipeline()
+        rag = make_pipeline()
+
+        rag.load_documents_from_db()
+
+        self.assertEqual(rag.embedding_model.encoded, 0)
+        self.assertEqual(set(rag.documents), set(first.documents))
+
+    def test_shrinking_document_drops_surplus_chunks(self):
+        rag = self.loaded_pipeline()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doc.content = long_text(self.topics[:2])
+            self.doc.save()
+
+        count = DocumentChunk.objects.filter(document=self.doc).count()
+        self.assertLess(count, len(self.topics))
+        self.assertEqual((rag.index.ntotal, len(rag.documents), len(rag.lexical)), (count, count, count))
+        self.assertNotIn('stripe', ' '.join(doc['content'] for doc in rag.retrieve('stripe3 stripe7', top_k=5)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doc.delete()
+        self.assertEqual((rag.index.ntotal, len(rag.lexical)), (0, 0))
+
+    @override_settings(RAG_CHUNK_SIZE=800, RAG_CHUNK_OVERLAP=100, RAG_EMBED_BATCH_SIZE=32, RAG_DB_CHUNK_CHARS=300_000)
+    def test_large_documents_are_read_and_encoded_in_bounded_batches(self):
+        for i in range(3):  # About 250 kB each
+            Document.objects.create(title=f'Archive {i}', content=long_text([f'a{i}t{j}' for j in range(1500)]))
+        rag = make_pipeline()
+        batch_sizes, group_sizes = [], []
+        encode, chunk_entries = rag.embedding_model.encode, rag._chunk_entries
+        rag.embedding_model.encode = lambda texts, **kwargs: batch_sizes.append(len(texts)) or encode(texts, **kwargs)
+        rag._chunk_entries = lambda doc_type, rows: group_sizes.append(len(rows)) or chunk_entries(doc_type, rows)
+
+        rag.load_documents_from_db()
+
+        self.assertEqual(group_sizes, [2, 1, 1])  # The handbook fits next to the first archive
+        self.assertLessEqual(max(batch_sizes), 32)
+        self.assertEqual(rag.index.ntotal, DocumentChunk.objects.count())
+        self.assertGreater(rag.index.ntotal, 900)
+
+
+@unittest.skipIf(faiss is None, 'faiss is not installed')
+@mock.patch.object(rag_pipeline, 'FAISS_AVAILABLE', True)
+class QueryCacheTests(SimpleTestCase):
+
+    def test_repeated_queries_are_encoded_once(self):
+        rag = make_pipeline()
+        rag.add_documents(make_documents(10))
+        encoded = rag.embedding_model.encoded
+
+        first = rag.retrieve('Refund policy', top_k=3)
+        second = rag.retrieve('  refund   POLICY ', top_k=3)
+
+        self.assertEqual(first, second)
+        self.assertEqual(rag.embedding_model.encoded, encoded + 1)
+        self.assertEqual(rag.query_cache.stats()['hits'], 1)
+
+
+@unittest.skipIf(faiss is None, 'faiss is not installed')
+class HybridSearchTests(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(rag_pipeline, 'FAISS_AVAILABLE', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.rag = make_pipeline()
+        self.code_faq = {
+            'title': 'Lab schedule',
+            'content': 'CS205 meets in the spring term with weekly labs and a final project',
+            'type': 'faq',
+            'id': 1,
+        }
+        self.rag.add_documents(make_documents(40) + [self.code_faq])
+
+    def ids(self, query, top_k=3):
+        return [(doc['type'], doc['id']) for doc in self.rag.retrieve(query, top_k=top_k)]
+
+    def test_exact_term_missed_by_vectors_is_retrieved(self):
+        with override_settings(RAG_HYBRID_SEARCH=False):
+            self.assertNotIn(('faq', 1), self.ids('enrollment CS205'))
+        self.assertIn(('faq', 1), self.ids('enrollment CS205'))
+
+    def test_keyword_index_follows_updates_and_removals(self):
+        self.rag.add_documents([dict(self.code_faq, content='CS301 meets on Fridays')])
+        self.assertEqual(self.rag.lexical.search('CS205', 5), [])
+        self.assertEqual(self.ids('CS301', top_k=1), [('faq', 1)])
+
+        self.rag.remove_instances('faq', [1])
+
+        self.assertEqual(self.rag.lexical.search('CS301', 5), [])
+        self.assertEqual(len(self.rag.lexical), self.rag.document_count())
+
+    @override_settings(RAG_HYBRID_CANDIDATES=5)
+    def test_results_carry_fused_scores(self):
+        results = self.rag.retrieve('refund policy', top_k=4)
+
+        self.assertEqual(len(results), 4)
+        self.assertTrue(all(0 < doc['score'] <= 2 / 61 for doc in results))
+        self.assertEqual([doc['score'] for doc in results], sorted((doc['score'] for doc in results), reverse=True))
+
+
+
+class StubCrossEncoder:
+    """Scores passages containing ``preferred`` highest, after an optional delay."""
+
+    def __init__(self, preferred, delay=0.0):
+        self.preferred = preferred
+        self.delay = delay
+        self.batches = []
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        self.batches.append(len(pairs))
+        time.sleep(self.delay)
+        return np.array([float(self.preferred in passage) for _, passage in pairs])
+
+
+@unittest.skipIf(faiss is None, 'faiss is not installed')
+@override_settings(RAG_RERANK=True, RAG_RERANK_CANDIDATES=10, RAG_RERANK_BUDGET_MS=5000, RAG_HYBRID_SEARCH=False)
+class RerankTests(SimpleTestCase):
+    query = 'refund policy details'
+
+    def setUp(self):
+        patcher = mock.patch.object(rag_pipeline, 'FAISS_AVAILABLE', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.rag = make_pipeline()
+        self.rag.add_documents(make_documents(40))
+        with override_settings(RAG_RERANK=False):
+            self.first_stage = self.rag.retrieve(self.query, top_k=10)
+
+    def test_best_candidate_is_promoted(self):
+        promoted = self.first_stage[7]
+        self.rag.reranker = StubCrossEncoder(promoted['title'])
+        timings = {}
+
+        results = self.rag.retrieve(self.query, top_k=3, timings=timings)
+
+        self.assertEqual(len(results), 3)
+        self.assertEqual((results[0]['id'], results[0]['score']), (promoted['id'], 1.0))
+        self.assertEqual(self.rag.reranker.batches, [10])  # All candidates in one batch
+        self.assertTrue(timings['reranked'])
+        self.assertEqual({'embed_ms', 'search_ms', 'rerank_ms'} - set(timings), set())
+
+    @override_settings(RAG_RERANK_BUDGET_MS=20)
+    def test_exceeded_budget_keeps_first_stage_order(self):
+        self.rag.reranker = StubCrossEncoder(self.first_stage[7]['title'], delay=0.3)
+        timings = {}
+
+        started = time.perf_counter()
+        results = self.rag.retrieve(self.query, top_k=3, timings=timings)
+
+        self.assertLess(time.perf_counter() - started, 0.2)
+        self.assertEqual(results, self.first_stage[:3])
+        self.assertFalse(timings['reranked'])
+
+    def test_unavailable_model_disables_reranking(self):
+        with mock.patch.dict('sys.modules', {'sentence_transformers': None}), mock.patch('builtins.print'):
+            results = self.rag.retrieve(self.query, top_k=3)
+
+        self.assertEqual(results, self.first_stage[:3])
+        self.assertIs(self.rag.reranker, False)
+        self.assertEqual(self.rag.retrieve(self.query, top_k=3), self.first_stage[:3])
+
+
+class StubGemini:
+
+    def __init__(self):
+        self.prompts = []
+
+    def generate_content(self, prompt, stream=False):
+        self.prompts.append(prompt)
+        text = f'answer {len(self.prompts)}'
+        if stream:
+            return [mock.Mock(text=word + ' ') for word in text.split()]
+        return mock.Mock(text=text)
+
+
+@unittest.skipIf(faiss is None, 'faiss is not installed')
+@mock.patch.object(rag_pipeline, 'FAISS_AVAILABLE', True)
+class AnswerCacheTests(TestCase):
+
+    def setUp(self):
+        self.rag = make_pipeline()
+        self.rag.gemini_model = StubGemini()
+        self.rag.add_documents(make_documents(10))
+
+    def test_near_identical_first_turn_question_skips_llm(self):
+        first, context = self.rag.generate_response('What is the refund policy?')
+        second, cached_context = self.rag.generate_response('what is the  refund policy?')
+
+        self.assertEqual(first, second)
+        self.assertEqual(context, cached_context)
+        self.assertEqual(len(self.rag.gemini_model.prompts), 1)
+
+    def test_follow_up_questions_are_not_cached(self):
+        history = [{'role': 'user', 'content': 'hi'}, {'role': 'assistant', 'content': 'hello'}]
+        self.rag.generate_response('What is the refund policy?', chat_history=history)
+        self.rag.generate_response('What is the refund policy?', chat_history=history)
+
+        self.assertEqual(len(self.rag.gemini_model.prompts), 2)
+
+    def test_knowledge_base_change_invalidates_answers(self):
+        self.rag.generate_response('What is the refund policy?')
+
+        with mock.patch.object(rag_pipeline, '_rag_pipeline', self.rag):
+            FAQ.objects.create(question='Refund?', answer='Within 7 days.')
+        self.rag.generate_response('What is the refund policy?')
+
+        self.assertEqual(len(self.rag.gemini_model.prompts), 2)
+
+    def test_stream_yields_context_then_tokens_and_fills_cache(self):
+        events = list(self.rag.stream_response('What is the refund policy?'))
+
+        self.assertEqual(events[0][0], 'context')
+        self.assertEqual([data for event, data in events[1:]], ['answer ', '1 '])
+        self.assertEqual(self.rag.generate_response('What is the refund policy?')[0], 'answer 1 ')
+        self.assertEqual(len(self.rag.gemini_model.prompts), 1)
+
+
+@unittest.skipIf(faiss is None, 'faiss is not installed')
+class WarmupTests(SimpleTestCase):
+
+    def setUp(self):
+        for name, value in (('FAISS_AVAILABLE', True), ('_rag_pipeline', None), ('_warmup_thread', None),
+                            ('_warmup_error', None)):
+            patcher = mock.patch.object(rag_pipeline, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.release = threading.Event()
+
+    def slow_load(self):
+        self.release.wait(5)
+        return self.rag
+
+    def wait_for_warmup(self):
+        rag_pipeline._warmup_thread.join(5)
+        self.assertFalse(rag_pipeline._warmup_thread.is_alive())
+
+    def test_pipeline_loads_in_background_once(self):
+        self.rag = make_pipeline()
+        self.rag.gemini_model = StubGemini()
+        with mock.patch.object(rag_pipeline, 'load_rag_pipeline', side_effect=self.slow_load) as load:
+            self.assertTrue(rag_pipeline.start_warmup())
+            self.assertFalse(rag_pipeline.start_warmup())
+            self.assertEqual(rag_pipeline.pipeline_state(), 'loading')
+
+            self.release.set()
+            self.assertIs(rag_pipeline.get_rag_pipeline(), self.rag)  # Waits for the warmup thread
+            self.wait_for_warmup()
+
+        load.assert_called_once()
+        self.assertEqual(rag_pipeline.pipeline_state(), 'ready')
+        self.assertFalse(rag_pipeline.start_warmup())
+
+    def test_pipeline_without_gemini_or_retrieval_is_degraded(self):
+        self.rag = make_pipeline()
+        self.release.set()
+        with mock.patch.object(rag_pipeline, 'load_rag_pipeline', side_effect=self.slow_load):
+            rag_pipeline.start_warmup()
+            self.wait_for_warmup()
+
+        self.assertEqual(rag_pipeline.pipeline_state(), 'degraded')
+
+    def test_failed_warmup_is_degraded_and_retried(self):
+        with mock.patch.object(rag_pipeline, 'load_rag_pipeline', side_effect=RuntimeError('no disk')):
+            rag_pipeline.start_warmup()
+            self.wait_for_warmup()
+            self.assertEqual(rag_pipeline.pipeline_state(), 'degraded')
+
+        self.rag = make_pipeline()
+        self.rag.gemini_model = StubGemini()
+        self.release.set()
+        with mock.patch.object(rag_pipeline, 'load_rag_pipeline', side_effect=self.slow_load):
+            self.assertTrue(rag_pipeline.start_warmup())
+            self.wait_for_warmup()
+
+        self.assertEqual(rag_pipeline.pipeline_state(), 'ready')
+
+    def test_failed_warm_up_of_a_built_pipeline_is_retried(self):
+        self.rag = make_pipeline()
+        self.rag.gemini_model = StubGemini()
+        self.release.set()
+        with mock.patch.object(rag_pipeline, 'load_rag_pipeline', side_effect=self.slow_load), \
+                mock.patch.object(self.rag, 'warm_up', side_effect=[RuntimeError('encoder crashed'), None]):
+            rag_pipeline.start_warmup()
+            self.wait_for_warmup()
+            self.assertIs(rag_pipeline._rag_pipeline, self.rag)
+            self.assertEqual(rag_pipeline.pipeline_state(), 'degraded')
+
+            self.assertTrue(rag_pipeline.start_warmup())
+            self.wait_for_warmup()
+
+        self.assertEqual(rag_pipeline.pipeline_state(), 'ready')
+        self.assertFalse(rag_pipeline.start_warmup())
@@ -0,0 +1,113 @@
+"""
+Tests for token-budgeted prompt assembly.
+"""
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from rag import prompt as rag_prompt
+from rag.prompt import PromptBuilder, estimate_tokens, truncate_tokens
+
+
+def document(i, words=100):
+    return {
+        'title': f'Guide {i}',
+        'content': ' '.join(f'topic{i} detail{j}' for j in range(words // 2)),
+        'type': 'document',
+        'id': i,
+        'chunk': 0,
+    }
+
+
+HISTORY = [
+    {'role': 'user', 'content': 'How do refunds work for the data science course?'},
+    {'role': 'assistant', 'content': 'Refunds are available within 7 days of purchase. ' * 5},
+    {'role': 'user', 'content': 'And for bundles?'},
+]
+
+
+class TokenEstimateTests(SimpleTestCase):
+
+    def test_estimate_counts_word_pieces_and_punctuation(self):
+        self.assertEqual(estimate_tokens('How do I pay?'), 5)
+        self.assertEqual(estimate_tokens('enrollment'), 3)
+        self.assertEqual(estimate_tokens('Hi there.\nNext line'), estimate_tokens('Hi there.') + estimate_tokens('Next line'))
+
+    def test_truncate_keeps_prefix_within_limit(self):
+        text = 'Refunds are available within seven days.'
+
+        self.assertEqual(truncate_tokens(text, 3), 'Refunds are')
+        self.assertEqual(truncate_tokens(text, 100), text)
+        self.assertEqual(truncate_tokens(text, 0), '')
+
+
+class PromptBuilderTests(SimpleTestCase):
+
+    def setUp(self):
+        self.builder = PromptBuilder()
+
+    def test_large_budget_includes_everything(self):
+        context = [document(1), document(2)]
+
+        prompt = self.builder.build('What is the refund policy?', context, HISTORY, budget=10000)
+
+        self.assertTrue(prompt.startswith(rag_prompt.SYSTEM_PROMPT))
+        for doc in context:
+            self.assertIn(doc['content'], prompt)
+        for msg in HISTORY:
+            self.assertIn(msg['content'], prompt)
+        self.assertLess(prompt.index('--- Relevant Information ---'), prompt.index('--- Previous Conversation ---'))
+        self.assertIn('User Question: What is the refund policy?', prompt)
+        self.assertTrue(prompt.endswith('Please provide a helpful response:'))
+
+    def test_prompt_stays_within_budget(self):
+        context = [document(i, words=300) for i in range(1, 6)]
+
+        for budget in [150, 300, 500, 800, 1200, 3000]:
+            with self.subTest(budget=budget):
+                prompt = self.builder.build('What is the refund policy?', context, HISTORY, budget=budget)
+                self.assertLessEqual(estimate_tokens(prompt), budget)
+
+    def test_documents_fill_before_history(self):
+        context = [document(1), document(2), document(3)]
+        fixed = estimate_tokens(self.builder.build('Refunds?', budget=10000))
+        section = estimate_tokens(rag_prompt.CONTEXT_START + rag_prompt.CONTEXT_END)
+        whole = estimate_tokens('\n[1] Guide 1') + self.builder.token_counts.count(context[0])
+        budget = fixed + section + 2 * whole + 50
+
+        prompt = self.builder.build('Refunds?', context, HISTORY, budget=budget)
+
+        self.assertIn(context[0]['content'], prompt)
+        self.assertIn(context[1]['content'], prompt)
+        self.assertIn('[3] Guide 3', prompt)  # The third document is cut short
+        self.assertNotIn(context[2]['content'], prompt)
+        self.assertNotIn('Previous Conversation', prompt)
+
+    def test_newest_history_is_kept(self):
+        fixed = estimate_tokens(self.builder.build('Refunds?', budget=10000))
+        prompt = self.builder.build('Refunds?', [], HISTORY, budget=fixed + 40)
+
+        self.assertIn('User: And for bundles?', prompt)
+        self.assertNotIn('data science course', prompt)
+
+    def test_question_is_kept_whole_unless_over_budget(self):
+        question = 'Which certificate do I get after finishing every module of the course?'
+
+        self.assertIn(question, self.builder.build(question, [document(1, words=5000)], budget=200))
+        long_question = ' '.join([question] * 50)
+        self.assertEqual(estimate_tokens(self.builder.build(long_question, budget=200)), 200)
+
+    def test_document_token_counts_are_cached(self):
+        context = [document(1), document(2)]
+        self.builder.build('Refunds?', context, budget=10000)
+
+        with mock.patch.object(rag_prompt, 'estimate_tokens', wraps=estimate_tokens) as estimate:
+            self.builder.build('Certificates?', context, budget=10000)
+            edited = dict(context[0], content='Refunds take seven days.')
+            self.builder.build('Certificates?', [edited], budget=10000)
+
+        counted = [call.args[0] for call in estimate.call_args_list]
+        self.assertNotIn(context[0]['content'], counted)
+        self.assertNotIn(context[1]['content'], counted)
+        self.assertIn(edited['content'], counted)
+        self.assertEqual(len(self.builder.token_counts), 3)
@@ -0,0 +1,114 @@
+"""
+Query-plan tests for the chat hot paths.
+
+Every query the chat views and the retention job send for chat sessions and
+messages is captured, EXPLAINed on the database under test and rejected if
+the plan reads a whole table. Runs on SQLite by default, where sorting a
+whole result is rejected too, and on PostgreSQL when the suite is pointed
+at one (DB_HOST/DB_NAME or DATABASE_URL); there sequential scans are
+disabled so that a missing index shows up even on the near-empty tables.
+"""
+import re
+import unittest
+from datetime import timedelta
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.models import ChatMessage, ChatSession, User
+from tasks.scheduler import cleanup_old_chat_history
+
+from .test_views import StubPipeline
+
+CHAT_TABLES = (ChatSession._meta.db_table, ChatMessage._meta.db_table)
+PLANNED = ('SELECT', 'UPDATE', 'DELETE')
+
+
+def full_scans(sql):
+    """Plan steps that read a whole table (or, on SQLite, sort a whole result) to run ``sql``."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            steps = [row[-1] for row in cursor.fetchall()]
+            # "SCAN t" reads the table; "SCAN t USING [COVERING] INDEX i" walks an index in order.
+            # A temp B-tree for the whole ORDER BY means no index provides the order.
+            return [step for step in steps if re.match(r'SCAN \w+$|USE TEMP B-TREE FOR ORDER BY', step)]
+        cursor.execute(f'EXPLAIN {sql}')
+        plan = '\n'.join(row[0] for row in cursor.fetchall())
+        return re.findall(r'Seq Scan on \w+', plan)
+
+
+@unittest.skipUnless(connection.vendor in ('sqlite', 'postgresql'), 'EXPLAIN parsing supports SQLite and PostgreSQL')
+class ChatQueryPlanTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='learner', email='learner@example.com', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        patcher = mock.patch('api.views.get_rag_pipeline', return_value=StubPipeline())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        for i in range(3):
+            session = ChatSession.objects.create(user=self.user, title=f'Session {i}')
+            for j in range(4):
+                session.add_message('user' if j % 2 == 0 else 'assistant', f'Message {j}')
+        self.session = session
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')  # Until the test's transaction ends
+
+    def assertUsesIndexes(self, queries):
+        checked = 0
+        for query in queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith(PLANNED) or not any(table in sql for table in CHAT_TABLES):
+                continue
+            checked += 1
+            with self.subTest(sql=sql):
+                self.assertEqual(full_scans(sql), [])
+        self.assertGreater(checked, 0)
+
+    def test_chat_history_list(self):
+        with CaptureQueriesContext(connection) as queries:
+            page = self.client.get(reverse('chat-history'), {'page_size': 2}).json()
+            self.client.get(page['next'])
+        self.assertUsesIndexes(queries)
+
+    def test_session_detail_pages(self):
+        url = reverse('chat-session-detail', args=[self.session.id])
+        first_id = self.session.messages.order_by('id').first().id
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, {'limit': 2})
+            self.client.get(url, {'limit': 2, 'before': first_id + 2})
+            self.client.get(url, {'limit': 2, 'after': first_id})
+        self.assertUsesIndexes(queries)
+
+    def test_chat_message_and_history(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('chat'), {'message': 'Next?', 'session_id': self.session.id}, format='json')
+        self.assertUsesIndexes(queries)
+
+    def test_session_delete(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.delete(reverse('chat-session-detail', args=[self.session.id]))
+        self.assertUsesIndexes(queries)
+
+    @override_settings(CHAT_CLEANUP_BATCH_SIZE=2, CHAT_CLEANUP_BATCH_PAUSE=0)
+    def test_retention_cleanup(self):
+        old = timezone.now() - timedelta(days=400)
+        ChatMessage.objects.filter(session=self.session).update(created_at=old)
+        ChatSession.objects.filter(pk=self.session.pk).update(updated_at=old)
+        ChatSession.objects.create(user=self.user, title='Closed', is_active=False)
+        ChatSession.objects.filter(title='Closed').update(updated_at=old)
+
+        with CaptureQueriesContext(connection) as queries, mock.patch('builtins.print'):
+            stats = cleanup_old_chat_history()
+
+        self.assertEqual(stats['messages'][0], 4)
+        self.assertUsesIndexes(queries)
@@ -0,0 +1,60 @@
+"""
+Tests for the chat history retention job.
+"""
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api.models import ChatMessage, ChatSession
+from tasks.scheduler import cleanup_old_chat_history
+
+
+@override_settings(CHAT_HISTORY_RETENTION_DAYS=30, CHAT_CLEANUP_BATCH_SIZE=3, CHAT_CLEANUP_BATCH_PAUSE=0)
+class CleanupOldChatHistoryTests(TestCase):
+
+    def setUp(self):
+        self.old = timezone.now() - timedelta(days=40)
+        self.mixed = self.create_session('Mixed', old=4, new=2)
+        self.stale = self.create_session('Stale', old=3)
+        self.closed = self.create_session('Closed', old=2, is_active=False)
+        self.fresh_empty = ChatSession.objects.create(title='Just started')
+
+    def create_session(self, title, old=0, new=0, is_active=True):
+        session = ChatSession.objects.create(title=title, is_active=is_active)
+        for i in range(old + new):
+            session.add_message('user', f'{title} {i}')
+        old_ids = session.messages.order_by('id').values_list('id', flat=True)[:old]
+        ChatMessage.objects.filter(id__in=list(old_ids)).update(created_at=self.old)
+        if not new:
+            ChatSession.objects.filter(pk=session.pk).update(updated_at=self.old)
+        ChatSession.objects.filter(pk=session.pk).refresh_message_stats()
+        return session
+
+    def test_deletes_old_rows_in_batches_and_refreshes_counters(self):
+        with mock.patch('builtins.print'):
+            stats = cleanup_old_chat_history()
+
+        self.assertEqual(stats['messages'][0], 9)
+        self.assertEqual(stats['empty sessions'][0], 2)
+        self.assertEqual(
+            set(ChatSession.objects.values_list('title', flat=True)), {'Mixed', 'Just started'}
+        )
+        self.mixed.refresh_from_db()
+        self.assertEqual(self.mixed.message_count, 2)
+        self.assertEqual(list(self.mixed.messages.values_list('content', flat=True)), ['Mixed 4', 'Mixed 5'])
+
+    def test_interrupted_run_resumes(self):
+        with mock.patch('builtins.print'), mock.patch('tasks.scheduler.time.sleep', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                cleanup_old_chat_history(pause=1)
+
+        self.assertEqual(ChatMessage.objects.filter(created_at__lt=timezone.now() - timedelta(days=30)).count(), 6)
+
+        with mock.patch('builtins.print'):
+            stats = cleanup_old_chat_history()
+
+        self.assertEqual(stats['messages'][0], 6)
+        self.assertFalse(ChatMessage.objects.filter(created_at__lt=timezone.now() - timedelta(days=30)).exists())
+        self.assertEqual(ChatMessage.objects.count(), 2)
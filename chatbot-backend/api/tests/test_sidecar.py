@@ -0,0 +1,76 @@
+"""
+Tests for the shared embedding/search sidecar.
+"""
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from api.tests.test_pipeline import faiss, make_documents, make_pipeline
+from rag import pipeline as rag_pipeline
+from rag.sidecar import SidecarClient, SidecarError, SidecarRAGPipeline, SidecarServer
+
+
+@unittest.skipIf(faiss is None, 'faiss is not installed')
+class SidecarTests(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(rag_pipeline, 'FAISS_AVAILABLE', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.address = os.path.join(tmp.name, 'rag.sock')
+
+        self.local = make_pipeline()
+        self.local.add_documents(make_documents(20))
+        self.server = SidecarServer(self.local, self.address, authkey=b'test')
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(self.server.close)
+        while not os.path.exists(self.address):
+            pass
+
+        with mock.patch.object(SidecarRAGPipeline, '_initialize_gemini'):
+            self.remote = SidecarRAGPipeline(SidecarClient(self.address, authkey=b'test', timeout=5))
+
+    def test_retrieve_matches_local_pipeline(self):
+        for query in ['refund policy', 'stripe payment 4']:
+            self.assertEqual(self.remote.retrieve(query, top_k=3), self.local.retrieve(query, top_k=3))
+        self.assertEqual(self.remote.document_count(), 20)
+
+    def test_removal_is_applied_in_sidecar(self):
+        self.remote.remove_instances('document', [1, 2])
+
+        self.assertEqual(self.local.document_count(), 18)
+        self.assertNotIn(1, [doc['id'] for doc in self.remote.retrieve('refund policy 1', top_k=5)])
+
+    def test_errors_are_raised_in_worker(self):
+        with self.assertRaisesMessage(SidecarError, 'KeyError'):
+            self.remote.remove_instances('course', [1])
+
+    def test_unavailable_sidecar(self):
+        client = SidecarClient(self.address + '.missing', authkey=b'test')
+
+        with self.assertRaises(SidecarError):
+            client.call('stats')
+
+    def test_state_follows_the_sidecar(self):
+        self.assertTrue(self.remote._can_embed())
+        self.assertTrue(self.remote._has_documents())
+
+        with mock.patch.object(SidecarRAGPipeline, '_initialize_gemini'):
+            offline = SidecarRAGPipeline(SidecarClient(self.address + '.missing', authkey=b'test'))
+        self.assertFalse(offline._can_embed())
+        self.assertEqual(offline.retrieve('refund policy'), [])
+        self.assertEqual(offline.state(), 'degraded')
+
+    def test_empty_sidecar_index_has_no_documents(self):
+        self.remote.remove_instances('document', list(range(1, 21)))
+
+        self.assertTrue(self.remote._can_embed())
+        self.assertFalse(self.remote._has_documents())
@@ -0,0 +1,340 @@
+"""
+Tests for the chat API views.
+"""
+import asyncio
+import json
+from unittest import mock
+
+from django.test import AsyncClient, TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from api.models import ChatMessage, ChatSession, User
+
+
+class StubPipeline:
+    """Stands in for RAGPipeline with a canned, chunked answer."""
+
+    context = [{'title': 'Refund policy', 'content': 'Within 7 days.', 'type': 'document', 'id': 1, 'score': 0.9}]
+    chunks = ['Refunds are ', 'available within ', '7 days.']
+
+    def __init__(self):
+        self.calls = []
+
+    def generate_response(self, query, context=None, chat_history=None, timings=None):
+        self.calls.append((query, chat_history))
+        if timings is not None:
+            timings.update(embed_ms=1.0, search_ms=0.5)
+        return ''.join(self.chunks), self.context
+
+    async def agenerate_response(self, query, chat_history=None):
+        return self.generate_response(query, chat_history=chat_history)
+
+    def stream_response(self, query, chat_history=None, timings=None):
+        self.calls.append((query, chat_history))
+        if timings is not None:
+            timings.update(embed_ms=1.0, search_ms=0.5)
+        yield 'context', self.context
+        for chunk in self.chunks:
+            yield 'token', chunk
+
+
+class SlowStubPipeline(StubPipeline):
+    """Async generation that waits like a remote LLM and records overlap."""
+
+    def __init__(self):
+        super().__init__()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    async def agenerate_response(self, query, chat_history=None):
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        await asyncio.sleep(0.2)
+        self.in_flight -= 1
+        return self.generate_response(query, chat_history=chat_history)
+
+
+def parse_events(response):
+    body = b''.join(response.streaming_content).decode()
+    events = []
+    for block in body.strip().split('\n\n'):
+        event, data = block.split('\n', 1)
+        events.append((event.removeprefix('event: '), json.loads(data.removeprefix('data: '))))
+    return events
+
+
+class ChatViewTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.rag = StubPipeline()
+        patcher = mock.patch('api.views.get_rag_pipeline', return_value=self.rag)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_chat_returns_answer_and_saves_both_messages(self):
+        response = self.client.post(reverse('chat'), {'message': 'Refund policy?'}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['assistant_message']['content'], 'Refunds are available within 7 days.')
+        self.assertEqual(response.data['retrieved_documents'], [{'title': 'Refund policy', 'type': 'document'}])
+        self.assertEqual(ChatMessage.objects.count(), 2)
+        self.assertEqual(self.rag.calls, [('Refund policy?', [])])
+
+    def test_history_is_the_latest_messages_oldest_first(self):
+        session = ChatSession.objects.create(title='Long chat')
+        for i in range(10):
+            session.add_message('user' if i % 2 == 0 else 'assistant', f'Message {i}')
+
+        with self.settings(CHAT_HISTORY_MESSAGES=4):
+            self.client.post(reverse('chat'), {'message': 'Next?', 'session_id': session.id}, format='json')
+
+        self.assertEqual([m['content'] for m in self.rag.calls[0][1]], [f'Message {i}' for i in range(6, 10)])
+
+    def test_messages_update_session_counters(self):
+        response = self.client.post(reverse('chat'), {'message': 'Refund policy?'}, format='json')
+        self.client.post(reverse('chat'), {'message': 'x' * 150, 'session_id': response.data['session_id']}, format='json')
+
+        session = ChatSession.objects.get(id=response.data['session_id'])
+        latest = session.messages.order_by('-created_at', '-id').first()
+        self.assertEqual(session.message_count, 4)
+        self.assertEqual((session.last_message_role, session.last_message_at), ('assistant', latest.created_at))
+        self.assertEqual(session.last_message_preview, latest.content)
+
+        ChatSession.objects.update(message_count=0, last_message_at=None, last_message_preview='', last_message_role='')
+        ChatSession.objects.refresh_message_stats()
+        session.refresh_from_db()
+        self.assertEqual((session.message_count, session.last_message_role), (4, 'assistant'))
+        self.assertEqual(session.last_message_at, latest.created_at)
+
+    def test_logs_only_the_stages_that_ran(self):
+        with mock.patch('builtins.print') as log:
+            self.client.post(reverse('chat'), {'message': 'Refund policy?'}, format='json')
+            events = parse_events(self.client.post(reverse('chat-stream'), {'message': 'Refund policy?'}, format='json'))
+
+        answered, streamed = (call.args[0] for call in log.call_args_list)
+        self.assertRegex(answered, r'^\[Chat\] Answered session \d+: embed 1.0ms, search 0.5ms, total [\d.]+ms$')
+        self.assertRegex(streamed, r': ttfb [\d.]+ms, embed 1.0ms, search 0.5ms, first token [\d.]+ms, total [\d.]+ms$')
+        self.assertNotIn('rerank', streamed)
+        self.assertEqual(events[-1][0], 'done')
+
+    def test_unknown_session_is_404(self):
+        response = self.client.post(reverse('chat'), {'message': 'Hi', 'session_id': 999}, format='json')
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_stream_sends_metadata_then_tokens_then_done(self):
+        response = self.client.post(reverse('chat-stream'), {'message': 'Refund policy?'}, format='json')
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = parse_events(response)
+        self.assertEqual([name for name, _ in events], ['meta', 'token', 'token', 'token', 'done'])
+
+        meta, done = events[0][1], events[-1][1]
+        self.assertEqual(meta['retrieved_documents'], [{'title': 'Refund policy', 'type': 'document'}])
+        self.assertEqual(''.join(data['text'] for name, data in events if name == 'token'), ''.join(StubPipeline.chunks))
+        self.assertEqual(done['assistant_message']['content'], 'Refunds are available within 7 days.')
+        self.assertLessEqual(done['timings']['ttfb_ms'], done['timings']['total_ms'])
+        self.assertEqual((done['timings']['embed_ms'], done['timings']['search_ms']), (1.0, 0.5))
+
+        session = ChatSession.objects.get(id=meta['session_id'])
+        self.assertEqual(list(session.messages.values_list('role', flat=True)), ['user', 'assistant'])
+
+    def test_disconnected_stream_keeps_partial_answer(self):
+        response = self.client.post(reverse('chat-stream'), {'message': 'Refund policy?'}, format='json')
+        stream = iter(response.streaming_content)
+        next(stream)  # meta
+        next(stream)  # first token
+        response.close()
+
+        answer = ChatMessage.objects.get(role='assistant')
+        self.assertEqual(answer.content, 'Refunds are ')
+
+
+class ChatHistoryViewTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='learner', email='learner@example.com', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_sessions(self, count, messages=3):
+        for i in range(count):
+            session = ChatSession.objects.create(user=self.user, title=f'Session {i}')
+            ChatMessage.objects.bulk_create(
+                ChatMessage(session=session, role='user' if j % 2 == 0 else 'assistant', content=f'Message {j} ' * 30)
+                for j in range(messages)
+            )
+        ChatSession.objects.refresh_message_stats()
+
+    def test_query_count_does_not_grow_with_sessions(self):
+        self.create_sessions(3)
+        with self.assertNumQueries(1):
+            small = self.client.get(reverse('chat-history'), {'page_size': 100})
+
+        self.create_sessions(30)
+        with self.assertNumQueries(1):
+            large = self.client.get(reverse('chat-history'), {'page_size': 100})
+
+        self.assertEqual(len(small.json()['results']), 3)
+        self.assertEqual(len(large.json()['results']), 33)
+
+    def test_sessions_carry_count_and_last_message(self):
+        self.create_sessions(1, messages=4)
+        ChatSession.objects.create(user=self.user, title='Empty')
+        ChatSession.objects.create(title='Someone else')
+
+        results = self.client.get(reverse('chat-history')).json()['results']
+
+        self.assertEqual([r['title'] for r in results], ['Empty', 'Session 0'])
+        self.assertEqual((results[0]['message_count'], results[0]['last_message']), (0, None))
+        last = results[1]['last_message']
+        self.assertEqual(results[1]['message_count'], 4)
+        self.assertEqual((last['role'], last['content']), ('assistant', ('Message 3 ' * 30)[:100] + '...'))
+
+    def test_cursor_pages_cover_every_session_once(self):
+        self.create_sessions(7, messages=1)
+
+        seen, url = [], reverse('chat-history') + '?page_size=3'
+        while url:
+            page = self.client.get(url).json()
+            seen.extend(r['id'] for r in page['results'])
+            url = page['next']
+
+        self.assertEqual(sorted(seen), sorted(ChatSession.objects.values_list('id', flat=True)))
+        self.assertEqual(len(seen), 7)
+
+
+class ChatSessionDetailViewTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='learner', email='learner@example.com', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.session = ChatSession.objects.create(user=self.user, title='Long session')
+        ChatMessage.objects.bulk_create(
+            ChatMessage(session=self.session, role='user', content=f'Message {i}') for i in range(25)
+        )
+        ChatSession.objects.refresh_message_stats()
+        self.ids = list(self.session.messages.order_by('id').values_list('id', flat=True))
+        self.url = reverse('chat-session-detail', args=[self.session.id])
+
+    def test_default_page_is_the_latest_messages(self):
+        with self.assertNumQueries(2):
+            data = self.client.get(self.url, {'limit': 10}).json()
+
+        self.assertEqual([m['id'] for m in data['messages']], self.ids[:-11:-1])
+        self.assertEqual(data['message_count'], 25)
+        self.assertEqual(data['older_cursor'], self.ids[15])
+        self.assertEqual(data['newer_cursor'], self.ids[-1])
+
+    def test_before_pages_back_to_the_start(self):
+        seen, cursor = [], None
+        while True:
+            params = {'limit': 10, **({'before': cursor} if cursor else {})}
+            data = self.client.get(self.url, params).json()
+            seen.extend(m['id'] for m in data['messages'])
+            cursor = data['older_cursor']
+            if cursor is None:
+                break
+
+        self.assertEqual(seen, self.ids[::-1])
+
+    def test_after_returns_newer_messages(self):
+        data = self.client.get(self.url, {'after': self.ids[19], 'limit': 3}).json()
+        empty = self.client.get(self.url, {'after': self.ids[-1]}).json()
+
+        self.assertEqual([m['id'] for m in data['messages']], [self.ids[22], self.ids[21], self.ids[20]])
+        self.assertEqual(data['newer_cursor'], self.ids[22])
+        self.assertEqual((empty['messages'], empty['newer_cursor']), ([], self.ids[-1]))
+
+    def test_invalid_parameters(self):
+        both = self.client.get(self.url, {'before': 5, 'after': 2})
+        too_many = self.client.get(self.url, {'limit': 1000})
+
+        self.assertEqual((both.status_code, too_many.status_code), (400, 400))
+
+
+class AsyncChatViewTests(TestCase):
+
+    def setUp(self):
+        self.rag = StubPipeline()
+        patcher = mock.patch('api.views.get_rag_pipeline', return_value=self.rag)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_async_chat_matches_sync_contract(self):
+        client = AsyncClient()
+        first = await client.post(reverse('chat-async'), {'message': 'Refund policy?'}, content_type='application/json')
+        session_id = first.json()['session_id']
+        second = await client.post(
+            reverse('chat-async'), {'message': 'And after 7 days?', 'session_id': session_id},
+            content_type='application/json',
+        )
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.json()['assistant_message']['content'], 'Refunds are available within 7 days.')
+        self.assertEqual(second.json()['session_id'], session_id)
+        self.assertEqual(await ChatMessage.objects.filter(session_id=session_id).acount(), 4)
+        self.assertEqual(self.rag.calls[1][1], [
+            {'role': 'user', 'content': 'Refund policy?'},
+            {'role': 'assistant', 'content': 'Refunds are available within 7 days.'},
+        ])
+
+    async def test_async_chat_validates_input(self):
+        client = AsyncClient()
+        missing = await client.post(reverse('chat-async'), {}, content_type='application/json')
+        unknown = await client.post(reverse('chat-async'), {'message': 'Hi', 'session_id': 999}, content_type='application/json')
+        bad_token = await client.post(
+            reverse('chat-async'), {'message': 'Hi'}, content_type='application/json',
+            headers={'Authorization': 'Bearer not-a-token'},
+        )
+
+        self.assertEqual(missing.status_code, 400)
+        self.assertEqual(unknown.status_code, 404)
+        self.assertEqual(bad_token.status_code, 401)
+
+    async def test_async_chat_requests_overlap(self):
+        # A sync-only middleware would run the view in one thread, one request at a time
+        rag = SlowStubPipeline()
+        client = AsyncClient()
+        with mock.patch('api.views.get_rag_pipeline', return_value=rag):
+            responses = await asyncio.gather(*(
+                client.post(reverse('chat-async'), {'message': f'Question {i}'}, content_type='application/json')
+                for i in range(3)
+            ))
+
+        self.assertEqual([r.status_code for r in responses], [200, 200, 200])
+        self.assertEqual(rag.peak_in_flight, 3)
+
+
+class HealthCheckViewTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch('api.views.start_warmup')
+        self.start_warmup = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_loading_pipeline_is_unavailable(self):
+        with mock.patch('api.views.pipeline_state', return_value='loading'), \
+                mock.patch('api.views.get_loaded_rag_pipeline', return_value=None):
+            response = APIClient().get(reverse('health'))
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['rag'], {'state': 'loading'})
+        self.start_warmup.assert_called_once()
+
+    def test_ready_and_degraded_pipelines_serve_traffic(self):
+        rag = mock.Mock()
+        rag.query_cache.stats.return_value = {'hits': 1}
+        rag.answer_cache.stats.return_value = {'hits': 0}
+        for state in ('ready', 'degraded'):
+            with mock.patch('api.views.pipeline_state', return_value=state), \
+                    mock.patch('api.views.get_loaded_rag_pipeline', return_value=rag):
+                response = APIClient().get(reverse('health'))
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['status'], 'healthy')
+            self.assertEqual(response.json()['rag']['state'], state)
+            self.assertEqual(response.json()['rag']['query_cache'], {'hits': 1})
@@ -5,7 +5,8 @@ from django.urls import path
 from .views import (
     SignUpView, LoginView, RefreshTokenView, VerifyEmailView,
     UserProfileView, ChatHistoryView, ChatSessionDetailView,
-    ChatView, NewChatView, DocumentListView, FAQListView, HealthCheckView
+    ChatView, ChatStreamView, AsyncChatView, NewChatView, DocumentListView, FAQListView,
+    KnowledgeBaseBulkImportView, HealthCheckView
 )
 
 urlpatterns = [
@@ -23,11 +24,15 @@ urlpatterns = [
 
     # Chat
     path('chat/', ChatView.as_view(), name='chat'),
+    path('chat/stream/', ChatStreamView.as_view(), name='chat-stream'),
+    path('chat/async/', AsyncChatView.as_view(), name='chat-async'),
     path('chat/new/', NewChatView.as_view(), name='new-chat'),
     path('chat-history/', ChatHistoryView.as_view(), name='chat-history'),
     path('chat-history/<int:session_id>/', ChatSessionDetailView.as_view(), name='chat-session-detail'),
 
     # Knowledge base
     path('documents/', DocumentListView.as_view(), name='documents'),
+    path('documents/bulk/', KnowledgeBaseBulkImportView.as_view(doc_type='document'), name='documents-bulk'),
     path('faqs/', FAQListView.as_view(), name='faqs'),
+    path('faqs/bulk/', KnowledgeBaseBulkImportView.as_view(doc_type='faq'), name='faqs-bulk'),
 ]
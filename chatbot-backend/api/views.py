@@ -5,23 +5,48 @@ from rest_framework import status, generics
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.tokens import RefreshToken
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 
-from .models import User, ChatSession, ChatMessage, Document, FAQ
+from .ingest import KnowledgeBaseImporter, read_records
+from .models import User, ChatSession, Document, FAQ
+from .pagination import ChatSessionCursorPagination
 from .serializers import (
     UserSerializer, SignUpSerializer, LoginSerializer,
-    ChatSessionSerializer, ChatSessionListSerializer, ChatMessageSerializer,
+    ChatSessionSerializer, ChatSessionListSerializer, ChatSessionDetailSerializer, ChatMessageSerializer,
+    MessagePageSerializer,
     ChatInputSerializer, DocumentSerializer, FAQSerializer
 )
 
+import json
 import sys
 import os
+import time
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from rag.pipeline import get_rag_pipeline
+from rag.pipeline import get_loaded_rag_pipeline, get_rag_pipeline, pipeline_state, start_warmup
 from tasks.scheduler import schedule_verification_email, generate_verification_token
 
 
+# Logged request stages, in order; each appears only when it ran
+TIMING_LABELS = (
+    ('ttfb_ms', 'ttfb'),
+    ('embed_ms', 'embed'),
+    ('search_ms', 'search'),
+    ('rerank_ms', 'rerank'),
+    ('first_token_ms', 'first token'),
+    ('total_ms', 'total'),
+)
+
+
 class SignUpView(APIView):
     """
     POST /api/signup
@@ -136,23 +161,24 @@ class UserProfileView(APIView):
         return Response(UserSerializer(request.user).data)
 
 
-class ChatHistoryView(APIView):
+class ChatHistoryView(generics.ListAPIView):
     """
     GET /api/chat-history
-    Retrieve chat history for the logged-in user.
+    Retrieve chat history for the logged-in user, most recently active first.
+    Cursor-paginated: follow ``next`` for older sessions (``?page_size=`` up to 100).
     """
     permission_classes = [IsAuthenticated]
+    serializer_class = ChatSessionListSerializer
+    pagination_class = ChatSessionCursorPagination
 
-    def get(self, request):
-        sessions = ChatSession.objects.filter(user=request.user)
-        serializer = ChatSessionListSerializer(sessions, many=True)
-        return Response(serializer.data)
+    def get_queryset(self):
+        return ChatSession.objects.filter(user=self.request.user)
 
 
 class ChatSessionDetailView(APIView):
     """
-    GET /api/chat-history/<session_id>
-    Get a specific chat session with all messages.
+    GET /api/chat-history/<session_id>?limit=&before=|after=
+    Get a specific chat session with one page of its messages (newest first).
 
     DELETE /api/chat-history/<session_id>
     Delete a chat session.
@@ -160,9 +186,44 @@ class ChatSessionDetailView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, session_id):
+        params = MessagePageSerializer(data=request.query_params)
+        if not params.is_valid():
+            return Response(params.errors, status=status.HTTP_400_BAD_REQUEST)
         session = get_object_or_404(ChatSession, id=session_id, user=request.user)
-        serializer = ChatSessionSerializer(session)
-        return Response(serializer.data)
+        messages, older_cursor, newer_cursor = self.message_page(session, **params.validated_data)
+        return Response({
+            **ChatSessionDetailSerializer(session).data,
+            'messages': ChatMessageSerializer(messages, many=True).data,
+            'older_cursor': older_cursor,
+            'newer_cursor': newer_cursor,
+        })
+
+    @staticmethod
+    def message_page(session, limit, before=None, after=None):
+        """
+        One page of messages, newest first, keyed on message id.
+
+        Without cursors this is the latest ``limit`` messages; ``before``
+        pages back into older history and ``after`` returns the oldest
+        ``limit`` messages newer than a known one (e.g. to catch up).
+
+        Returns ``(messages, older_cursor, newer_cursor)``: pass
+        ``older_cursor`` as ``before`` for the previous page (None once the
+        start of the session is reached) and ``newer_cursor`` as ``after``
+        to fetch what was added since.
+        """
+        messages = session.messages.all()
+        if after is not None:
+            page = list(messages.filter(id__gt=after).order_by('id')[:limit])[::-1]
+            older_cursor = page[-1].id if page else None
+        else:
+            if before is not None:
+                messages = messages.filter(id__lt=before)
+            page = list(messages.order_by('-id')[:limit + 1])
+            older_cursor = page[limit - 1].id if len(page) > limit else None
+            page = page[:limit]
+        newer_cursor = page[0].id if page else after
+        return page, older_cursor, newer_cursor
 
     def delete(self, request, session_id):
         session = get_object_or_404(ChatSession, id=session_id, user=request.user)
@@ -184,60 +245,208 @@ class ChatView(APIView):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         user_message = serializer.validated_data['message']
-        session_id = serializer.validated_data.get('session_id')
-
-        # Get or create chat session
-        if session_id:
-            try:
-                session = ChatSession.objects.get(id=session_id)
-            except ChatSession.DoesNotExist:
-                return Response({'error': 'Chat session not found'}, status=status.HTTP_404_NOT_FOUND)
-        else:
-            # Create new session with first message as title (no user required)
-            title = user_message[:50] + '...' if len(user_message) > 50 else user_message
-            # Use authenticated user if available, otherwise anonymous
-            user = request.user if request.user.is_authenticated else None
-            session = ChatSession.objects.create(user=user, title=title)
+        session = self.get_session(request, serializer.validated_data.get('session_id'), user_message)
+        if session is None:
+            return Response({'error': 'Chat session not found'}, status=status.HTTP_404_NOT_FOUND)
 
         # Save user message
-        user_msg = ChatMessage.objects.create(
-            session=session,
-            role='user',
-            content=user_message
-        )
-
-        # Get chat history for context
-        chat_history = []
-        for msg in session.messages.all()[:10]:  # Last 10 messages
-            chat_history.append({
-                'role': msg.role,
-                'content': msg.content
-            })
+        user_msg = session.add_message('user', user_message)
+        chat_history = self.get_chat_history(session, user_msg)
 
         # Generate response using RAG pipeline
+        started = time.perf_counter()
+        timings = {}
         rag = get_rag_pipeline()
         response_text, retrieved_docs = rag.generate_response(
             query=user_message,
-            chat_history=chat_history
+            chat_history=chat_history,
+            timings=timings,
         )
 
-        # Save assistant response
-        assistant_msg = ChatMessage.objects.create(
-            session=session,
-            role='assistant',
-            content=response_text,
+        assistant_msg = self.save_response(session, response_text, retrieved_docs)
+        timings['total_ms'] = self._elapsed_ms(started)
+        print(f"[Chat] Answered session {session.id}: {self.format_timings(timings)}")
+
+        return Response({
+            'session_id': session.id,
+            'user_message': ChatMessageSerializer(user_msg).data,
+            'assistant_message': ChatMessageSerializer(assistant_msg).data,
+            'retrieved_documents': self.document_refs(retrieved_docs)
+        }, status=status.HTTP_200_OK)
+
+    def get_session(self, request, session_id, user_message):
+        """Return the requested chat session (None if missing) or start a new one."""
+        if session_id:
+            return ChatSession.objects.filter(id=session_id).first()
+
+        # Create new session with first message as title (no user required)
+        title = user_message[:50] + '...' if len(user_message) > 50 else user_message
+        # Use authenticated user if available, otherwise anonymous
+        user = request.user if request.user.is_authenticated else None
+        return ChatSession.objects.create(user=user, title=title)
+
+    @staticmethod
+    def get_chat_history(session, user_msg):
+        """The latest earlier messages for context, oldest first (the current message is passed as the query)."""
+        return list(session.recent_messages(getattr(settings, 'CHAT_HISTORY_MESSAGES', 6), exclude=user_msg.pk))[::-1]
+
+    def save_response(self, session, response_text, retrieved_docs):
+        """Save the assistant response (which also bumps the session's counters and updated_at)."""
+        return session.add_message(
+            'assistant',
+            response_text,
             retrieved_docs=[{'title': d.get('title'), 'score': d.get('score')} for d in retrieved_docs] if retrieved_docs else None
         )
 
-        # Update session
-        session.save()  # Updates updated_at
+    @staticmethod
+    def document_refs(retrieved_docs):
+        return [{'title': d.get('title'), 'type': d.get('type')} for d in retrieved_docs] if retrieved_docs else []
 
-        return Response({
+    @staticmethod
+    def format_timings(timings):
+        """Log text for the stages present in ``timings``; retrieval stages are missing on cache hits."""
+        return ', '.join(f'{label} {timings[key]}ms' for key, label in TIMING_LABELS if key in timings)
+
+    @staticmethod
+    def _elapsed_ms(started):
+        return round((time.perf_counter() - started) * 1000, 1)
+
+
+class ChatStreamView(ChatView):
+    """
+    POST /api/chat/stream
+    Send a message and receive the response as Server-Sent Events:
+
+        event: meta   session id, saved user message and retrieved documents
+        event: token  {"text": ...} for every chunk of the answer
+        event: done   saved assistant message and timings (ms), including
+                      the retrieval stages (embed, search, rerank)
+
+    The assistant message is stored once the stream finishes (or with the
+    partial answer if the client disconnects).
+    """
+
+    def post(self, request):
+        started = time.perf_counter()
+        serializer = ChatInputSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        user_message = serializer.validated_data['message']
+        session = self.get_session(request, serializer.validated_data.get('session_id'), user_message)
+        if session is None:
+            return Response({'error': 'Chat session not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        user_msg = session.add_message('user', user_message)
+        chat_history = self.get_chat_history(session, user_msg)
+
+        response = StreamingHttpResponse(
+            self.event_stream(session, user_msg, chat_history, started),
+            content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+        return response
+
+    def event_stream(self, session, user_msg, chat_history, started):
+        rag = get_rag_pipeline()
+        retrieved_docs, parts = [], []
+        timings = {}
+        assistant_msg = None
+        try:
+            for event, data in rag.stream_response(user_msg.content, chat_history=chat_history, timings=timings):
+                if event == 'context':
+                    retrieved_docs = data
+                    timings['ttfb_ms'] = self._elapsed_ms(started)
+                    yield self.sse('meta', {
+                        'session_id': session.id,
+                        'user_message': ChatMessageSerializer(user_msg).data,
+                        'retrieved_documents': self.document_refs(retrieved_docs),
+                    })
+                else:
+                    timings.setdefault('first_token_ms', self._elapsed_ms(started))
+                    parts.append(data)
+                    yield self.sse('token', {'text': data})
+
+            assistant_msg = self.save_response(session, ''.join(parts), retrieved_docs)
+            timings['total_ms'] = self._elapsed_ms(started)
+            print(f"[Chat] Streamed session {session.id}: {self.format_timings(timings)}")
+            yield self.sse('done', {
+                'assistant_message': ChatMessageSerializer(assistant_msg).data,
+                'timings': timings,
+            })
+        finally:
+            # Client went away mid-stream: keep what was generated
+            if assistant_msg is None and parts:
+                self.save_response(session, ''.join(parts), retrieved_docs)
+
+    @staticmethod
+    def sse(event, data):
+        return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncChatView(View):
+    """
+    POST /api/chat/async
+    Same contract as /api/chat, implemented as a native async view.
+
+    Under ASGI the request never holds a worker thread while Gemini is
+    generating: the LLM call is awaited, embedding/search run on the RAG
+    thread pool, and persistence uses Django's async ORM.
+    """
+
+    async def post(self, request):
+        try:
+            payload = json.loads(request.body or b'{}')
+        except ValueError:
+            return JsonResponse({'error': 'Invalid JSON body'}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = ChatInputSerializer(data=payload)
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            user = await sync_to_async(self.authenticate)(request)
+        except AuthenticationFailed as e:
+            return JsonResponse({'detail': str(e.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+
+        user_message = serializer.validated_data['message']
+        session_id = serializer.validated_data.get('session_id')
+        if session_id:
+            session = await ChatSession.objects.filter(id=session_id).afirst()
+            if session is None:
+                return JsonResponse({'error': 'Chat session not found'}, status=status.HTTP_404_NOT_FOUND)
+        else:
+            title = user_message[:50] + '...' if len(user_message) > 50 else user_message
+            session = await ChatSession.objects.acreate(user=user, title=title)
+
+        user_msg = await session.aadd_message('user', user_message)
+        chat_history = [
+            msg async for msg in session.recent_messages(getattr(settings, 'CHAT_HISTORY_MESSAGES', 6), exclude=user_msg.pk)
+        ][::-1]
+
+        rag = await sync_to_async(get_rag_pipeline)()
+        response_text, retrieved_docs = await rag.agenerate_response(user_message, chat_history=chat_history)
+
+        assistant_msg = await session.aadd_message(
+            'assistant',
+            response_text,
+            retrieved_docs=[{'title': d.get('title'), 'score': d.get('score')} for d in retrieved_docs] if retrieved_docs else None
+        )
+
+        return JsonResponse({
             'session_id': session.id,
             'user_message': ChatMessageSerializer(user_msg).data,
             'assistant_message': ChatMessageSerializer(assistant_msg).data,
-            'retrieved_documents': [{'title': d.get('title'), 'type': d.get('type')} for d in retrieved_docs] if retrieved_docs else []
-        }, status=status.HTTP_200_OK)
+            'retrieved_documents': ChatView.document_refs(retrieved_docs)
+        }, encoder=DjangoJSONEncoder)
+
+    @staticmethod
+    def authenticate(request):
+        """Optional JWT authentication; anonymous chats are allowed."""
+        result = JWTAuthentication().authenticate(request)
+        return result[0] if result else None
 
 
 class NewChatView(APIView):
@@ -265,10 +474,7 @@ class DocumentListView(generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
 
     def perform_create(self, serializer):
-        doc = serializer.save()
-        # Add to RAG pipeline
-        rag = get_rag_pipeline()
-        rag.add_documents([{'title': doc.title, 'content': doc.content, 'type': 'document', 'id': doc.id}])
+        serializer.save()  # Indexed by the post_save signal (api.signals)
 
 
 class FAQListView(generics.ListCreateAPIView):
@@ -281,22 +487,63 @@ class FAQListView(generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
 
     def perform_create(self, serializer):
-        faq = serializer.save()
-        # Add to RAG pipeline
-        rag = get_rag_pipeline()
-        rag.add_documents([{'title': faq.question, 'content': faq.answer, 'type': 'faq', 'id': faq.id}])
+        serializer.save()  # Indexed by the post_save signal (api.signals)
+
+
+class KnowledgeBaseBulkImportView(APIView):
+    """
+    POST /api/documents/bulk - Import documents
+    POST /api/faqs/bulk - Import FAQs
+
+    The body holds one object per line with the fields of the single-object
+    endpoints, as JSON Lines (``application/x-ndjson``) or as CSV with a
+    header row (``text/csv``). It is streamed in batches rather than loaded
+    whole (see ``api.ingest``). Returns the created/indexed/failed counts, the
+    first invalid lines and the throughput.
+    """
+    permission_classes = [IsAuthenticated]
+    doc_type = None  # Set by the URLconf
+
+    def post(self, request):
+        fmt = 'csv' if request.content_type.split(';')[0].strip() == 'text/csv' else 'jsonl'
+        importer = KnowledgeBaseImporter(self.doc_type, rag=get_rag_pipeline(), progress=self.log_progress)
+        stats = importer.run(read_records(request.stream or [], fmt))
+        print(
+            f"[RAG] Bulk import of {stats['created']} {self.doc_type} rows "
+            f"({stats['failed']} invalid) in {stats['seconds']:.1f}s, {stats['rows_per_sec']:.0f} rows/s"
+        )
+        if not stats['created'] and stats['failed']:
+            return Response(stats, status=status.HTTP_400_BAD_REQUEST)
+        return Response(stats, status=status.HTTP_201_CREATED if stats['created'] else status.HTTP_200_OK)
+
+    def log_progress(self, stats):
+        print(f"[RAG] Bulk import: {stats['created']} {self.doc_type} rows created, {stats['rows_per_sec']:.0f} rows/s")
 
 
 class HealthCheckView(APIView):
     """
     GET /api/health
     Health check endpoint.
+
+    Answers 503 while the RAG pipeline is still loading, so load balancers
+    only route chat traffic to warm workers. ``rag.state`` is ``loading``,
+    ``ready`` or ``degraded`` (serving without retrieval or Gemini).
     """
     permission_classes = [AllowAny]
 
     def get(self, request):
-        return Response({
-            'status': 'healthy',
+        # Never wait for the pipeline here; if nothing is loading it yet (RAG_WARMUP off), start now
+        start_warmup()
+        state = pipeline_state()
+        data = {
+            'status': 'starting' if state == 'loading' else 'healthy',
             'service': 'LMS Chatbot API',
-            'version': '1.0.0'
-        })
+            'version': '1.0.0',
+            'rag': {'state': state},
+        }
+        rag = get_loaded_rag_pipeline()
+        if rag is not None:
+            data['rag'].update(query_cache=rag.query_cache.stats(), answer_cache=rag.answer_cache.stats())
+        if state == 'loading':
+            return Response(data, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response(data)
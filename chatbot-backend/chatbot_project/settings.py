@@ -65,7 +65,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'api.middleware.AsyncWhiteNoiseMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -205,8 +205,87 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
 
+# Outbound email queue (tasks/outbox.py)
+EMAIL_OUTBOX_INTERVAL = int(os.getenv('EMAIL_OUTBOX_INTERVAL', 5))  # Seconds between drain runs
+EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv('EMAIL_OUTBOX_BATCH_SIZE', 100))  # Emails claimed per batch
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv('EMAIL_OUTBOX_MAX_ATTEMPTS', 5))
+EMAIL_OUTBOX_RETRY_DELAY = int(os.getenv('EMAIL_OUTBOX_RETRY_DELAY', 60))  # Seconds, doubled after each failure
+EMAIL_OUTBOX_LEASE = int(os.getenv('EMAIL_OUTBOX_LEASE', 300))  # Seconds before a claimed email may be retried
+
 # Chat history cleanup (days)
 CHAT_HISTORY_RETENTION_DAYS = 30
+CHAT_CLEANUP_BATCH_SIZE = int(os.getenv('CHAT_CLEANUP_BATCH_SIZE', 5000))  # Rows per delete transaction
+CHAT_CLEANUP_BATCH_PAUSE = float(os.getenv('CHAT_CLEANUP_BATCH_PAUSE', 0.1))  # Seconds between batches
+
+# Earlier messages of a session sent to the LLM with each question
+CHAT_HISTORY_MESSAGES = int(os.getenv('CHAT_HISTORY_MESSAGES', 6))
 
 # Documents directory for RAG
 DOCUMENTS_DIR = BASE_DIR / 'documents'
+
+# RAG ingestion
+RAG_EMBEDDING_MODEL = os.getenv('RAG_EMBEDDING_MODEL', 'all-MiniLM-L6-v2')  # Stored with each embedding
+RAG_EMBEDDING_BACKEND = os.getenv('RAG_EMBEDDING_BACKEND', 'torch')  # torch, onnx or onnx-int8 (see rag.embedding)
+RAG_ONNX_EXPORT_DIR = Path(os.getenv('RAG_ONNX_EXPORT_DIR', BASE_DIR / 'onnx_models'))  # Locally quantized models
+RAG_EMBED_BATCH_SIZE = int(os.getenv('RAG_EMBED_BATCH_SIZE', 64))  # Texts per encode()/index.add() call
+RAG_IMPORT_BATCH_SIZE = int(os.getenv('RAG_IMPORT_BATCH_SIZE', 500))  # Rows per bulk-import transaction
+RAG_BUILD_SHARD_SIZE = int(os.getenv('RAG_BUILD_SHARD_SIZE', 5000))  # Rows per shard of `manage.py build_index`
+RAG_DB_CHUNK_SIZE = int(os.getenv('RAG_DB_CHUNK_SIZE', 500))  # Rows fetched per database round trip
+RAG_DB_CHUNK_CHARS = int(os.getenv('RAG_DB_CHUNK_CHARS', 4_000_000))  # Max document characters per round trip
+RAG_CHUNK_SIZE = int(os.getenv('RAG_CHUNK_SIZE', 800))  # Max characters per indexed document chunk
+RAG_CHUNK_OVERLAP = int(os.getenv('RAG_CHUNK_OVERLAP', 100))  # Characters shared by consecutive chunks
+
+# RAG index snapshots (written by `manage.py snapshot_index`)
+RAG_INDEX_SNAPSHOTS = os.getenv('RAG_INDEX_SNAPSHOTS', 'True').lower() == 'true'  # Load snapshot at startup
+RAG_INDEX_DIR = Path(os.getenv('RAG_INDEX_DIR', BASE_DIR / 'index_snapshots'))
+RAG_INDEX_MMAP = os.getenv('RAG_INDEX_MMAP', 'True').lower() == 'true'  # Memory-map snapshot data when supported
+
+# RAG vector index type: flat | ivf_flat | hnsw | ivf_pq
+RAG_INDEX_TYPE = os.getenv('RAG_INDEX_TYPE', 'flat')
+RAG_IVF_NLIST = int(os.getenv('RAG_IVF_NLIST', 100))  # IVF cells
+RAG_IVF_NPROBE = int(os.getenv('RAG_IVF_NPROBE', 8))  # Cells visited per query
+RAG_HNSW_M = int(os.getenv('RAG_HNSW_M', 32))  # Graph neighbours per node
+RAG_HNSW_EF_CONSTRUCTION = int(os.getenv('RAG_HNSW_EF_CONSTRUCTION', 200))
+RAG_HNSW_EF_SEARCH = int(os.getenv('RAG_HNSW_EF_SEARCH', 64))
+RAG_PQ_M = int(os.getenv('RAG_PQ_M', 16))  # PQ sub-quantizers (must divide the embedding dim)
+RAG_PQ_NBITS = int(os.getenv('RAG_PQ_NBITS', 8))  # Bits per PQ code
+RAG_INDEX_TRAIN_SIZE = int(os.getenv('RAG_INDEX_TRAIN_SIZE', 50000))  # Max vectors sampled for IVF training
+RAG_INDEX_COMPACT_RATIO = float(os.getenv('RAG_INDEX_COMPACT_RATIO', 0.2))  # Rebuild HNSW once this share is deleted
+RAG_INDEX_STORAGE = os.getenv('RAG_INDEX_STORAGE', 'float32')  # float32, sq8 (int8) or pq vector codes
+RAG_INDEX_PCA_DIM = int(os.getenv('RAG_INDEX_PCA_DIM', 0))  # Project onto this many principal components; 0 = off
+
+# RAG hybrid retrieval: BM25 keyword search fused with the vector search (reciprocal-rank fusion)
+RAG_HYBRID_SEARCH = os.getenv('RAG_HYBRID_SEARCH', 'True').lower() == 'true'
+RAG_HYBRID_CANDIDATES = int(os.getenv('RAG_HYBRID_CANDIDATES', 20))  # Results ranked by each leg before fusion
+RAG_RRF_K = int(os.getenv('RAG_RRF_K', 60))  # Fusion damping; larger values flatten rank differences
+
+# Cross-encoder re-ranking of the retrieved candidates (needs sentence-transformers)
+RAG_RERANK = os.getenv('RAG_RERANK', 'False').lower() == 'true'
+RAG_RERANK_MODEL = os.getenv('RAG_RERANK_MODEL', 'cross-encoder/ms-marco-MiniLM-L-6-v2')
+RAG_RERANK_CANDIDATES = int(os.getenv('RAG_RERANK_CANDIDATES', 20))  # First-stage results re-scored per query
+RAG_RERANK_BUDGET_MS = float(os.getenv('RAG_RERANK_BUDGET_MS', 150))  # Past this, the first-stage order is kept
+
+# RAG prompt assembly: question, then retrieved documents, then recent history, up to the budget
+RAG_PROMPT_TOKEN_BUDGET = int(os.getenv('RAG_PROMPT_TOKEN_BUDGET', 1500))  # Estimated input tokens per prompt
+RAG_TOKEN_COUNT_CACHE_SIZE = int(os.getenv('RAG_TOKEN_COUNT_CACHE_SIZE', 10000))  # Cached document token counts
+
+# RAG query embedding cache (normalized query text -> vector, per process)
+RAG_QUERY_CACHE_SIZE = int(os.getenv('RAG_QUERY_CACHE_SIZE', 1024))  # 0 disables the cache
+RAG_QUERY_CACHE_TTL = int(os.getenv('RAG_QUERY_CACHE_TTL', 3600))  # Seconds
+
+# RAG semantic answer cache (first-turn questions only)
+RAG_ANSWER_CACHE_SIZE = int(os.getenv('RAG_ANSWER_CACHE_SIZE', 256))  # 0 disables the cache
+RAG_ANSWER_CACHE_TTL = int(os.getenv('RAG_ANSWER_CACHE_TTL', 3600))  # Seconds
+RAG_ANSWER_CACHE_MAX_DISTANCE = float(os.getenv('RAG_ANSWER_CACHE_MAX_DISTANCE', 0.05))  # Cosine distance
+RAG_ANSWER_CACHE_BACKEND = os.getenv('RAG_ANSWER_CACHE_BACKEND', '')  # CACHES alias to share across workers
+
+# Load the RAG pipeline on a background thread when a server process starts (see api.apps)
+RAG_WARMUP = os.getenv('RAG_WARMUP', 'True').lower() == 'true'
+
+# RAG thread pool for embedding/search from async views
+RAG_EXECUTOR_WORKERS = int(os.getenv('RAG_EXECUTOR_WORKERS', 0))  # 0 = one per CPU
+
+# Sharing the RAG model/index across gunicorn workers: '' | preload | sidecar (see gunicorn.conf.py)
+RAG_SHARED_MODE = os.getenv('RAG_SHARED_MODE', '')
+RAG_SIDECAR_SOCKET = os.getenv('RAG_SIDECAR_SOCKET', '/tmp/rag-sidecar.sock')
+RAG_SIDECAR_TIMEOUT = float(os.getenv('RAG_SIDECAR_TIMEOUT', 10))  # Seconds per request
@@ -0,0 +1,34 @@
+"""
+Gunicorn configuration, picked up automatically from the working directory.
+
+RAG_SHARED_MODE chooses how web workers get the embedding model and index:
+
+    preload  load them once in the master before forking; workers share the
+             pages copy-on-write (the index is memory-mapped from the current
+             snapshot when one exists, so it is shared through the page cache)
+    sidecar  workers query a separate `manage.py rag_sidecar` process over a
+             Unix socket and never load the model themselves
+    (unset)  every worker loads its own copy on first use
+"""
+import gc
+import os
+
+# HF tokenizers' thread pool does not survive fork
+os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
+
+preload_app = os.getenv('RAG_SHARED_MODE') == 'preload'
+
+
+def when_ready(server):
+    """Runs in the master after the app is imported and before workers fork."""
+    if not preload_app:
+        return
+
+    from django.db import connections
+    from rag.pipeline import get_rag_pipeline
+
+    get_rag_pipeline()
+    connections.close_all()  # Workers must not share the master's database socket
+    # Move everything loaded so far out of the collector's reach: GC passes
+    # in the workers would otherwise write to these objects and un-share them
+    gc.freeze()
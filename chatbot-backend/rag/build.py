@@ -0,0 +1,144 @@
+"""
+Offline index builds on a pool of worker processes.
+
+``manage.py build_index`` splits every knowledge-base table into shards of
+``RAG_BUILD_SHARD_SIZE`` consecutive rows, described by primary-key ranges
+so that a worker reads its shard with one range query. Each worker process
+loads its own embedding model, reads its shards, re-encodes the rows whose
+stored embedding is stale (writing the new vectors back) and returns the
+shard's vectors. The parent adds the shards in key order, which gives the
+same index as ``RAGPipeline.load_documents_from_db``; the command then
+writes it as a snapshot for web workers to load.
+
+The parent of a parallel build never loads the embedding model: it holds
+an :class:`IndexOnlyPipeline`, whose index is created with the dimension of
+the first shard's vectors. Only a single-process build encodes in the
+parent, with a full ``RAGPipeline``.
+
+Workers are started with ``spawn``, not ``fork``: FAISS and torch thread
+pools do not survive a fork. Each worker gets ``cpu_count // workers``
+torch threads, so N workers do not oversubscribe the cores.
+"""
+import itertools
+import multiprocessing
+import os
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from .index import create_index
+from .pipeline import KNOWLEDGE_BASE_SOURCES, RAGPipeline, _rows_in_range
+
+_worker_pipeline = None
+
+
+class IndexOnlyPipeline(RAGPipeline):
+    """
+    Pipeline without an embedding model or Gemini, for the parent process of
+    a parallel build: it only merges the shards' vectors into its index and
+    keyword index. The index is created when the first shard arrives.
+    """
+
+    def _initialize(self):
+        pass
+
+
+def shard_ranges(doc_type: str, shard_size: int) -> List[Tuple[int, int]]:
+    """``(lo, hi)`` primary-key ranges (``lo <= pk < hi``) of ``shard_size`` consecutive ``doc_type`` rows."""
+    starts, last = [], None
+    ids = _rows_in_range(doc_type).values_list('pk', flat=True)
+    for position, pk in enumerate(ids.iterator(chunk_size=10000)):
+        if position % shard_size == 0:
+            starts.append(pk)
+        last = pk
+    if last is None:
+        return []
+    return list(zip(starts, starts[1:] + [last + 1]))
+
+
+def build_index(rag: RAGPipeline, workers: int = 1, shard_size: Optional[int] = None,
+                progress: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
+    """
+    Rebuild ``rag``'s index from the database, encoding shards on ``workers``
+    processes. With ``workers`` 1 the shards are encoded in this process by
+    ``rag``, which then needs its embedding model; otherwise ``rag`` may be
+    an :class:`IndexOnlyPipeline`.
+
+    ``progress`` is called with every shard's stats (type, key range, rows,
+    encoded rows, seconds, worker pid) as it is added; all of them are
+    returned as well.
+    """
+    shard_size = shard_size or getattr(settings, 'RAG_BUILD_SHARD_SIZE', 5000)
+    tasks = [(doc_type, id_range)
+             for doc_type in KNOWLEDGE_BASE_SOURCES for id_range in shard_ranges(doc_type, shard_size)]
+    rag.reset_index()
+    stats = []
+
+    def merged(shards):
+        for shard, vectors, docs in shards:
+            stats.append(shard)
+            if progress is not None:
+                progress(shard)
+            yield vectors, docs
+
+    if workers <= 1:
+        rag.add_encoded(merged(_encode_shard(task, rag) for task in tasks))
+        return stats
+    if not tasks:
+        return stats
+
+    from django.db import connections
+
+    connections.close_all()  # Workers open their own
+    workers = min(workers, len(tasks))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(workers, initializer=_init_worker, initargs=(threads,)) as pool:
+        # imap keeps key order; shards further ahead are buffered until earlier ones finish
+        shards = merged(pool.imap(_encode_shard, tasks))
+        first = next(shards)
+        if rag.index is None:  # No model in this process: size the index after the workers' vectors
+            rag.embedding_dim = first[0].shape[1]
+            rag.index = create_index(rag.embedding_dim)
+        rag.add_encoded(itertools.chain([first], shards))
+    return stats
+
+
+def _init_worker(threads: int):
+    """Set up Django and an embedding-only pipeline in a freshly spawned worker."""
+    global _worker_pipeline
+    for variable in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ[variable] = str(threads)
+    os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
+
+    import django
+
+    django.setup()
+    _worker_pipeline = RAGPipeline()
+    try:
+        import torch
+
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+def _encode_shard(task: Tuple[str, Tuple[int, int]], rag: Optional[RAGPipeline] = None):
+    """Encode one shard; returns its stats, vectors and documents."""
+    doc_type, id_range = task
+    rag = rag or _worker_pipeline
+    if not rag._can_embed():
+        raise RuntimeError(f'Embedding model / FAISS are not available in worker {os.getpid()}')
+    started = time.perf_counter()
+    vectors, docs, encoded = rag.encode_rows(doc_type, id_range)
+    shard = {
+        'type': doc_type,
+        'range': id_range,
+        'rows': len({doc['id'] for doc in docs}),
+        'entries': len(docs),
+        'encoded': encoded,
+        'seconds': time.perf_counter() - started,
+        'worker': os.getpid(),
+    }
+    return shard, vectors, docs
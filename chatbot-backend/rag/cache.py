@@ -0,0 +1,223 @@
+"""
+In-process caches for the RAG pipeline.
+"""
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_query(text: str) -> str:
+    """Case- and whitespace-insensitive cache key for a user query."""
+    return _WHITESPACE_RE.sub(' ', text).strip().lower()
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded, thread-safe LRU cache of normalized query text -> embedding.
+
+    Entries older than ``ttl`` seconds are treated as misses. A ``maxsize`` of
+    0 disables the cache.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, query: str) -> Optional[np.ndarray]:
+        if self.maxsize <= 0:
+            return None
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (not self.ttl or time.monotonic() - entry[1] < self.ttl):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, query: str, embedding: np.ndarray):
+        if self.maxsize <= 0:
+            return
+        embedding = np.array(embedding, dtype=np.float32)
+        embedding.setflags(write=False)  # Shared between requests
+        key = normalize_query(query)
+        with self._lock:
+            self._entries[key] = (embedding, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+class SemanticResponseCache:
+    """
+    LRU/TTL cache of generated answers keyed by query *meaning*.
+
+    A lookup returns the stored answer of the most similar cached query when
+    its cosine distance to the new query is at most ``max_distance``.
+
+    With ``backend`` set to a Django cache alias the entries live in that
+    cache (e.g. Redis or Memcached) and are shared by all workers; otherwise
+    they are kept in this process. Entries are namespaced by a knowledge-base
+    version so :meth:`invalidate` drops them everywhere at once.
+
+    In a shared cache every answer is stored under its own key, numbered by
+    an atomic ``incr``, so concurrent writers never overwrite each other's
+    entries; lookups read the latest ``maxsize`` numbers and never write.
+    Shared entries are therefore evicted oldest first rather than least
+    recently used.
+    """
+
+    VERSION_KEY = 'rag:answer-cache:version'
+
+    def __init__(self, max_distance: float = 0.05, maxsize: int = 256, ttl: float = 3600,
+                 backend: Optional[str] = None):
+        self.max_distance = max_distance
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.backend = backend or None
+        self.hits = 0
+        self.misses = 0
+        self._local = []  # Oldest first
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def get(self, embedding: np.ndarray) -> Optional[Dict]:
+        """Return ``{'query', 'answer', 'context'}`` for a close enough cached query."""
+        if not self.enabled:
+            return None
+        query = _unit(embedding)
+        store = self._store()
+        entry = None
+        if store is None:
+            with self._lock:
+                entries = self._local = self._unexpired(self._local)
+                best = self._closest(entries, query)
+                if best is not None:
+                    entry = entries.pop(best)
+                    entries.append(entry)  # Most recently used
+        else:
+            entries = self._shared_entries(store)
+            best = self._closest(entries, query)
+            if best is not None:
+                entry = entries[best]
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return {'query': entry['query'], 'answer': entry['answer'], 'context': entry['context']}
+
+    def put(self, query: str, embedding: np.ndarray, answer: str, context):
+        if not self.enabled:
+            return
+        entry = {
+            'query': query,
+            'embedding': _unit(embedding),
+            'answer': answer,
+            'context': context,
+            'created': time.time(),
+        }
+        store = self._store()
+        if store is None:
+            with self._lock:
+                self._local = (self._unexpired(self._local) + [entry])[-self.maxsize:]
+            return
+
+        prefix = self._prefix(store)
+        store.add(f'{prefix}:seq', 0, None)
+        try:
+            number = store.incr(f'{prefix}:seq')
+        except ValueError:  # Counter evicted since the add; skip this answer
+            return
+        store.set(f'{prefix}:{number}', entry, self.ttl or None)
+        if number > self.maxsize:
+            store.delete(f'{prefix}:{number - self.maxsize}')
+
+    def invalidate(self):
+        """Drop every cached answer, e.g. after the knowledge base changed."""
+        with self._lock:
+            self._local = []
+        store = self._store()
+        if store is not None:
+            store.set(self.VERSION_KEY, uuid.uuid4().hex, None)
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            'backend': self.backend or 'local',
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+        }
+
+    def _store(self):
+        if self.backend is None:
+            return None
+        from django.core.cache import caches
+        return caches[self.backend]
+
+    def _prefix(self, store) -> str:
+        version = store.get_or_set(self.VERSION_KEY, uuid.uuid4().hex, None)
+        return f'rag:answer-cache:{version}'
+
+    def _shared_entries(self, store) -> list:
+        """The unexpired entries among the latest ``maxsize`` stored in the shared cache."""
+        prefix = self._prefix(store)
+        last = store.get(f'{prefix}:seq')
+        if not last:
+            return []
+        keys = [f'{prefix}:{number}' for number in range(max(1, last - self.maxsize + 1), last + 1)]
+        return self._unexpired(store.get_many(keys).values())
+
+    def _unexpired(self, entries) -> list:
+        if not self.ttl:
+            return list(entries)
+        cutoff = time.time() - self.ttl
+        return [entry for entry in entries if entry['created'] >= cutoff]
+
+    def _closest(self, entries: list, query: np.ndarray) -> Optional[int]:
+        """Position of the entry closest to ``query`` if it is within ``max_distance``."""
+        if not entries:
+            return None
+        distances = 1.0 - np.stack([entry['embedding'] for entry in entries]) @ query
+        best = int(np.argmin(distances))
+        return best if distances[best] <= self.max_distance else None
+
+
+def _unit(vector: np.ndarray) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
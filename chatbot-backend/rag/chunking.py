@@ -0,0 +1,56 @@
+"""
+Splitting long knowledge-base documents into overlapping chunks.
+
+Each chunk is embedded and indexed on its own (see ``RAGPipeline``), so a
+long document is found by the passage that matches a question, and only
+that passage is put into the prompt. Chunks are described by character
+offsets into the document content, which are stored with their embedding
+in ``DocumentChunk`` rows.
+"""
+from typing import Iterator, Tuple
+
+# Break points in order of preference: paragraph, line, sentence, word
+_BREAKS = ('\n\n', '\n', '. ', '? ', '! ', '; ', ' ')
+
+
+def chunk_spans(text: str, size: int, overlap: int) -> Iterator[Tuple[int, int]]:
+    """
+    Yield ``(start, end)`` offsets of chunks of at most ``size`` characters,
+    each starting about ``overlap`` characters before the previous one ended.
+
+    Chunks end at the best break point (paragraph, line, sentence, word) in
+    the second half of the window and start at a word boundary. Spans are
+    generated lazily, so a multi-megabyte text is never copied as a whole.
+    Empty text yields a single empty span.
+    """
+    if size < 1 or not 0 <= overlap < size:
+        raise ValueError(f'Chunk size must be positive and larger than the overlap, got {size}/{overlap}')
+    length = len(text)
+    start = 0
+    while True:
+        end = min(start + size, length)
+        if end < length:
+            end = _break_before(text, start + size // 2, end)
+        yield start, end
+        if end >= length:
+            return
+        start = _word_start(text, max(end - overlap, start + 1), end)
+
+
+def _break_before(text: str, lo: int, hi: int) -> int:
+    """Offset just after the most preferred break point in ``text[lo:hi]``, else ``hi``."""
+    for separator in _BREAKS:
+        found = text.rfind(separator, lo, hi)
+        if found != -1:
+            return found + len(separator)
+    return hi
+
+
+def _word_start(text: str, position: int, limit: int) -> int:
+    """``position``, moved forward to the start of the next word if it falls inside one."""
+    if position == 0 or text[position - 1].isspace():
+        return position
+    for offset in range(position, limit):
+        if text[offset].isspace():
+            return offset + 1
+    return position
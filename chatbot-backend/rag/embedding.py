@@ -0,0 +1,59 @@
+"""
+CPU backends for the sentence-embedding model.
+
+RAG_EMBEDDING_BACKEND selects how the SentenceTransformer model runs:
+
+    torch      the PyTorch model (default)
+    onnx       the same weights exported to ONNX and run by ONNX Runtime
+    onnx-int8  ONNX with int8 dynamic quantization of the linear layers
+
+The ONNX backends need ``sentence-transformers[onnx]`` (ONNX Runtime and
+Optimum). Every backend returns a SentenceTransformer with the usual
+``encode`` API, and its vectors stay within a cosine similarity of 0.99 of
+the PyTorch ones (see ``manage.py benchmark_embedding``), so embeddings
+stored by one backend remain valid under another.
+"""
+from pathlib import Path
+
+from django.conf import settings
+
+EMBEDDING_BACKENDS = ('torch', 'onnx', 'onnx-int8')
+
+# Quantized file shipped with many hub models; AVX2 kernels run on any x86-64 server CPU
+QUANTIZED_FILE = 'onnx/model_quint8_avx2.onnx'
+
+
+def load_embedding_model(name: str, backend: str = None):
+    """Load the SentenceTransformer ``name`` with the given (or configured) backend."""
+    backend = backend or getattr(settings, 'RAG_EMBEDDING_BACKEND', 'torch')
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown RAG_EMBEDDING_BACKEND {backend!r}, expected one of {EMBEDDING_BACKENDS}")
+    from sentence_transformers import SentenceTransformer
+
+    if backend == 'torch':
+        return SentenceTransformer(name)
+    if backend == 'onnx':
+        return SentenceTransformer(name, backend='onnx')
+    return _load_quantized(name)
+
+
+def _load_quantized(name: str):
+    """
+    The int8 ONNX model: the quantized file published with the model when
+    there is one, else a local quantization of its ONNX export, kept under
+    RAG_ONNX_EXPORT_DIR for the next start.
+    """
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    try:
+        return SentenceTransformer(name, backend='onnx', model_kwargs={'file_name': QUANTIZED_FILE})
+    except Exception as e:
+        print(f"[RAG] No published {QUANTIZED_FILE} for {name}, quantizing locally: {e}")
+
+    export_dir = Path(getattr(settings, 'RAG_ONNX_EXPORT_DIR', settings.BASE_DIR / 'onnx_models'))
+    export_dir = export_dir / name.replace('/', '__')
+    if not (export_dir / QUANTIZED_FILE).exists():
+        model = SentenceTransformer(name, backend='onnx')
+        model.save(str(export_dir))
+        export_dynamic_quantized_onnx_model(model, 'avx2', str(export_dir), file_suffix='quint8_avx2')
+    return SentenceTransformer(str(export_dir), backend='onnx', model_kwargs={'file_name': QUANTIZED_FILE})
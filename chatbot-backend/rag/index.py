@@ -0,0 +1,214 @@
+"""
+FAISS index construction for the RAG pipeline.
+
+The index type is chosen with the RAG_INDEX_TYPE setting:
+
+    flat      exact search (IndexFlatL2), no training
+    ivf_flat  inverted file over full vectors, needs training
+    hnsw      HNSW graph over full vectors, no training
+    ivf_pq    inverted file with product-quantized codes, needs training
+
+RAG_INDEX_STORAGE selects how the flat, ivf_flat and hnsw types store
+vectors: ``float32`` (exact), ``sq8`` (int8 scalar quantization, 4x
+smaller) or ``pq`` (product quantization with RAG_PQ_M x RAG_PQ_NBITS
+codes). RAG_INDEX_PCA_DIM > 0 additionally projects vectors onto that many
+principal components learned from the corpus before they are stored. Both
+need training, like the IVF types.
+
+Every index is wrapped in an IndexIDMap2 so vectors are addressed by a
+64-bit label (see ``rag.pipeline.document_label``) instead of their
+position, which lets single rows be replaced or removed in place.
+"""
+from typing import Iterable, Optional
+
+import numpy as np
+from django.conf import settings
+
+from .lazy import LazyModule, module_available
+
+FAISS_AVAILABLE = module_available('faiss')
+faiss = LazyModule('faiss')
+
+INDEX_TYPES = ('flat', 'ivf_flat', 'hnsw', 'ivf_pq')
+STORAGE_TYPES = ('float32', 'sq8', 'pq')
+
+
+def index_params(overrides: Optional[dict] = None) -> dict:
+    """Index type and tuning knobs from settings, with optional overrides."""
+    params = {
+        'type': getattr(settings, 'RAG_INDEX_TYPE', 'flat'),
+        'nlist': getattr(settings, 'RAG_IVF_NLIST', 100),
+        'nprobe': getattr(settings, 'RAG_IVF_NPROBE', 8),
+        'hnsw_m': getattr(settings, 'RAG_HNSW_M', 32),
+        'ef_construction': getattr(settings, 'RAG_HNSW_EF_CONSTRUCTION', 200),
+        'ef_search': getattr(settings, 'RAG_HNSW_EF_SEARCH', 64),
+        'pq_m': getattr(settings, 'RAG_PQ_M', 16),
+        'pq_nbits': getattr(settings, 'RAG_PQ_NBITS', 8),
+        'train_size': getattr(settings, 'RAG_INDEX_TRAIN_SIZE', 50000),
+        'storage': getattr(settings, 'RAG_INDEX_STORAGE', 'float32'),
+        'pca_dim': getattr(settings, 'RAG_INDEX_PCA_DIM', 0),
+    }
+    params.update(overrides or {})
+    if params['type'] not in INDEX_TYPES:
+        raise ValueError(f"Unknown RAG_INDEX_TYPE {params['type']!r}, expected one of {INDEX_TYPES}")
+    if params['storage'] not in STORAGE_TYPES:
+        raise ValueError(f"Unknown RAG_INDEX_STORAGE {params['storage']!r}, expected one of {STORAGE_TYPES}")
+    return params
+
+
+def factory_string(params: dict) -> str:
+    """FAISS index_factory description for the given parameters."""
+    pq = f"PQ{params['pq_m']}x{params['pq_nbits']}"
+    codes = {'float32': 'Flat', 'sq8': 'SQ8', 'pq': pq}[params['storage']]
+    description = {
+        'flat': codes,
+        'ivf_flat': f"IVF{params['nlist']},{codes}",
+        'hnsw': f"HNSW{params['hnsw_m']},{codes}",
+        'ivf_pq': f"IVF{params['nlist']},{pq}",
+    }[params['type']]
+    if params['pca_dim']:
+        description = f"PCA{params['pca_dim']},{description}"
+    return description
+
+
+def create_index(dim: int, params: Optional[dict] = None):
+    """Create an empty (possibly untrained), id-mapped index of the configured type."""
+    params = params or index_params()
+    if params['pca_dim'] and not 0 < params['pca_dim'] < dim:
+        raise ValueError(f"RAG_INDEX_PCA_DIM must be below the embedding dimension {dim}, got {params['pca_dim']}")
+    base = faiss.index_factory(dim, factory_string(params), faiss.METRIC_L2)
+    if params['type'] == 'hnsw':
+        storage_index(base).hnsw.efConstruction = params['ef_construction']
+    index = faiss.IndexIDMap2(base)
+    apply_search_params(index, params)
+    return index
+
+
+def base_index(index):
+    """The index wrapped by an IndexIDMap, downcast to its concrete type."""
+    return faiss.downcast_index(index.index if hasattr(index, 'id_map') else index)
+
+
+def storage_index(index):
+    """The index that stores the vectors: :func:`base_index` without a PCA pre-transform."""
+    base = base_index(index)
+    if isinstance(base, faiss.IndexPreTransform):
+        return faiss.downcast_index(base.index)
+    return base
+
+
+def supports_removal(index) -> bool:
+    """Whether ``remove_ids`` works; HNSW graphs cannot drop nodes."""
+    return not hasattr(storage_index(index), 'hnsw')
+
+
+def apply_search_params(index, params: Optional[dict] = None):
+    """Set query-time knobs (nprobe / efSearch), e.g. after loading a snapshot."""
+    params = params or index_params()
+    try:
+        faiss.extract_index_ivf(index).nprobe = params['nprobe']
+    except RuntimeError:
+        pass  # Not an IVF index
+    hnsw = getattr(storage_index(index), 'hnsw', None)
+    if hnsw is not None:
+        hnsw.efSearch = params['ef_search']
+
+
+def min_training_vectors(params: dict) -> int:
+    """Fewest vectors the index type can be trained on."""
+    needed = params['nlist'] if params['type'] in ('ivf_flat', 'ivf_pq') else 0
+    if params['type'] == 'ivf_pq' or params['storage'] == 'pq':
+        needed = max(needed, 2 ** params['pq_nbits'])
+    return max(needed, params['pca_dim'])
+
+
+def train_index(index, vectors: np.ndarray, params: Optional[dict] = None, seed: int = 1234):
+    """
+    Train ``index`` on (a random sample of at most RAG_INDEX_TRAIN_SIZE of)
+    ``vectors``. Returns a flat index instead when there are too few vectors
+    to train the configured type.
+    """
+    params = params or index_params()
+    if index.is_trained:
+        return index
+    if len(vectors) < min_training_vectors(params):
+        print(
+            f"[RAG] {len(vectors)} vectors are too few to train a {params['type']} index, "
+            f"using exact flat search"
+        )
+        return faiss.IndexIDMap2(faiss.IndexFlatL2(index.d))
+
+    if len(vectors) > params['train_size']:
+        rng = np.random.default_rng(seed)
+        vectors = vectors[rng.choice(len(vectors), params['train_size'], replace=False)]
+    index.train(np.ascontiguousarray(vectors, dtype=np.float32))
+    return index
+
+
+class Tombstones:
+    """
+    Positions of deleted vectors in an index without ``remove_ids`` (HNSW).
+
+    Searches exclude them with an ID selector on the wrapped graph; once they
+    exceed RAG_INDEX_COMPACT_RATIO of the index it is rebuilt without them.
+    """
+
+    def __init__(self, positions: Iterable[int] = ()):
+        self.positions = set(positions)
+        self._selector = None
+
+    def __len__(self):
+        return len(self.positions)
+
+    def add(self, positions: Iterable[int]):
+        self.positions.update(int(p) for p in positions)
+        self._selector = None
+
+    def search_params(self, base):
+        if self._selector is None:
+            batch = faiss.IDSelectorBatch(np.array(sorted(self.positions), dtype=np.int64))
+            self._selector = (batch, faiss.IDSelectorNot(batch))  # Keep batch alive for the Not
+        graph = storage_index(base)
+        params = faiss.SearchParametersHNSW(sel=self._selector[1], efSearch=graph.hnsw.efSearch)
+        if not isinstance(base, faiss.IndexPreTransform):
+            return params
+        wrapped = faiss.SearchParametersPreTransform()
+        wrapped.index_params = params
+        wrapped.referenced_objects = [params]
+        return wrapped
+
+
+def search(index, queries: np.ndarray, k: int, tombstones: Optional[Tombstones] = None):
+    """
+    Search an id-mapped index, skipping tombstoned positions.
+
+    Returns ``(distances, labels)`` like ``Index.search``.
+    """
+    if not tombstones:
+        return index.search(queries, k)
+    base = base_index(index)
+    distances, positions = base.search(queries, k, params=tombstones.search_params(base))
+    labels = np.array([[index.id_map.at(int(p)) if p >= 0 else -1 for p in row] for row in positions], dtype=np.int64)
+    return distances, labels
+
+
+def positions_of(index, labels: np.ndarray) -> np.ndarray:
+    """Positions in an id-mapped index that hold any of ``labels`` (a scan of the id map)."""
+    return np.flatnonzero(np.isin(faiss.vector_to_array(index.id_map), labels))
+
+
+def compact_index(index, tombstones: Tombstones, params: Optional[dict] = None):
+    """
+    Rebuild an HNSW index from its live vectors, dropping the tombstoned ones.
+    The new index reuses the old one's training (PCA, quantizer).
+    """
+    live = np.setdiff1d(np.arange(index.ntotal), np.fromiter(tombstones.positions, dtype=np.int64))
+    base = base_index(index)
+    vectors = base.reconstruct_n(0, index.ntotal)[live]
+    labels = faiss.vector_to_array(index.id_map)[live]
+    empty = faiss.clone_index(base)
+    empty.reset()
+    fresh = faiss.IndexIDMap2(empty)
+    apply_search_params(fresh, params)
+    fresh.add_with_ids(vectors, labels)
+    return fresh
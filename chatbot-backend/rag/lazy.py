@@ -0,0 +1,43 @@
+"""
+Deferred imports of heavy optional dependencies.
+
+``api.views`` imports ``rag.pipeline`` when the URLconf loads, so anything
+the pipeline imports at module level is paid by every ``manage.py``
+command and every worker start. FAISS and the Gemini SDK (about a second
+of imports on its own) are therefore bound to :class:`LazyModule` proxies
+and only imported when the pipeline first uses them.
+"""
+import importlib
+import importlib.util
+import threading
+
+
+def module_available(name: str) -> bool:
+    """Whether ``name`` can be imported, without importing it (parent packages aside)."""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+class LazyModule:
+    """Stand-in for a module that imports it on first attribute access. Thread-safe."""
+
+    def __init__(self, name: str):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+        self.__dict__['_lock'] = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._module is None:
+                self.__dict__['_module'] = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        module = self._module or self._load()
+        return getattr(module, attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<lazy module {self._name!r} ({state})>"
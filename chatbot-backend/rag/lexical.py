@@ -0,0 +1,283 @@
+"""
+In-process BM25 index for the lexical leg of hybrid retrieval.
+
+Dense embeddings blur exact tokens such as course codes or product names
+("CS101", "Stripe"). RAGPipeline keeps this index next to the FAISS index,
+addressed by the same labels, queries both and merges the two rankings
+with :func:`reciprocal_rank_fusion`.
+
+Postings are appended per term to compact arrays and turned into NumPy
+arrays of BM25 weights on the first query that needs them, so scoring a
+query is a few vectorized operations per term instead of a Python loop
+over matching documents.
+Removed documents are masked out and physically dropped once they exceed
+``compact_ratio`` of the index.
+"""
+import io
+import math
+import re
+import threading
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+TOKEN_RE = re.compile(r'\w+')
+
+# Words that occur in nearly every question; they add long postings but no ranking signal
+STOPWORDS = frozenset(
+    'a an and are as at be but by can do does for from how i if in is it me my of on or so that the this '
+    'to was what when where which who why will with you your'.split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased word tokens of ``text`` without stopwords."""
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[int]], k: int = 60,
+                           limit: Optional[int] = None) -> List[Tuple[int, float]]:
+    """
+    Merge ranked label lists: each label scores ``sum(1 / (k + rank))`` over
+    the lists it appears in. Returns ``(label, score)`` pairs, best first;
+    ties keep the order in which labels were first seen.
+    """
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, label in enumerate(ranking, 1):
+            scores[label] = scores.get(label, 0.0) + 1.0 / (k + rank)
+    fused = sorted(scores.items(), key=lambda item: -item[1])
+    return fused[:limit] if limit is not None else fused
+
+
+class LexicalIndex:
+    """BM25 inverted index over labelled documents. Thread-safe."""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, compact_ratio: float = 0.2, common_ratio: float = 0.05):
+        self.k1 = k1
+        self.b = b
+        self.compact_ratio = compact_ratio
+        self.common_ratio = common_ratio
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._slots: Dict[int, int] = {}  # Label -> slot
+            self._size = 0  # Slots in use, including removed ones
+            self._labels = np.zeros(0, dtype=np.int64)  # Slot -> label
+            self._lengths = np.zeros(0, dtype=np.float32)  # Slot -> token count
+            self._alive = np.zeros(0, dtype=bool)
+            self._total_length = 0
+            self._postings: Dict[str, Tuple[array, array]] = {}  # Term -> (slots, term frequencies)
+            self._arrays: Dict[str, Tuple[np.ndarray, np.ndarray, float]] = {}  # See _term_arrays
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def add(self, labels: Iterable[int], texts: Iterable[str]):
+        """Index ``texts`` under ``labels``, replacing documents already indexed under them."""
+        entries = [(int(label), Counter(tokenize(text))) for label, text in zip(labels, texts)]
+        with self._lock:
+            self._reserve(self._size + len(entries))
+            for label, counts in entries:
+                self._discard(label)
+                slot = self._size
+                self._size += 1
+                length = sum(counts.values())
+                self._slots[label] = slot
+                self._labels[slot] = label
+                self._lengths[slot] = length
+                self._alive[slot] = True
+                self._total_length += length
+                for term, tf in counts.items():
+                    postings = self._postings.get(term)
+                    if postings is None:
+                        postings = self._postings[term] = (array('i'), array('f'))
+                    postings[0].append(slot)
+                    postings[1].append(tf)
+            if entries:
+                self._arrays = {}
+
+    def remove(self, labels: Iterable[int]):
+        """Drop documents; unknown labels are ignored."""
+        with self._lock:
+            for label in labels:
+                self._discard(int(label))
+            if self._size - len(self._slots) > self.compact_ratio * self._size:
+                self._compact()
+
+    def to_bytes(self) -> bytes:
+        """Serialize the index (without removed documents) as an ``.npz`` archive."""
+        with self._lock:
+            if self._size > len(self._slots):
+                self._compact()
+            terms = list(self._postings)
+            buffer = io.BytesIO()
+            np.savez(
+                buffer,
+                labels=self._labels[:self._size],
+                lengths=self._lengths[:self._size],
+                terms=np.frombuffer('\n'.join(terms).encode('utf-8'), dtype=np.uint8),
+                offsets=np.cumsum([0] + [len(self._postings[term][0]) for term in terms]),
+                slots=np.concatenate([np.frombuffer(self._postings[t][0], dtype=np.int32) for t in terms] or [[]]),
+                tfs=np.concatenate([np.frombuffer(self._postings[t][1], dtype=np.float32) for t in terms] or [[]]),
+            )
+            return buffer.getvalue()
+
+    def load(self, path: str):
+        """Replace the contents with an index written by :meth:`to_bytes`."""
+        with np.load(path) as data:
+            labels, lengths, offsets = data['labels'], data['lengths'], data['offsets']
+            slots, tfs = data['slots'].astype(np.int32), data['tfs'].astype(np.float32)
+            terms = data['terms'].tobytes().decode('utf-8').split('\n') if len(data['terms']) else []
+        self.clear()
+        with self._lock:
+            self._size = len(labels)
+            self._labels = labels.astype(np.int64)
+            self._lengths = lengths.astype(np.float32)
+            self._alive = np.ones(self._size, dtype=bool)
+            self._total_length = int(self._lengths.sum())
+            self._slots = dict(zip(self._labels.tolist(), range(self._size)))
+            for term, start, stop in zip(terms, offsets[:-1], offsets[1:]):
+                self._postings[term] = (array('i', slots[start:stop].tobytes()), array('f', tfs[start:stop].tobytes()))
+
+    def search(self, query: str, limit: int) -> List[int]:
+        """Labels of the ``limit`` best BM25 matches for ``query``, best first."""
+        terms = set(tokenize(query))
+        with self._lock:
+            if not self._slots or not terms or limit < 1:
+                return []
+            postings = []
+            for term in terms:
+                arrays = self._term_arrays(term)
+                if arrays is not None:
+                    # Like Lucene, document statistics include removed documents until compaction
+                    df = len(arrays[0])
+                    postings.append((math.log(1 + (self._size - df + 0.5) / (df + 0.5)), *arrays))
+            if not postings:
+                return []
+
+            # Score the rare terms' postings in full. Terms in more than common_ratio of the
+            # documents only add their contribution to documents that can still make the top
+            # ``limit`` (MaxScore), which keeps queries with frequent words fast.
+            postings.sort(key=lambda p: len(p[1]))
+            common = [p for p in postings[1:] if len(p[1]) > self.common_ratio * self._size]
+            slots, scores = self._score(postings[:len(postings) - len(common)])
+            if common:
+                pruned = self._add_common_terms(slots, scores, common, limit)
+                slots, scores = pruned if pruned is not None else self._score(postings)
+
+            if len(slots) > limit:
+                best = np.argpartition(-scores, limit - 1)[:limit]
+                slots, scores = slots[best], scores[best]
+            order = np.lexsort((slots, -scores))  # Ties: earlier-indexed document first
+            return self._labels[slots[order]].tolist()
+
+    def _score(self, postings) -> Tuple[np.ndarray, np.ndarray]:
+        """Live slots matching any of ``postings`` and their summed BM25 scores."""
+        matched, scores = [], []
+        for idf, slots, weights, _ in postings:
+            if self._size > len(self._slots):
+                keep = self._alive[slots]
+                slots, weights = slots[keep], weights[keep]
+            matched.append(slots)
+            scores.append(idf * weights)
+        if len(matched) == 1:
+            return matched[0], scores[0]
+
+        slots, scores = np.concatenate(matched), np.concatenate(scores)
+        if len(slots) * 16 < self._size:
+            slots, inverse = np.unique(slots, return_inverse=True)
+            return slots, np.bincount(inverse, scores)
+        totals = np.bincount(slots, scores, minlength=self._size)
+        slots = np.flatnonzero(totals > 0)  # Much faster than flatnonzero() on floats
+        return slots, totals[slots]
+
+    def _add_common_terms(self, slots, scores, common, limit: int):
+        """
+        Add the common terms' scores to the candidates that can still reach the
+        top ``limit``. Returns None when documents matching only common terms
+        could rank there too, and everything has to be scored.
+        """
+        bound = sum(idf * max_weight for idf, _, _, max_weight in common)  # Most they add to any document
+        if len(slots) < limit:
+            return None
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        threshold = (scores[top] + self._lookup(common, slots[top])).min()
+        if threshold < bound:
+            return None
+        candidates = scores + bound > threshold
+        slots = slots[candidates]
+        return slots, scores[candidates] + self._lookup(common, slots)
+
+    @staticmethod
+    def _lookup(postings, slots: np.ndarray) -> np.ndarray:
+        """Summed scores of ``postings`` for the given slots, found by binary search."""
+        total = np.zeros(len(slots))
+        for idf, term_slots, weights, _ in postings:
+            found = np.minimum(np.searchsorted(term_slots, slots), len(term_slots) - 1)
+            total += idf * np.where(term_slots[found] == slots, weights[found], 0)
+        return total
+
+    def _term_arrays(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray, float]]:
+        """
+        The term's slots (ascending), their BM25 term-frequency weights and
+        the largest of those. Cached until the next document is added, which
+        changes the average document length the weights depend on.
+        """
+        cached = self._arrays.get(term)
+        if cached is None:
+            postings = self._postings.get(term)
+            if postings is None:
+                return None
+            slots = np.frombuffer(postings[0], dtype=np.int32).copy()
+            tfs = np.frombuffer(postings[1], dtype=np.float32)
+            avgdl = self._total_length / self._size or 1.0
+            norm = self.k1 * (1 - self.b + self.b * self._lengths[slots] / avgdl)
+            weights = ((self.k1 + 1) * tfs / (tfs + norm)).astype(np.float32)
+            cached = self._arrays[term] = (slots, weights, float(weights.max()))
+        return cached
+
+    def _discard(self, label: int):
+        slot = self._slots.pop(label, None)
+        if slot is not None:
+            self._alive[slot] = False
+
+    def _reserve(self, size: int):
+        if size <= len(self._labels):
+            return
+        capacity = max(size, 2 * len(self._labels), 1024)
+        for name in ('_labels', '_lengths', '_alive'):
+            old = getattr(self, name)
+            grown = np.zeros(capacity, dtype=old.dtype)
+            grown[:len(old)] = old
+            setattr(self, name, grown)
+
+    def _compact(self):
+        """Renumber the live documents' slots and drop the postings of removed ones."""
+        alive = self._alive[:self._size]
+        new_slots = (np.cumsum(alive) - 1).astype(np.int32)
+        for term, (slots, tfs) in list(self._postings.items()):
+            slots = np.frombuffer(slots, dtype=np.int32)
+            keep = alive[slots]
+            if keep.all():
+                self._postings[term] = (array('i', new_slots[slots].tobytes()), tfs)
+            elif keep.any():
+                self._postings[term] = (
+                    array('i', new_slots[slots[keep]].tobytes()),
+                    array('f', np.frombuffer(tfs, dtype=np.float32)[keep].tobytes()),
+                )
+            else:
+                del self._postings[term]
+        self._arrays = {}
+
+        live = np.flatnonzero(alive)
+        self._size = len(live)
+        self._labels = self._labels[live]
+        self._lengths = self._lengths[live]
+        self._total_length = int(self._lengths.sum())
+        self._alive = np.ones(self._size, dtype=bool)
+        self._slots = dict(zip(self._labels.tolist(), range(self._size)))
@@ -2,23 +2,99 @@
 RAG (Retrieval-Augmented Generation) Pipeline for the chatbot.
 Uses FAISS for vector search and Google Gemini for response generation.
 """
+import asyncio
+import hashlib
 import os
+import threading
+import time
 import numpy as np
-from typing import List, Dict, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from itertools import islice
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
 from django.conf import settings
+from django.db.models.functions import Length
 
-try:
-    import google.generativeai as genai
-    GEMINI_AVAILABLE = True
-except ImportError:
-    GEMINI_AVAILABLE = False
+from .lazy import LazyModule, module_available
 
-try:
-    from sentence_transformers import SentenceTransformer
-    import faiss
-    FAISS_AVAILABLE = True
-except ImportError:
-    FAISS_AVAILABLE = False
+# Heavy SDKs are imported when the pipeline first uses them (see rag.lazy).
+# sentence-transformers pulls in torch; it is only imported where the model
+# is loaded, so sidecar-mode workers never pay for it.
+GEMINI_AVAILABLE = module_available('google.generativeai')
+genai = LazyModule('google.generativeai')
+FAISS_AVAILABLE = module_available('faiss') and module_available('sentence_transformers')
+
+from .cache import QueryEmbeddingCache, SemanticResponseCache
+from .chunking import chunk_spans
+from .embedding import load_embedding_model
+from .index import Tombstones, compact_index, create_index, faiss, positions_of, search, supports_removal, train_index
+from .lexical import LexicalIndex, reciprocal_rank_fusion
+from .prompt import PromptBuilder
+from .snapshot import load_snapshot
+
+
+# Knowledge-base sources: document type -> (model name, title field, content field).
+# The document type doubles as the model's ``_meta.model_name``.
+KNOWLEDGE_BASE_SOURCES = {
+    'document': ('Document', 'title', 'content'),
+    'faq': ('FAQ', 'question', 'answer'),
+}
+
+# Types whose rows are split into chunks (see rag.chunking) -> model storing each chunk's
+# boundaries and embedding, with a foreign key named after the type. Other rows are
+# embedded whole and store their embedding themselves.
+CHUNKED_SOURCES = {'document': 'DocumentChunk'}
+
+EMBEDDING_FIELDS = ['embedding', 'embedding_model', 'embedding_dim', 'content_hash']
+NO_EMBEDDING = (None, '', None, '')
+
+# Index labels: chunk ordinal in the high bits, then the document type code, database id below
+LABEL_TYPE_CODES = {'document': 1, 'faq': 2}
+LABEL_ID_BITS = 40
+LABEL_CHUNK_SHIFT = 48
+MAX_CHUNKS = 1 << (63 - LABEL_CHUNK_SHIFT)
+
+
+def document_label(doc_type: str, row_id: int, chunk: int = 0) -> int:
+    """Index label of chunk ``chunk`` of the knowledge-base row ``(doc_type, row_id)``."""
+    return (int(chunk) << LABEL_CHUNK_SHIFT) | (LABEL_TYPE_CODES[doc_type] << LABEL_ID_BITS) | int(row_id)
+
+
+def entry_label(doc: Dict) -> int:
+    """Index label of a pipeline document dict (a whole row or one chunk of it)."""
+    return document_label(doc['type'], doc['id'], doc.get('chunk', 0))
+
+
+def content_hash(text: str) -> str:
+    """SHA-256 of the text that gets embedded for a knowledge-base entry."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def knowledge_base_model(doc_type: str):
+    """Return the Django model class that stores entries of ``doc_type``."""
+    from django.apps import apps
+
+    return apps.get_model('api', KNOWLEDGE_BASE_SOURCES[doc_type][0])
+
+
+def chunk_model(doc_type: str):
+    """Return the Django model class that stores the chunks of ``doc_type`` rows."""
+    from django.apps import apps
+
+    return apps.get_model('api', CHUNKED_SOURCES[doc_type])
+
+
+def _rows_in_range(doc_type: str, id_range: Optional[Tuple[int, int]] = None):
+    """Rows of ``doc_type`` in primary-key order, limited to ``lo <= pk < hi`` when a range is given."""
+    rows = knowledge_base_model(doc_type).objects.order_by('pk')
+    if id_range is not None:
+        rows = rows.filter(pk__gte=id_range[0], pk__lt=id_range[1])
+    return rows
+
+
+def _batches(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
 
 
 class RAGPipeline:
@@ -30,94 +106,607 @@ class RAGPipeline:
     def __init__(self):
         self.gemini_model = None
         self.embedding_model = None
+        self.embedding_model_name = getattr(settings, 'RAG_EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+        self.embedding_dim = 384
         self.index = None
-        self.documents = []
+        self.index_path = None  # Set while the index is memory-mapped from a snapshot
+        self.documents = {}  # Index label -> document
+        self.tombstones = Tombstones()  # Deleted HNSW positions awaiting compaction
+        self.lexical = LexicalIndex()  # BM25 over the same labels, for hybrid retrieval
+        self.reranker = None  # Cross-encoder, loaded on first use when RAG_RERANK is on
+        self._reranker_lock = threading.Lock()
+        self._lock = threading.RLock()  # FAISS indexes are not safe to search while written
+        self.query_cache = QueryEmbeddingCache(
+            maxsize=getattr(settings, 'RAG_QUERY_CACHE_SIZE', 1024),
+            ttl=getattr(settings, 'RAG_QUERY_CACHE_TTL', 3600),
+        )
+        self.answer_cache = SemanticResponseCache(
+            max_distance=getattr(settings, 'RAG_ANSWER_CACHE_MAX_DISTANCE', 0.05),
+            maxsize=getattr(settings, 'RAG_ANSWER_CACHE_SIZE', 256),
+            ttl=getattr(settings, 'RAG_ANSWER_CACHE_TTL', 3600),
+            backend=getattr(settings, 'RAG_ANSWER_CACHE_BACKEND', ''),
+        )
+        self.prompt_builder = PromptBuilder(cache_size=getattr(settings, 'RAG_TOKEN_COUNT_CACHE_SIZE', 10000))
         self._initialize()
 
     def _initialize(self):
         """Initialize the RAG components."""
-        # Initialize Gemini
-        if GEMINI_AVAILABLE and settings.GEMINI_API_KEY:
-            try:
-                genai.configure(api_key=settings.GEMINI_API_KEY)
-                self.gemini_model = genai.GenerativeModel('gemini-2.5-flash')
-            except Exception as e:
-                print(f"Failed to initialize Gemini: {e}")
+        self._initialize_gemini()
 
         # Initialize embedding model and FAISS
         if FAISS_AVAILABLE:
             try:
-                self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-                self.index = faiss.IndexFlatL2(384)  # 384 is the embedding dimension
+                self.embedding_model = load_embedding_model(self.embedding_model_name)
+                self.embedding_dim = self.embedding_model.get_sentence_embedding_dimension()
+                self.index = create_index(self.embedding_dim)
             except Exception as e:
                 print(f"Failed to initialize FAISS: {e}")
 
-    def add_documents(self, documents: List[Dict[str, str]]):
+    def _initialize_gemini(self):
+        if GEMINI_AVAILABLE and settings.GEMINI_API_KEY:
+            try:
+                genai.configure(api_key=settings.GEMINI_API_KEY)
+                self.gemini_model = genai.GenerativeModel('gemini-2.5-flash')
+            except Exception as e:
+                print(f"Failed to initialize Gemini: {e}")
+
+    def add_documents(self, documents: List[Dict[str, str]], batch_size: Optional[int] = None):
         """
-        Add documents to the knowledge base.
+        Add or replace documents in the knowledge base.
+
+        Texts are encoded in batches and each batch's embedding matrix is
+        added to the index in a single call. An untrained index (IVF types)
+        is trained on the first batch it receives. Documents of chunked
+        types are indexed per chunk. A document whose ``(type, id)`` is
+        already indexed replaces the old entries.
 
         Args:
-            documents: List of dicts with 'title' and 'content' keys
+            documents: List of dicts with 'title', 'content', 'type' and 'id' keys
+            batch_size: Texts per encode call (defaults to RAG_EMBED_BATCH_SIZE)
         """
-        if not FAISS_AVAILABLE or self.embedding_model is None:
+        if not self._can_embed():
             return
 
-        for doc in documents:
-            text = f"{doc.get('title', '')} {doc.get('content', '')}"
-            embedding = self.embedding_model.encode([text])[0]
-            self.index.add(np.array([embedding], dtype=np.float32))
-            self.documents.append(doc)
+        batch_size = batch_size or getattr(settings, 'RAG_EMBED_BATCH_SIZE', 64)
+        for batch in _batches(self._chunk_documents(documents), batch_size):
+            self._add_vectors(self._encode([self._document_text(doc) for doc in batch], batch_size), batch)
+        self.answer_cache.invalidate()
+
+    def upsert_instances(self, doc_type: str, instances):
+        """
+        Add saved Document/FAQ model instances to the index, replacing the
+        entries of rows that are already indexed.
+
+        Stored embeddings are reused when they are still current; anything
+        else is encoded and written back to the row (or its chunk rows).
+        """
+        if not self._can_embed():
+            return
+        for batch in _batches(self._instance_entries(doc_type, instances), getattr(settings, 'RAG_EMBED_BATCH_SIZE', 64)):
+            self._add_entries(doc_type, batch)
+        self.answer_cache.invalidate()
+
+    def embed_instances(self, doc_type: str, instances) -> int:
+        """
+        Compute and store the embeddings of saved Document/FAQ model instances
+        without indexing them, for processes that only write to the database
+        (bulk imports). Returns the number of entries encoded.
+        """
+        if not self._can_embed():
+            return 0
+        encoded = 0
+        for batch in _batches(self._instance_entries(doc_type, instances), getattr(settings, 'RAG_EMBED_BATCH_SIZE', 64)):
+            encoded += self._entry_vectors(doc_type, batch)[2]
+        return encoded
+
+    def _instance_entries(self, doc_type: str, instances):
+        """``(doc, stored)`` entries of saved model instances, chunked for chunked types."""
+        if doc_type in CHUNKED_SOURCES:
+            _, title_field, content_field = KNOWLEDGE_BASE_SOURCES[doc_type]
+            return self._chunk_entries(
+                doc_type, [(obj.pk, getattr(obj, title_field), getattr(obj, content_field)) for obj in instances]
+            )
+        return (self._entry_from_instance(doc_type, obj) for obj in instances)
+
+    def remove_instances(self, doc_type: str, ids: List[int]):
+        """Remove the entries of deleted Document/FAQ rows from the index."""
+        if not self._can_embed():
+            return
+        with self._lock:
+            self._remove_labels([label for row_id in ids for label in self._indexed_labels(doc_type, row_id)])
+        self.answer_cache.invalidate()
 
     def load_documents_from_db(self):
-        """Load documents and FAQs from database."""
-        from api.models import Document, FAQ
+        """
+        Load documents and FAQs from database.
+
+        Rows are streamed from the database in chunks of ``RAG_DB_CHUNK_SIZE``
+        (and at most ``RAG_DB_CHUNK_CHARS`` characters of document content).
+        Stored vectors are reused directly; only rows and chunks whose content
+        hash, model name or dimension no longer match are re-encoded (and the
+        new vectors written back).
+
+        Index types that need training (IVF) are trained on the complete set
+        of vectors before any of them is added.
+
+        Rows are kept in sync incrementally afterwards (see ``api.signals``),
+        so a full load is only needed at startup or to repair the index.
+        """
+        self.reset_index()
+        if not self._can_embed():
+            return
+        self.add_encoded((vectors, docs) for vectors, docs, _ in self._encode_entries(self._iter_knowledge_base()))
 
-        self.documents = []
+    def reset_index(self):
+        """Empty the vector index, the document mapping and the keyword index."""
+        self.documents = {}
+        self.tombstones = Tombstones()
+        self.lexical.clear()
         if self.index is not None:
-            self.index.reset()
+            self.index = create_index(self.embedding_dim)
+            self.index_path = None
+
+    def encode_rows(self, doc_type: str, id_range: Tuple[int, int]) -> Tuple[np.ndarray, List[Dict], int]:
+        """
+        Vectors and documents for the ``doc_type`` rows with ``lo <= pk < hi``,
+        without adding them to the index, and how many of them had to be
+        re-encoded. Used by parallel index builds (see ``rag.build``).
+
+        The rows are read before anything is encoded, so no read cursor stays
+        open (on SQLite: holding a lock) while other workers write embeddings.
+        """
+        entries = list(self._iter_knowledge_base([doc_type], id_range))
+        batches = list(self._encode_entries(entries))
+        if not batches:
+            return np.empty((0, self.embedding_dim), dtype=np.float32), [], 0
+        return (
+            np.vstack([vectors for vectors, _, _ in batches]),
+            [doc for _, docs, _ in batches for doc in docs],
+            sum(encoded for _, _, encoded in batches),
+        )
+
+    def add_encoded(self, batches: Iterable[Tuple[np.ndarray, List[Dict]]]):
+        """
+        Add ``(vectors, docs)`` batches to the index. Index types that need
+        training (IVF) are trained on the complete set of vectors before any
+        of them is added.
+        """
+        if self.index.is_trained:
+            for vectors, docs in batches:
+                self._add_vectors(vectors, docs)
+            return
+        pending = list(batches)
+        if pending:
+            self.index = train_index(self.index, np.vstack([vectors for vectors, _ in pending]))
+            for vectors, docs in pending:
+                self._add_vectors(vectors, docs)
+
+    def _iter_knowledge_base(self, doc_types: Iterable[str] = tuple(KNOWLEDGE_BASE_SOURCES),
+                             id_range: Optional[Tuple[int, int]] = None):
+        """
+        Yield ``(doc, stored)`` for every FAQ row and Document chunk, where
+        ``doc`` is the pipeline document dict and ``stored`` the embedding
+        columns of its row. ``id_range`` ``(lo, hi)`` limits the rows to
+        primary keys ``lo <= pk < hi``.
+        """
+        chunk_size = getattr(settings, 'RAG_DB_CHUNK_SIZE', 500)
+
+        for doc_type in doc_types:
+            if doc_type in CHUNKED_SOURCES:
+                yield from self._iter_chunked_rows(doc_type, id_range)
+                continue
+            _, title_field, content_field = KNOWLEDGE_BASE_SOURCES[doc_type]
+            rows = _rows_in_range(doc_type, id_range).values_list('id', title_field, content_field, *EMBEDDING_FIELDS)
+            for row_id, title, content, *stored in rows.iterator(chunk_size=chunk_size):
+                yield {'title': title, 'content': content, 'type': doc_type, 'id': row_id}, tuple(stored)
+
+    def _iter_chunked_rows(self, doc_type: str, id_range: Optional[Tuple[int, int]] = None):
+        """
+        ``_iter_knowledge_base`` for a chunked type. Content is fetched for
+        groups of rows holding at most RAG_DB_CHUNK_CHARS characters, so
+        multi-megabyte documents are read a few at a time.
+        """
+        model = knowledge_base_model(doc_type)
+        _, title_field, content_field = KNOWLEDGE_BASE_SOURCES[doc_type]
+        chunk_size = getattr(settings, 'RAG_DB_CHUNK_SIZE', 500)
+        max_chars = getattr(settings, 'RAG_DB_CHUNK_CHARS', 4_000_000)
+
+        def read(ids):
+            return self._chunk_entries(
+                doc_type, model.objects.filter(pk__in=ids).order_by('pk').values_list('id', title_field, content_field)
+            )
+
+        group, chars = [], 0
+        lengths = _rows_in_range(doc_type, id_range).values_list('id', Length(content_field))
+        for row_id, length in lengths.iterator(chunk_size=chunk_size):
+            if group and (len(group) >= chunk_size or chars + (length or 0) > max_chars):
+                yield from read(group)
+                group, chars = [], 0
+            group.append(row_id)
+            chars += length or 0
+        if group:
+            yield from read(group)
+
+    def _chunk_entries(self, doc_type: str, rows):
+        """
+        Yield ``(doc, stored)`` for every chunk of the ``(id, title, content)``
+        rows of a chunked type, with the embedding stored for the chunk if its
+        boundaries are unchanged. Stored chunks the rows no longer have are
+        deleted.
+        """
+        rows = list(rows)
+        model = chunk_model(doc_type)
+        stored = {}
+        for pk, row_id, ordinal, start, end, *fields in model.objects.filter(
+            **{f'{doc_type}_id__in': [row[0] for row in rows]}
+        ).values_list('pk', f'{doc_type}_id', 'ordinal', 'start', 'end', *EMBEDDING_FIELDS):
+            stored[row_id, ordinal] = (pk, (start, end), tuple(fields))
+
+        docs = ({'title': title, 'content': content, 'type': doc_type, 'id': row_id} for row_id, title, content in rows)
+        for doc in self._chunk_documents(docs):
+            _, bounds, fields = stored.pop((doc['id'], doc['chunk']), (None, None, NO_EMBEDDING))
+            yield doc, fields if bounds == (doc['start'], doc['end']) else NO_EMBEDDING
+
+        if stored:
+            model.objects.filter(pk__in=[pk for pk, _, _ in stored.values()]).delete()
+
+    def _chunk_documents(self, documents: Iterable[Dict]) -> Iterator[Dict]:
+        """
+        Expand documents of chunked types into one dict per chunk, with
+        ``chunk``, ``start`` and ``end`` keys, and drop index entries for
+        chunks a re-chunked document no longer has. Other documents (and
+        dicts that already are chunks) pass through unchanged.
+        """
+        size = getattr(settings, 'RAG_CHUNK_SIZE', 800)
+        overlap = getattr(settings, 'RAG_CHUNK_OVERLAP', 100)
+        for doc in documents:
+            if doc['type'] not in CHUNKED_SOURCES or 'chunk' in doc:
+                yield doc
+                continue
+            content = doc.get('content') or ''
+            count = 0
+            for ordinal, (start, end) in enumerate(chunk_spans(content, size, overlap)):
+                if ordinal == MAX_CHUNKS:
+                    print(f"[RAG] {doc['type']} {doc['id']} has more than {MAX_CHUNKS} chunks, indexing the first ones")
+                    break
+                yield dict(doc, content=content[start:end].strip(), chunk=ordinal, start=start, end=end)
+                count = ordinal + 1
+            with self._lock:
+                self._remove_labels(self._indexed_labels(doc['type'], doc['id'], first_chunk=count))
+
+    def _indexed_labels(self, doc_type: str, row_id: int, first_chunk: int = 0) -> List[int]:
+        """Labels of the indexed chunks of a row from ``first_chunk`` on (chunk 0 is a whole unchunked row)."""
+        labels = []
+        chunk = first_chunk
+        while document_label(doc_type, row_id, chunk) in self.documents:
+            labels.append(document_label(doc_type, row_id, chunk))
+            chunk += 1
+        return labels
+
+    def _entry_from_instance(self, doc_type: str, instance):
+        _, title_field, content_field = KNOWLEDGE_BASE_SOURCES[doc_type]
+        doc = {
+            'title': getattr(instance, title_field),
+            'content': getattr(instance, content_field),
+            'type': doc_type,
+            'id': instance.pk,
+        }
+        return doc, tuple(getattr(instance, field) for field in EMBEDDING_FIELDS)
+
+    def _encode_entries(self, entries) -> Iterator[Tuple[np.ndarray, List[Dict], int]]:
+        """
+        ``(vectors, docs, encoded)`` for ``(doc, stored)`` entries, in batches
+        of RAG_EMBED_BATCH_SIZE entries of one type (see ``_entry_vectors``).
+        """
+        batch_size = getattr(settings, 'RAG_EMBED_BATCH_SIZE', 64)
+        batch = []
+        for entry in entries:
+            if batch and (len(batch) >= batch_size or batch[-1][0]['type'] != entry[0]['type']):
+                yield self._entry_vectors(batch[0][0]['type'], batch)
+                batch = []
+            batch.append(entry)
+        if batch:
+            yield self._entry_vectors(batch[0][0]['type'], batch)
+
+    def _add_entries(self, doc_type: str, entries):
+        """Add ``(doc, stored)`` entries of one type, re-encoding stale rows."""
+        vectors, docs, _ = self._entry_vectors(doc_type, entries)
+        self._add_vectors(vectors, docs)
+
+    def _entry_vectors(self, doc_type: str, entries) -> Tuple[np.ndarray, List[Dict], int]:
+        """
+        Vectors and documents of ``(doc, stored)`` entries of one type, and
+        how many were encoded: stored vectors are reused, stale rows are
+        re-encoded and their new embeddings written back.
+        """
+        current = np.array([self._is_current(doc, stored) for doc, stored in entries], dtype=bool)
+        vectors = np.empty((len(entries), self.embedding_dim), dtype=np.float32)
+
+        if current.any():
+            blob = b''.join(bytes(stored[0]) for (_, stored), ok in zip(entries, current) if ok)
+            vectors[current] = np.frombuffer(blob, dtype=np.float32).reshape(-1, self.embedding_dim)
+
+        stale = np.flatnonzero(~current)
+        if stale.size:
+            texts = [self._document_text(entries[i][0]) for i in stale]
+            vectors[stale] = self._encode(texts)
+            self._persist_embeddings(doc_type, [entries[i][0] for i in stale], texts, vectors[stale])
+
+        return vectors, [doc for doc, _ in entries], int(stale.size)
+
+    def _add_vectors(self, vectors: np.ndarray, docs: List[Dict]):
+        """Add one batch of vectors and their documents, replacing entries with the same label."""
+        labels = np.array([entry_label(doc) for doc in docs], dtype=np.int64)
+        with self._lock:
+            self._ensure_index_writable()
+            if not self.index.is_trained:
+                self.index = train_index(self.index, vectors)
+            self._remove_labels([label for label in labels.tolist() if label in self.documents])
+            self.index.add_with_ids(vectors, labels)
+            self.documents.update(zip(labels.tolist(), docs))
+            self.lexical.add(labels.tolist(), [self._document_text(doc) for doc in docs])
+
+    def _remove_labels(self, labels: List[int]):
+        """
+        Drop labels from the index. HNSW cannot remove vectors, so their
+        positions are tombstoned instead and the graph is rebuilt once
+        tombstones exceed RAG_INDEX_COMPACT_RATIO of it. Caller holds the lock.
+        """
+        labels = [label for label in labels if label in self.documents]
+        if not labels:
+            return
+        self._ensure_index_writable()
+        ids = np.array(labels, dtype=np.int64)
+        if supports_removal(self.index):
+            self.index.remove_ids(ids)
+        else:
+            self.tombstones.add(positions_of(self.index, ids))
+            if len(self.tombstones) > getattr(settings, 'RAG_INDEX_COMPACT_RATIO', 0.2) * self.index.ntotal:
+                self.index = compact_index(self.index, self.tombstones)
+                self.tombstones = Tombstones()
+        self.lexical.remove(labels)
+        for label in labels:
+            del self.documents[label]
+
+    def _is_current(self, doc: Dict, stored: Tuple) -> bool:
+        """Whether a row's stored embedding can be reused as-is."""
+        embedding, model_name, dim, stored_hash = stored
+        return (
+            embedding is not None
+            and model_name == self.embedding_model_name
+            and dim == self.embedding_dim
+            and len(embedding) == self.embedding_dim * 4
+            and stored_hash == content_hash(self._document_text(doc))
+        )
+
+    def _persist_embeddings(self, doc_type: str, docs: List[Dict], texts: List[str], vectors: np.ndarray):
+        """
+        Write freshly computed vectors back to their rows without touching
+        ``updated_at``; chunk vectors are upserted into the chunk model along
+        with the chunk boundaries.
+        """
+        batch_size = getattr(settings, 'RAG_DB_CHUNK_SIZE', 500)
+        fields = [
+            {
+                'embedding': vector.tobytes(),
+                'embedding_model': self.embedding_model_name,
+                'embedding_dim': self.embedding_dim,
+                'content_hash': content_hash(text),
+            }
+            for text, vector in zip(texts, vectors)
+        ]
+        try:
+            if doc_type in CHUNKED_SOURCES:
+                model = chunk_model(doc_type)
+                updates = [
+                    model(**{f'{doc_type}_id': doc['id']}, ordinal=doc['chunk'], start=doc['start'], end=doc['end'], **f)
+                    for doc, f in zip(docs, fields)
+                ]
+                model.objects.bulk_create(
+                    updates, batch_size=batch_size, update_conflicts=True,
+                    unique_fields=[doc_type, 'ordinal'], update_fields=['start', 'end', *EMBEDDING_FIELDS],
+                )
+            else:
+                model = knowledge_base_model(doc_type)
+                updates = [model(pk=doc['id'], **f) for doc, f in zip(docs, fields)]
+                model.objects.bulk_update(updates, EMBEDDING_FIELDS, batch_size=batch_size)
+        except Exception as e:
+            print(f"Failed to store embeddings: {e}")
+
+    def _encode(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """Encode texts into a contiguous float32 matrix."""
+        embeddings = self.embedding_model.encode(
+            texts,
+            batch_size=batch_size or getattr(settings, 'RAG_EMBED_BATCH_SIZE', 64),
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        return np.ascontiguousarray(embeddings, dtype=np.float32)
+
+    def _ensure_index_writable(self):
+        """
+        Copy a memory-mapped snapshot index into RAM before it is modified;
+        FAISS aborts the process when asked to grow a mapped index.
+        """
+        if self.index_path is not None:
+            self.index = faiss.read_index(self.index_path)
+            self.index_path = None
 
-        # Load documents
-        for doc in Document.objects.all():
-            self.add_documents([{'title': doc.title, 'content': doc.content, 'type': 'document', 'id': doc.id}])
+    def _can_embed(self) -> bool:
+        """Whether both the embedding model and the vector index are usable."""
+        return FAISS_AVAILABLE and self.embedding_model is not None and self.index is not None
 
-        # Load FAQs
-        for faq in FAQ.objects.all():
-            self.add_documents([{'title': faq.question, 'content': faq.answer, 'type': 'faq', 'id': faq.id}])
+    @staticmethod
+    def _document_text(doc: Dict) -> str:
+        """Text that is embedded for a knowledge-base entry."""
+        return f"{doc.get('title', '')} {doc.get('content', '')}"
 
-    def retrieve(self, query: str, top_k: int = 3) -> List[Dict]:
+    def retrieve(self, query: str, top_k: int = 3, timings: Optional[Dict] = None) -> List[Dict]:
         """
         Retrieve relevant documents for a query.
 
+        With RAG_HYBRID_SEARCH the vector search and a BM25 keyword search
+        run in parallel and their rankings are merged with reciprocal-rank
+        fusion, so exact terms (course codes, product names) are found even
+        when the embedding misses them. With RAG_RERANK the candidates are
+        then re-scored by a cross-encoder (see :meth:`_rerank`).
+
         Args:
             query: User's question
             top_k: Number of documents to retrieve
+            timings: Optional dict that receives per-stage durations in ms
+                (``embed_ms``, ``search_ms``, ``rerank_ms``)
 
         Returns:
             List of relevant documents with scores
         """
-        if not FAISS_AVAILABLE or self.embedding_model is None or len(self.documents) == 0:
+        if not self._can_embed() or not self._has_documents():
             return []
 
         try:
-            query_embedding = self.embedding_model.encode([query])[0]
-            query_embedding = np.array([query_embedding], dtype=np.float32)
-
-            k = min(top_k, len(self.documents))
-            distances, indices = self.index.search(query_embedding, k)
-
-            results = []
-            for i, (dist, idx) in enumerate(zip(distances[0], indices[0])):
-                if idx < len(self.documents):
-                    doc = self.documents[idx].copy()
-                    doc['score'] = float(1 / (1 + dist))  # Convert distance to similarity score
-                    results.append(doc)
-
-            return results
+            started = time.perf_counter()
+            query_embedding = self.embed_query(query)
+            if timings is not None:
+                timings['embed_ms'] = _elapsed_ms(started)
+            return self._search(query_embedding, top_k, query, timings)
         except Exception as e:
             print(f"Retrieval error: {e}")
             return []
 
-    def generate_response(self, query: str, context: List[Dict] = None, chat_history: List[Dict] = None) -> Tuple[str, List[Dict]]:
+    def _search(self, query_embedding: np.ndarray, top_k: int, query: Optional[str] = None,
+                timings: Optional[Dict] = None) -> List[Dict]:
+        """
+        Best documents for a query, with scores: vector similarity, the
+        fused rank score when ``query`` is given and hybrid search is on, or
+        the cross-encoder score when re-ranking is on and finished in time.
+        """
+        timings = {} if timings is None else timings
+        k = min(top_k, len(self.documents))
+        if k == 0:
+            return []
+        rerank = bool(query) and self._rerank_enabled()
+        # Re-ranking needs a wider candidate list than is returned
+        candidates = min(max(k, getattr(settings, 'RAG_RERANK_CANDIDATES', 20)), len(self.documents)) if rerank else k
+
+        started = time.perf_counter()
+        if not query or not getattr(settings, 'RAG_HYBRID_SEARCH', True):
+            # Convert distance to similarity score
+            scored = [(label, 1 / (1 + dist)) for label, dist in self._dense_search(query_embedding, candidates)]
+        else:
+            # Both legs rank a deeper candidate list than is returned, so fusion can promote either's hits
+            depth = min(max(candidates, getattr(settings, 'RAG_HYBRID_CANDIDATES', 20)), len(self.documents))
+            lexical = get_lexical_executor().submit(self.lexical.search, query, depth)
+            dense = [label for label, _ in self._dense_search(query_embedding, depth)]
+            scored = reciprocal_rank_fusion(
+                [dense, lexical.result()], k=getattr(settings, 'RAG_RRF_K', 60), limit=candidates
+            )
+        results = self._results(scored)
+        timings['search_ms'] = _elapsed_ms(started)
+
+        if rerank and len(results) > 1:
+            started = time.perf_counter()
+            reranked = self._rerank(query, results, k)
+            timings['rerank_ms'] = _elapsed_ms(started)
+            timings['reranked'] = reranked is not None
+            if reranked is not None:
+                return reranked
+        return results[:k]
+
+    def _rerank_enabled(self) -> bool:
+        return getattr(settings, 'RAG_RERANK', False) and self.reranker is not False
+
+    def _rerank(self, query: str, docs: List[Dict], top_k: int) -> Optional[List[Dict]]:
+        """
+        The ``top_k`` of ``docs`` with the highest cross-encoder scores, which
+        replace their ``score``. All pairs are scored in one batch on the
+        re-ranking thread pool; if that takes longer than RAG_RERANK_BUDGET_MS
+        (or fails) None is returned and the caller keeps the first-stage order.
+        """
+        budget = getattr(settings, 'RAG_RERANK_BUDGET_MS', 150) / 1000
+        future = get_rerank_executor().submit(self._cross_encoder_scores, query, docs)
+        try:
+            scores = future.result(timeout=budget)
+        except FutureTimeoutError:
+            future.cancel()  # Still queued behind other requests: never run it
+            return None
+        except Exception as e:
+            print(f"[RAG] Re-ranking failed: {e}")
+            return None
+
+        results = []
+        for i in np.argsort(-scores, kind='stable')[:top_k]:
+            doc = docs[i]
+            doc['score'] = float(scores[i])
+            results.append(doc)
+        return results
+
+    def _cross_encoder_scores(self, query: str, docs: List[Dict]) -> np.ndarray:
+        """Relevance of every document to ``query``, from one cross-encoder batch."""
+        if self.reranker is None:
+            with self._reranker_lock:
+                if self.reranker is None:
+                    try:
+                        from sentence_transformers import CrossEncoder
+
+                        self.reranker = CrossEncoder(
+                            getattr(settings, 'RAG_RERANK_MODEL', 'cross-encoder/ms-marco-MiniLM-L-6-v2'),
+                            max_length=256, device='cpu',
+                        )
+                    except Exception as e:
+                        print(f"[RAG] Failed to load re-ranking model, re-ranking disabled: {e}")
+                        self.reranker = False
+                        raise
+        pairs = [(query, self._document_text(doc)) for doc in docs]
+        scores = self.reranker.predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+        return np.asarray(scores, dtype=np.float32).reshape(-1)
+
+    def _dense_search(self, query_embedding: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        """``(label, distance)`` of the ``k`` nearest indexed vectors."""
+        with self._lock:
+            distances, labels = search(self.index, query_embedding.reshape(1, -1), k, self.tombstones)
+        # ANN indexes pad missing hits with -1
+        return [(int(label), float(dist)) for dist, label in zip(distances[0], labels[0]) if label >= 0]
+
+    def _results(self, scored) -> List[Dict]:
+        """Copies of the documents of ``(label, score)`` pairs with their score set."""
+        results = []
+        for label, score in scored:
+            doc = self.documents.get(label)  # None if removed since the search
+            if doc is not None:
+                doc = doc.copy()
+                doc['score'] = float(score)
+                results.append(doc)
+        return results
+
+    def document_count(self) -> int:
+        """Number of indexed knowledge-base entries."""
+        return len(self.documents)
+
+    def _has_documents(self) -> bool:
+        return bool(self.documents)
+
+    def warm_up(self):
+        """
+        Encode a short text once, so the first query does not pay for the
+        model's lazy setup (kernel selection, thread pools, sidecar connection).
+        """
+        if self._can_embed():
+            self._encode(['warm up'])
+
+    def state(self) -> str:
+        """``ready``, or ``degraded`` when answers lack retrieval or come from the fallback."""
+        return 'ready' if self._can_embed() and self.gemini_model is not None else 'degraded'
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """Embedding of a user query, served from the LRU cache when possible."""
+        embedding = self.query_cache.get(query)
+        if embedding is None:
+            embedding = self._encode([query])[0]
+            self.query_cache.put(query, embedding)
+        return embedding
+
+    def generate_response(self, query: str, context: List[Dict] = None, chat_history: List[Dict] = None,
+                          timings: Optional[Dict] = None) -> Tuple[str, List[Dict]]:
         """
         Generate a response using the RAG pipeline.
 
@@ -125,13 +714,21 @@ class RAGPipeline:
             query: User's question
             context: Retrieved documents (optional, will retrieve if not provided)
             chat_history: Previous messages in the conversation
+            timings: Optional dict that receives the retrieval stage durations
 
         Returns:
             Tuple of (response text, retrieved documents)
         """
+        # First-turn questions close to an already answered one skip the LLM call
+        query_embedding = self._answer_cache_key(query, chat_history)
+        if query_embedding is not None:
+            cached = self.answer_cache.get(query_embedding)
+            if cached is not None:
+                return cached['answer'], cached['context']
+
         # Retrieve relevant documents if not provided
         if context is None:
-            context = self.retrieve(query)
+            context = self.retrieve(query, timings=timings)
 
         # Build the prompt
         prompt = self._build_prompt(query, context, chat_history)
@@ -140,6 +737,8 @@ class RAGPipeline:
         if self.gemini_model is not None:
             try:
                 response = self.gemini_model.generate_content(prompt)
+                if query_embedding is not None:
+                    self.answer_cache.put(query, query_embedding, response.text, context)
                 return response.text, context
             except Exception as e:
                 print(f"Gemini generation error: {e}")
@@ -147,37 +746,94 @@ class RAGPipeline:
         else:
             return self._fallback_response(query, context), context
 
-    def _build_prompt(self, query: str, context: List[Dict], chat_history: List[Dict] = None) -> str:
-        """Build the prompt for the AI model."""
-        prompt_parts = []
+    async def agenerate_response(self, query: str, chat_history: List[Dict] = None) -> Tuple[str, List[Dict]]:
+        """
+        Async variant of :meth:`generate_response` for ASGI views.
 
-        # System instruction
-        prompt_parts.append("""You are a helpful AI assistant for an online learning platform (LMS).
-Your role is to help users with questions about courses, learning, and the platform.
-Be concise, helpful, and friendly. If you don't know something, say so honestly.
-Use the provided context to answer questions when relevant.""")
+        Embedding, search and cache access run on a bounded thread pool so the
+        event loop stays free, and the Gemini call is awaited natively.
+        """
+        loop = asyncio.get_running_loop()
+        executor = get_executor()
 
-        # Add context from retrieved documents
-        if context:
-            prompt_parts.append("\n\n--- Relevant Information ---")
-            for i, doc in enumerate(context, 1):
-                prompt_parts.append(f"\n[{i}] {doc.get('title', 'Document')}")
-                prompt_parts.append(f"   {doc.get('content', '')[:500]}")
-            prompt_parts.append("\n--- End of Context ---\n")
-
-        # Add chat history
-        if chat_history:
-            prompt_parts.append("\n--- Previous Conversation ---")
-            for msg in chat_history[-6:]:  # Last 6 messages for context
-                role = "User" if msg.get('role') == 'user' else "Assistant"
-                prompt_parts.append(f"\n{role}: {msg.get('content', '')[:200]}")
-            prompt_parts.append("\n--- End of History ---\n")
-
-        # Add the current query
-        prompt_parts.append(f"\nUser Question: {query}")
-        prompt_parts.append("\nPlease provide a helpful response:")
-
-        return "\n".join(prompt_parts)
+        query_embedding = await loop.run_in_executor(executor, self._answer_cache_key, query, chat_history)
+        if query_embedding is not None:
+            cached = await loop.run_in_executor(executor, self.answer_cache.get, query_embedding)
+            if cached is not None:
+                return cached['answer'], cached['context']
+
+        context = await loop.run_in_executor(executor, self.retrieve, query)
+        prompt = self._build_prompt(query, context, chat_history)
+
+        if self.gemini_model is None:
+            return self._fallback_response(query, context), context
+        try:
+            response = await self.gemini_model.generate_content_async(prompt)
+            text = response.text
+        except Exception as e:
+            print(f"Gemini generation error: {e}")
+            return self._fallback_response(query, context), context
+
+        if query_embedding is not None:
+            await loop.run_in_executor(executor, self.answer_cache.put, query, query_embedding, text, context)
+        return text, context
+
+    def stream_response(self, query: str, chat_history: List[Dict] = None,
+                        timings: Optional[Dict] = None) -> Iterator[Tuple[str, object]]:
+        """
+        Generate a response incrementally using Gemini streaming.
+
+        Yields ``('context', documents)`` once retrieval is done, then
+        ``('token', text)`` for every chunk of the answer as it arrives.
+        Retrieval stage durations are added to ``timings`` if given.
+        """
+        query_embedding = self._answer_cache_key(query, chat_history)
+        if query_embedding is not None:
+            cached = self.answer_cache.get(query_embedding)
+            if cached is not None:
+                yield 'context', cached['context']
+                yield 'token', cached['answer']
+                return
+
+        context = self.retrieve(query, timings=timings)
+        yield 'context', context
+
+        if self.gemini_model is None:
+            yield 'token', self._fallback_response(query, context)
+            return
+
+        prompt = self._build_prompt(query, context, chat_history)
+        parts = []
+        try:
+            for chunk in self.gemini_model.generate_content(prompt, stream=True):
+                text = chunk.text
+                if text:
+                    parts.append(text)
+                    yield 'token', text
+        except Exception as e:
+            print(f"Gemini streaming error: {e}")
+            if not parts:
+                yield 'token', self._fallback_response(query, context)
+            return
+
+        if query_embedding is not None and parts:
+            self.answer_cache.put(query, query_embedding, ''.join(parts), context)
+
+    def _answer_cache_key(self, query: str, chat_history: Optional[List[Dict]]) -> Optional[np.ndarray]:
+        """Query embedding for the answer cache, or None when the answer must not be cached."""
+        if chat_history or not self.answer_cache.enabled or not self._can_embed():
+            return None
+        try:
+            return self.embed_query(query)
+        except Exception as e:
+            print(f"Answer cache lookup error: {e}")
+            return None
+
+    def _build_prompt(self, query: str, context: List[Dict], chat_history: List[Dict] = None) -> str:
+        """Build the prompt for the AI model, within RAG_PROMPT_TOKEN_BUDGET estimated tokens."""
+        return self.prompt_builder.build(
+            query, context, chat_history, budget=getattr(settings, 'RAG_PROMPT_TOKEN_BUDGET', 1500)
+        )
 
     def _fallback_response(self, query: str, context: List[Dict]) -> str:
         """Generate a fallback response when AI is unavailable."""
@@ -191,15 +847,171 @@ Use the provided context to answer questions when relevant.""")
 
 # Global RAG pipeline instance
 _rag_pipeline = None
+_pipeline_lock = threading.Lock()
+_warmup_lock = threading.Lock()
+_warmup_thread = None
+_warmup_error = None
+_executor = None
+_lexical_executor = None
+_rerank_executor = None
+
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Thread pool for CPU-bound pipeline work (embedding, search) from async code."""
+    global _executor
+    if _executor is None:
+        workers = getattr(settings, 'RAG_EXECUTOR_WORKERS', 0) or os.cpu_count() or 4
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='rag')
+    return _executor
+
+
+def get_lexical_executor() -> ThreadPoolExecutor:
+    """
+    Thread pool for the keyword leg of hybrid search. Separate from
+    :func:`get_executor` because retrieval itself runs there from async
+    views and must not wait on tasks queued behind it.
+    """
+    global _lexical_executor
+    if _lexical_executor is None:
+        workers = getattr(settings, 'RAG_EXECUTOR_WORKERS', 0) or os.cpu_count() or 4
+        _lexical_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='rag-lexical')
+    return _lexical_executor
+
+
+def get_rerank_executor() -> ThreadPoolExecutor:
+    """
+    Thread pool for cross-encoder re-ranking. A single thread: each batch
+    already uses every core, and requests that would queue behind a slow
+    batch fall back to the first-stage order when their budget runs out.
+    """
+    global _rerank_executor
+    if _rerank_executor is None:
+        _rerank_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rag-rerank')
+    return _rerank_executor
+
+
+def get_loaded_rag_pipeline() -> Optional[RAGPipeline]:
+    """
+    Return the global pipeline if this process has already built it. In
+    sidecar mode the (cheap) client pipeline is always returned, so every
+    worker forwards knowledge-base changes to the shared index.
+    """
+    if _rag_pipeline is None and getattr(settings, 'RAG_SHARED_MODE', '') == 'sidecar':
+        return get_rag_pipeline()
+    return _rag_pipeline
+
+
+def invalidate_answer_cache():
+    """
+    Drop cached answers after a knowledge-base change. Clears the shared
+    cache even when this process has not loaded the pipeline.
+    """
+    if _rag_pipeline is not None:
+        _rag_pipeline.answer_cache.invalidate()
+    elif getattr(settings, 'RAG_ANSWER_CACHE_BACKEND', ''):
+        SemanticResponseCache(backend=settings.RAG_ANSWER_CACHE_BACKEND).invalidate()
 
 
 def get_rag_pipeline() -> RAGPipeline:
-    """Get or create the global RAG pipeline instance."""
+    """
+    Get or create the global RAG pipeline instance.
+
+    With RAG_SHARED_MODE=sidecar embedding and search are delegated to the
+    ``manage.py rag_sidecar`` process; otherwise the pipeline is loaded in
+    this process (see :func:`load_rag_pipeline`).
+    """
     global _rag_pipeline
     if _rag_pipeline is None:
-        _rag_pipeline = RAGPipeline()
-        try:
-            _rag_pipeline.load_documents_from_db()
-        except Exception as e:
-            print(f"Failed to load documents: {e}")
+        with _pipeline_lock:  # Requests arriving during warmup wait for it instead of loading a second copy
+            if _rag_pipeline is None:
+                if getattr(settings, 'RAG_SHARED_MODE', '') == 'sidecar':
+                    from .sidecar import SidecarRAGPipeline
+
+                    _rag_pipeline = SidecarRAGPipeline()
+                    print(f"[RAG] Pipeline using sidecar at {_rag_pipeline.client.address}")
+                else:
+                    _rag_pipeline = load_rag_pipeline()
     return _rag_pipeline
+
+
+def start_warmup() -> bool:
+    """
+    Load the global pipeline on a background thread, so that neither the
+    first chat request nor the worker's startup waits for the model and
+    index. Does nothing when the pipeline is loaded or already loading; a
+    failed warmup is retried, whether it failed to build the pipeline or
+    to warm up the one it built. Returns whether a thread was started.
+    """
+    global _warmup_thread
+    with _warmup_lock:
+        if _warmup_thread is not None and _warmup_thread.is_alive():
+            return False
+        if _rag_pipeline is not None and _warmup_error is None:
+            return False
+        _warmup_thread = threading.Thread(target=_warm_up, name='rag-warmup', daemon=True)
+        _warmup_thread.start()
+        return True
+
+
+def _warm_up():
+    global _warmup_error
+    from django.db import connection
+
+    try:
+        get_rag_pipeline().warm_up()
+        _warmup_error = None
+    except Exception as e:
+        _warmup_error = e
+        print(f"[RAG] Warmup failed: {e}")
+    finally:
+        connection.close()  # Only request threads get their connections closed by Django
+
+
+def pipeline_state() -> str:
+    """
+    ``loading`` until the global pipeline is built, then ``ready``, or
+    ``degraded`` when it runs without retrieval or Gemini, or failed to load.
+    """
+    if _rag_pipeline is None:
+        return 'degraded' if _warmup_error is not None else 'loading'
+    if _warmup_error is not None:
+        return 'degraded'
+    return _rag_pipeline.state()
+
+
+def load_rag_pipeline() -> RAGPipeline:
+    """
+    Build a pipeline with its own embedding model and index.
+
+    The index is loaded from the current on-disk snapshot when one exists and
+    matches the database, otherwise it is rebuilt from the stored embeddings.
+    """
+    started = time.perf_counter()
+    rag = RAGPipeline()
+    source = 'rebuild'
+    try:
+        if getattr(settings, 'RAG_INDEX_SNAPSHOTS', True) and rag._can_embed() and load_snapshot(rag):
+            source = 'snapshot (mmap)' if rag.index_path else 'snapshot'
+        else:
+            rag.load_documents_from_db()
+    except Exception as e:
+        print(f"Failed to load documents: {e}")
+    print(
+        f"[RAG] Pipeline ready from {source}: {rag.document_count()} documents "
+        f"in {time.perf_counter() - started:.2f}s, RSS {current_rss_mb():.0f} MB"
+    )
+    return rag
+
+
+def current_rss_mb() -> float:
+    """Resident set size of this process in MB."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Peak, in KB on Linux
@@ -0,0 +1,232 @@
+"""
+Embedding/search sidecar for multi-worker deployments.
+
+With RAG_SHARED_MODE=sidecar a single ``manage.py rag_sidecar`` process
+holds the embedding model and vector index, and every web worker talks to
+it over a Unix socket instead of loading its own copy. Workers keep Gemini,
+the prompt and the caches; only encode/search/index updates cross the socket.
+"""
+import hashlib
+import os
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+from typing import Dict, List, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from .pipeline import RAGPipeline, knowledge_base_model
+
+
+class SidecarError(Exception):
+    """The sidecar could not be reached or failed to handle a request."""
+
+
+def sidecar_address() -> str:
+    return str(getattr(settings, 'RAG_SIDECAR_SOCKET', '/tmp/rag-sidecar.sock'))
+
+
+def sidecar_authkey() -> bytes:
+    """Shared secret for the socket handshake, derived from SECRET_KEY."""
+    return hashlib.sha256(f'rag-sidecar:{settings.SECRET_KEY}'.encode('utf-8')).digest()
+
+
+class SidecarServer:
+    """
+    Serves a loaded RAGPipeline over a Unix socket, one thread per worker
+    connection. Requests are ``(operation, args)`` tuples and replies are
+    ``('ok', result)`` or ``('error', message)``.
+    """
+
+    def __init__(self, rag: RAGPipeline, address: str = None, authkey: bytes = None):
+        self.rag = rag
+        self.address = address or sidecar_address()
+        self.authkey = authkey or sidecar_authkey()
+        self.listener = None
+        self._closing = False
+
+    def serve_forever(self):
+        if os.path.exists(self.address):
+            os.unlink(self.address)  # Left behind by a previous run
+        self.listener = Listener(self.address, family='AF_UNIX', authkey=self.authkey)
+        os.chmod(self.address, 0o600)
+        while True:
+            try:
+                conn = self.listener.accept()
+            except OSError:
+                break  # Listener closed
+            except Exception as e:
+                print(f"[RAG sidecar] Rejected connection: {e}")
+                continue
+            if self._closing:
+                conn.close()
+                break
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def close(self):
+        if self.listener is None:
+            return
+        self._closing = True
+        try:
+            Client(self.address, family='AF_UNIX', authkey=self.authkey).close()  # Wake accept()
+        except OSError:
+            pass
+        self.listener.close()
+
+    def _handle(self, conn):
+        from django.db import close_old_connections
+
+        with conn:
+            while True:
+                try:
+                    operation, args = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    result = getattr(self, f'op_{operation}')(*args)
+                    reply = ('ok', result)
+                except Exception as e:
+                    reply = ('error', f'{type(e).__name__}: {e}')
+                finally:
+                    close_old_connections()
+                conn.send(reply)
+
+    def op_encode(self, texts: List[str]) -> np.ndarray:
+        if len(texts) == 1:
+            return self.rag.embed_query(texts[0])[None, :]  # Shares the sidecar's query cache
+        return self.rag._encode(texts)
+
+    def op_search(self, embedding: np.ndarray, top_k: int, query: str = None) -> Tuple[List[Dict], Dict]:
+        timings = {}
+        return self.rag._search(embedding, top_k, query, timings), timings
+
+    def op_upsert(self, doc_type: str, ids: List[int]):
+        self.rag.upsert_instances(doc_type, list(knowledge_base_model(doc_type).objects.filter(pk__in=ids)))
+
+    def op_remove(self, doc_type: str, ids: List[int]):
+        self.rag.remove_instances(doc_type, ids)
+
+    def op_reload(self):
+        self.rag.load_documents_from_db()
+
+    def op_stats(self) -> Dict:
+        return {
+            'documents': self.rag.document_count(),
+            'can_embed': self.rag._can_embed(),
+            'query_cache': self.rag.query_cache.stats(),
+        }
+
+
+class SidecarClient:
+    """Thread-safe client; each thread keeps its own connection to the sidecar."""
+
+    def __init__(self, address: str = None, authkey: bytes = None, timeout: float = None):
+        self.address = address or sidecar_address()
+        self.authkey = authkey or sidecar_authkey()
+        self.timeout = timeout if timeout is not None else getattr(settings, 'RAG_SIDECAR_TIMEOUT', 10.0)
+        self._local = threading.local()
+
+    def call(self, operation: str, *args):
+        for attempt in range(2):  # Reconnect once if the sidecar restarted
+            conn = self._connection()
+            try:
+                conn.send((operation, args))
+                if not conn.poll(self.timeout):
+                    raise SidecarError(f'{operation} timed out after {self.timeout}s')
+                status, result = conn.recv()
+                break
+            except (EOFError, OSError) as e:
+                self._disconnect()
+                if attempt:
+                    raise SidecarError(f'Sidecar at {self.address} is unavailable: {e}') from e
+            except SidecarError:
+                self._disconnect()  # A late reply must not be read by the next call
+                raise
+        if status != 'ok':
+            raise SidecarError(result)
+        return result
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            try:
+                conn = Client(self.address, family='AF_UNIX', authkey=self.authkey)
+            except OSError as e:
+                raise SidecarError(f'Sidecar at {self.address} is unavailable: {e}') from e
+            self._local.conn = conn
+        return conn
+
+    def _disconnect(self):
+        conn = getattr(self._local, 'conn', None)
+        self._local.conn = None
+        if conn is not None:
+            conn.close()
+
+
+class SidecarRAGPipeline(RAGPipeline):
+    """
+    RAGPipeline whose embedding model and index live in the sidecar.
+
+    Generation, prompt building and the answer/query caches stay in the
+    worker, so the worker never imports sentence-transformers or FAISS data.
+    """
+
+    STATUS_TTL = 5.0  # Seconds a sidecar status check is reused for
+
+    def __init__(self, client: SidecarClient = None):
+        self.client = client or SidecarClient()
+        self._status = None
+        self._status_at = 0.0
+        super().__init__()
+
+    def _initialize(self):
+        self._initialize_gemini()
+
+    def _sidecar_status(self) -> Dict:
+        """The sidecar's ``stats``, fetched at most every STATUS_TTL seconds; empty while it is unreachable."""
+        now = time.monotonic()
+        if self._status is None or now - self._status_at > self.STATUS_TTL:
+            try:
+                self._status = self.client.call('stats')
+            except SidecarError as e:
+                print(f"[RAG] {e}")
+                self._status = {}
+            self._status_at = now
+        return self._status
+
+    def _can_embed(self) -> bool:
+        return bool(self._sidecar_status().get('can_embed'))
+
+    def _has_documents(self) -> bool:
+        return self._sidecar_status().get('documents', 0) > 0
+
+    def _encode(self, texts: List[str], batch_size=None) -> np.ndarray:
+        return self.client.call('encode', list(texts))
+
+    def _search(self, query_embedding: np.ndarray, top_k: int, query: str = None, timings: Dict = None) -> List[Dict]:
+        results, stages = self.client.call('search', query_embedding, top_k, query)
+        if timings is not None:
+            timings.update(stages)
+        return results
+
+    def document_count(self) -> int:
+        try:
+            return self.client.call('stats')['documents']
+        except SidecarError as e:
+            print(f"[RAG] {e}")
+            return 0
+
+    def upsert_instances(self, doc_type: str, instances):
+        self.client.call('upsert', doc_type, [obj.pk for obj in instances])
+        self._status = None
+        self.answer_cache.invalidate()
+
+    def remove_instances(self, doc_type: str, ids: List[int]):
+        self.client.call('remove', doc_type, list(ids))
+        self._status = None
+        self.answer_cache.invalidate()
+
+    def load_documents_from_db(self):
+        self.client.call('reload')
+        self._status = None
@@ -0,0 +1,224 @@
+"""
+On-disk snapshots of the RAG vector index.
+
+A snapshot is a set of three files written by ``manage.py snapshot_index``
+(or ``build_index``):
+
+    index-v<N>.faiss   the serialized FAISS index
+    index-v<N>.json    metadata plus the indexed documents and chunks (keyed by label)
+    index-v<N>.bm25    the keyword index used by hybrid retrieval (NumPy .npz)
+
+and a ``CURRENT`` file naming the active version. Workers load the active
+snapshot at startup (memory-mapped where the index type supports it) instead
+of re-embedding the knowledge base, and fall back to a rebuild when the
+snapshot no longer matches the database.
+"""
+import json
+import os
+import re
+from pathlib import Path
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .index import FAISS_AVAILABLE, Tombstones, apply_search_params, factory_string, faiss, index_params
+
+SNAPSHOT_FORMAT = 3
+CURRENT_FILE = 'CURRENT'
+_VERSION_RE = re.compile(r'^index-v(\d+)\.json$')
+
+
+def snapshot_dir() -> Path:
+    return Path(getattr(settings, 'RAG_INDEX_DIR', settings.BASE_DIR / 'index_snapshots'))
+
+
+def knowledge_base_state() -> Dict:
+    """
+    Row count and latest ``updated_at`` per knowledge-base model.
+
+    A snapshot is only valid while this is unchanged: edits bump
+    ``updated_at``, while inserts and deletes change the count.
+    """
+    from .pipeline import KNOWLEDGE_BASE_SOURCES, knowledge_base_model
+
+    state = {}
+    for doc_type in KNOWLEDGE_BASE_SOURCES:
+        stats = knowledge_base_model(doc_type).objects.aggregate(count=Count('id'), max_updated_at=Max('updated_at'))
+        state[doc_type] = {
+            'count': stats['count'],
+            'max_updated_at': stats['max_updated_at'].isoformat() if stats['max_updated_at'] else None,
+        }
+    return state
+
+
+def _chunking_params() -> Dict:
+    """Chunk size and overlap the indexed documents were split with."""
+    return {
+        'size': getattr(settings, 'RAG_CHUNK_SIZE', 800),
+        'overlap': getattr(settings, 'RAG_CHUNK_OVERLAP', 100),
+    }
+
+
+def _paths(directory: Path, version: int):
+    return (
+        directory / f'index-v{version}.faiss',
+        directory / f'index-v{version}.json',
+        directory / f'index-v{version}.bm25',
+    )
+
+
+def _versions(directory: Path):
+    if not directory.is_dir():
+        return []
+    return sorted(int(m.group(1)) for m in (_VERSION_RE.match(name) for name in os.listdir(directory)) if m)
+
+
+def current_version(directory: Optional[Path] = None) -> Optional[int]:
+    directory = directory or snapshot_dir()
+    try:
+        return int((directory / CURRENT_FILE).read_text().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def invalidate_snapshot(directory: Optional[Path] = None) -> Optional[int]:
+    """
+    Retire the current snapshot so workers rebuild from the database, e.g.
+    after a bulk import. The files are kept until newer versions replace them.
+
+    Returns:
+        The version that was current, or None if there was none
+    """
+    directory = directory or snapshot_dir()
+    version = current_version(directory)
+    if version is not None:
+        (directory / CURRENT_FILE).unlink(missing_ok=True)
+    return version
+
+
+def _write_atomic(path: Path, data: bytes):
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def write_snapshot(rag, state: Dict, directory: Optional[Path] = None, keep: int = 3) -> int:
+    """
+    Write the pipeline's index and document mapping as a new snapshot version
+    and make it current.
+
+    Args:
+        rag: A loaded RAGPipeline
+        state: ``knowledge_base_state()`` captured *before* the index was built,
+            so rows changed during the build make the snapshot stale
+        directory: Target directory (defaults to RAG_INDEX_DIR)
+        keep: Number of snapshot versions to retain
+
+    Returns:
+        The new version number
+    """
+    directory = directory or snapshot_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    versions = _versions(directory)
+    version = (versions[-1] + 1) if versions else 1
+    index_path, meta_path, lexical_path = _paths(directory, version)
+
+    faiss.write_index(rag.index, str(index_path))
+    _write_atomic(lexical_path, rag.lexical.to_bytes())
+    meta = {
+        'format': SNAPSHOT_FORMAT,
+        'version': version,
+        'embedding_model': rag.embedding_model_name,
+        'embedding_dim': rag.embedding_dim,
+        'index': factory_string(index_params()),
+        'chunking': _chunking_params(),
+        'ntotal': int(rag.index.ntotal),
+        'knowledge_base': state,
+        'documents': list(rag.documents.values()),
+        'tombstones': sorted(rag.tombstones.positions),
+    }
+    _write_atomic(meta_path, json.dumps(meta).encode('utf-8'))
+    _write_atomic(directory / CURRENT_FILE, str(version).encode('ascii'))
+
+    for old in versions[:max(0, len(versions) + 1 - keep)]:
+        for path in _paths(directory, old):
+            path.unlink(missing_ok=True)
+    return version
+
+
+def _mmap_flags() -> int:
+    """FAISS read flags that memory-map index data instead of copying it."""
+    flags = getattr(faiss, 'IO_FLAG_MMAP', 0)
+    # Flat codes (IndexFlat, HNSW storage, IDMap over flat) need the newer IFC flag
+    flags |= getattr(faiss, 'IO_FLAG_MMAP_IFC', 0)
+    return flags | getattr(faiss, 'IO_FLAG_READ_ONLY', 0)
+
+
+def load_snapshot(rag, directory: Optional[Path] = None) -> bool:
+    """
+    Load the current snapshot into ``rag`` if it matches the database.
+
+    Returns:
+        True if the snapshot was loaded, False if it is missing or stale
+    """
+    if not FAISS_AVAILABLE:
+        return False
+    directory = directory or snapshot_dir()
+    version = current_version(directory)
+    if version is None:
+        return False
+
+    index_path, meta_path, lexical_path = _paths(directory, version)
+    try:
+        with open(meta_path, 'rb') as f:
+            meta = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[RAG] Ignoring unreadable index snapshot v{version}: {e}")
+        return False
+
+    if (
+        meta.get('format') != SNAPSHOT_FORMAT
+        or meta.get('embedding_model') != rag.embedding_model_name
+        or meta.get('embedding_dim') != rag.embedding_dim
+        or meta.get('index') != factory_string(index_params())
+        or meta.get('chunking') != _chunking_params()
+        or meta.get('knowledge_base') != knowledge_base_state()
+    ):
+        print(f"[RAG] Index snapshot v{version} is stale, rebuilding")
+        return False
+
+    mmap = bool(getattr(settings, 'RAG_INDEX_MMAP', True))
+    try:
+        index = faiss.read_index(str(index_path), _mmap_flags() if mmap else 0)
+    except RuntimeError as e:
+        if not mmap:
+            print(f"[RAG] Failed to read index snapshot v{version}: {e}")
+            return False
+        # Index type without mmap support: read it into memory instead
+        index = faiss.read_index(str(index_path))
+        mmap = False
+
+    if index.ntotal != len(meta['documents']) + len(meta['tombstones']) or index.d != rag.embedding_dim:
+        print(f"[RAG] Index snapshot v{version} is inconsistent, rebuilding")
+        return False
+
+    from .pipeline import entry_label
+
+    apply_search_params(index)
+    rag.index = index
+    rag.index_path = str(index_path) if mmap else None
+    rag.documents = {entry_label(doc): doc for doc in meta['documents']}
+    rag.tombstones = Tombstones(meta['tombstones'])
+    try:
+        rag.lexical.load(str(lexical_path))
+    except (OSError, ValueError, KeyError) as e:
+        print(f"[RAG] Rebuilding keyword index of snapshot v{version}: {e}")
+        rag.lexical.clear()
+    if len(rag.lexical) != len(rag.documents):
+        rag.lexical.clear()
+        rag.lexical.add(list(rag.documents), [rag._document_text(doc) for doc in rag.documents.values()])
+    return True
@@ -1,3 +1,4 @@
-from .scheduler import start_scheduler, cleanup_old_chat_history, send_verification_email
+from .outbox import drain_outbox, queue_email
+from .scheduler import start_scheduler, cleanup_old_chat_history, schedule_verification_email
 
-__all__ = ['start_scheduler', 'cleanup_old_chat_history', 'send_verification_email']
+__all__ = ['start_scheduler', 'cleanup_old_chat_history', 'schedule_verification_email', 'drain_outbox', 'queue_email']
@@ -0,0 +1,144 @@
+"""
+Durable outbound email queue.
+
+Emails are stored as ``OutboundEmail`` rows by :func:`queue_email` and sent
+by :func:`drain_outbox`, which the ``drain_outbox`` worker command (and,
+under ``runserver``, the scheduler) runs every EMAIL_OUTBOX_INTERVAL seconds. A drain run claims due emails in batches and
+sends them over one SMTP connection; failures are retried with exponential
+backoff until EMAIL_OUTBOX_MAX_ATTEMPTS, then marked ``failed``.
+"""
+import smtplib
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+DUE_STATUSES = ('pending', 'sending')  # 'sending' rows are due again once their claim expires
+
+
+def queue_email(to_email: str, subject: str, body: str, from_email: str = None):
+    """Store an email in the outbox; it is sent by the next drain run."""
+    from api.models import OutboundEmail
+
+    return OutboundEmail.objects.create(
+        to_email=to_email,
+        from_email=from_email or settings.EMAIL_HOST_USER or 'noreply@lmsplatform.com',
+        subject=subject,
+        body=body,
+    )
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Backoff before the next try after ``attempts`` failed ones: base, 2x base, 4x base..."""
+    base = getattr(settings, 'EMAIL_OUTBOX_RETRY_DELAY', 60)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), 24 * 3600))
+
+
+def claim_batch(batch_size: int):
+    """
+    Reserve up to ``batch_size`` due emails for this run and return them.
+
+    The claim is a single conditional UPDATE that pushes ``next_attempt_at``
+    out by EMAIL_OUTBOX_LEASE seconds, so concurrent drain runs (one per
+    worker process) never claim the same email, and emails claimed by a run
+    that died become due again once the lease expires.
+    """
+    from api.models import OutboundEmail
+
+    now = timezone.now()
+    due = Q(status__in=DUE_STATUSES, next_attempt_at__lte=now)
+    ids = list(
+        OutboundEmail.objects.filter(due).order_by('next_attempt_at', 'pk').values_list('pk', flat=True)[:batch_size]
+    )
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    OutboundEmail.objects.filter(due, pk__in=ids).update(
+        status='sending',
+        claim_token=token,
+        next_attempt_at=now + timedelta(seconds=getattr(settings, 'EMAIL_OUTBOX_LEASE', 300)),
+    )
+    return list(OutboundEmail.objects.filter(claim_token=token, status='sending').order_by('pk'))
+
+
+def drain_outbox(batch_size: int = None, connection=None) -> dict:
+    """
+    Send every email that is due, in batches, over a single SMTP connection.
+
+    Returns counts of ``sent``, ``retrying`` and ``failed`` emails.
+    """
+    from api.models import OutboundEmail
+
+    batch_size = batch_size or getattr(settings, 'EMAIL_OUTBOX_BATCH_SIZE', 100)
+    max_attempts = getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 5)
+    stats = {'sent': 0, 'retrying': 0, 'failed': 0}
+    started = time.monotonic()
+    connection = connection or get_connection(fail_silently=False)
+    is_open = False
+    try:
+        while True:
+            batch = claim_batch(batch_size)
+            if not batch:
+                break
+
+            sent = []
+            for email in batch:
+                if not is_open:
+                    try:
+                        connection.open()
+                        is_open = True
+                    except Exception as e:
+                        # The server is unreachable: hand the rest of the batch back without using up attempts
+                        OutboundEmail.objects.filter(claim_token=email.claim_token, status='sending').exclude(
+                            pk__in=sent,
+                        ).update(
+                            status='pending',
+                            next_attempt_at=timezone.now() + retry_delay(1),
+                            claim_token='',
+                            last_error=f'{type(e).__name__}: {e}'[:1000],
+                        )
+                        print(f"[Email] Could not connect to the mail server: {e}")
+                        batch = []  # Stop after recording what was sent
+                        break
+                try:
+                    EmailMessage(
+                        email.subject, email.body, email.from_email, [email.to_email], connection=connection,
+                    ).send()
+                    sent.append(email.pk)
+                except Exception as e:
+                    if isinstance(e, (smtplib.SMTPServerDisconnected, ConnectionError)):
+                        connection.close()
+                        is_open = False  # Reconnect for the next email
+                    attempts = email.attempts + 1
+                    status = 'failed' if attempts >= max_attempts else 'pending'
+                    OutboundEmail.objects.filter(pk=email.pk, claim_token=email.claim_token).update(
+                        status=status,
+                        attempts=attempts,
+                        next_attempt_at=timezone.now() + retry_delay(attempts),
+                        claim_token='',
+                        last_error=f'{type(e).__name__}: {e}'[:1000],
+                    )
+                    stats['failed' if status == 'failed' else 'retrying'] += 1
+                    print(f"[Email] Sending to {email.to_email} failed (attempt {attempts}/{max_attempts}): {e}")
+
+            OutboundEmail.objects.filter(pk__in=sent).update(
+                status='sent', attempts=F('attempts') + 1, sent_at=timezone.now(), claim_token='', last_error='',
+            )
+            stats['sent'] += len(sent)
+            if len(batch) < batch_size:
+                break
+    finally:
+        if is_open:
+            connection.close()
+
+    if any(stats.values()):
+        seconds = time.monotonic() - started
+        print(
+            f"[Email] Outbox drained in {seconds:.2f}s: {stats['sent']} sent "
+            f"({stats['sent'] / seconds if seconds else 0:.0f}/s), {stats['retrying']} to retry, {stats['failed']} failed"
+        )
+    return stats
@@ -3,58 +3,148 @@ Background tasks using APScheduler.
 Handles periodic cleanup and email verification.
 """
 import os
+import time
 import uuid
 from datetime import timedelta
 from django.utils import timezone
 from django.conf import settings
-from django.core.mail import send_mail
+from django.db import OperationalError, transaction
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 
+from .outbox import drain_outbox, queue_email
+
 scheduler = BackgroundScheduler()
 
+OUTBOX_JOB_ID = 'drain_email_outbox'
+BATCH_ATTEMPTS = 3  # Tries per cleanup batch before giving up on the run
+
 
-def cleanup_old_chat_history():
+def delete_in_batches(queryset, batch_size, pause=0.0, order='pk', fields=(), before_delete=None,
+                      after_delete=None):
     """
-    Delete chat messages and sessions older than CHAT_HISTORY_RETENTION_DAYS.
-    Runs daily at midnight.
+    Delete the rows of ``queryset`` in batches of primary keys.
+
+    Batches are selected in ``(order, pk)`` order by keyset (after the last
+    row seen), so with an index on the ``order`` field that the filter also
+    bounds, every batch reads only rows that are about to be deleted. Each
+    is deleted in its own short transaction, sleeping ``pause`` seconds between batches so
+    other queries can get at the table. In that transaction
+    ``before_delete(batch)`` gets the batch as a queryset and
+    ``after_delete(rows)`` its ``(pk, *fields)`` tuples. A batch that fails on
+    a lock conflict is retried up to BATCH_ATTEMPTS times.
+
+    Returns ``(rows_deleted, seconds, longest_batch_seconds)``.
     """
-    from api.models import ChatSession, ChatMessage
-
-    retention_days = getattr(settings, 'CHAT_HISTORY_RETENTION_DAYS', 30)
-    cutoff_date = timezone.now() - timedelta(days=retention_days)
-
-    # Delete old messages
-    old_messages = ChatMessage.objects.filter(created_at__lt=cutoff_date)
-    message_count = old_messages.count()
-    old_messages.delete()
-
-    # Delete empty sessions
-    empty_sessions = ChatSession.objects.filter(messages__isnull=True)
-    session_count = empty_sessions.count()
-    empty_sessions.delete()
+    model = queryset.model
+    ordered = queryset.order_by(order, 'pk')
+    deleted, longest, last = 0, 0.0, None
+    started = time.monotonic()
+    while True:
+        remaining = ordered
+        if last is not None and order == 'pk':
+            remaining = ordered.filter(pk__gt=last[0])
+        elif last is not None:
+            pk, value = last
+            remaining = ordered.filter(**{f'{order}__gte': value}).exclude(**{order: value, 'pk__lte': pk})
+        selected = list(remaining.values_list('pk', order, *fields)[:batch_size])
+        if not selected:
+            break
+        rows = [(pk, *rest) for pk, _, *rest in selected]
+        batch_started = time.monotonic()
+        for attempt in range(1, BATCH_ATTEMPTS + 1):
+            try:
+                with transaction.atomic():
+                    # Re-applying the filter skips rows that stopped matching since they were selected
+                    batch = queryset.filter(pk__in=[row[0] for row in rows])
+                    if before_delete is not None:
+                        before_delete(batch)
+                    _, per_model = batch.delete()
+                    if after_delete is not None:
+                        after_delete(rows)
+                break
+            except OperationalError as e:
+                # Lock conflict with a concurrent writer (SQLite "database is locked", a
+                # PostgreSQL deadlock); the batch was rolled back, so it is safe to retry
+                if attempt == BATCH_ATTEMPTS:
+                    raise
+                print(f"[Cleanup] {model.__name__} batch failed ({e}), retrying")
+                time.sleep(max(pause, 0.1) * attempt)
+        deleted += per_model.get(model._meta.label, 0)
+        longest = max(longest, time.monotonic() - batch_started)
+        last = selected[-1][:2]
+        if len(rows) < batch_size:
+            break
+        time.sleep(pause)
+    return deleted, time.monotonic() - started, longest
+
+
+def cleanup_old_chat_history(cutoff=None, batch_size=None, pause=None):
+    """
+    Delete chat messages and sessions older than CHAT_HISTORY_RETENTION_DAYS,
+    and outbox emails sent before then. Runs daily at midnight.
 
-    # Delete old inactive sessions
-    old_sessions = ChatSession.objects.filter(
-        updated_at__lt=cutoff_date,
-        is_active=False
-    )
-    old_session_count = old_sessions.count()
-    old_sessions.delete()
+    Rows go in batches of CHAT_CLEANUP_BATCH_SIZE, one transaction each, with
+    CHAT_CLEANUP_BATCH_PAUSE seconds between batches, so the job never holds
+    long locks. Every batch is committed on its own: an interrupted run keeps
+    what it deleted and the next run continues with the rows still matching.
 
-    print(f"[Cleanup] Deleted {message_count} old messages, {session_count} empty sessions, {old_session_count} old inactive sessions")
+    Returns ``{phase: (rows_deleted, seconds, longest_batch_seconds)}``.
+    """
+    from api.models import ChatSession, ChatMessage, OutboundEmail
+
+    if cutoff is None:
+        retention_days = getattr(settings, 'CHAT_HISTORY_RETENTION_DAYS', 30)
+        cutoff = timezone.now() - timedelta(days=retention_days)
+    if batch_size is None:
+        batch_size = getattr(settings, 'CHAT_CLEANUP_BATCH_SIZE', 5000)
+    if pause is None:
+        pause = getattr(settings, 'CHAT_CLEANUP_BATCH_PAUSE', 0.1)
+
+    def refresh_sessions(rows):
+        ChatSession.objects.filter(pk__in={session_id for _, session_id in rows}).refresh_message_stats()
+
+    def delete_session_messages(sessions):
+        # A single DELETE before the cascade's SELECT: on SQLite, a transaction that
+        # reads first cannot take the write lock while another connection waits for it
+        ChatMessage.objects.filter(session__in=sessions).delete()
+
+    started = time.monotonic()
+    stats = {
+        # Old messages, keeping the counters of the sessions they belonged to current
+        'messages': delete_in_batches(
+            ChatMessage.objects.filter(created_at__lt=cutoff), batch_size, pause, order='created_at',
+            fields=('session_id',), after_delete=refresh_sessions,
+        ),
+        # Sessions left empty (not ones started since the cutoff, which may be about to get a message)
+        'empty sessions': delete_in_batches(
+            ChatSession.objects.filter(message_count=0, updated_at__lt=cutoff), batch_size, pause, order='updated_at',
+            before_delete=delete_session_messages,
+        ),
+        'old inactive sessions': delete_in_batches(
+            ChatSession.objects.filter(updated_at__lt=cutoff, is_active=False), batch_size, pause, order='updated_at',
+            before_delete=delete_session_messages,
+        ),
+        'sent emails': delete_in_batches(
+            OutboundEmail.objects.filter(status='sent', sent_at__lt=cutoff), batch_size, pause,
+        ),
+    }
+
+    for phase, (rows, seconds, longest) in stats.items():
+        print(
+            f"[Cleanup] Deleted {rows} {phase} in {seconds:.1f}s "
+            f"({rows / seconds if seconds else 0:.0f} rows/s, longest batch {longest * 1000:.0f}ms)"
+        )
+    print(f"[Cleanup] Finished in {time.monotonic() - started:.1f}s")
+    return stats
 
 
-def send_verification_email(user_email: str, username: str, verification_token: str):
-    """
-    Send verification email to new users.
-    Called as a background task after user signup.
-    """
-    try:
-        subject = 'Verify your email - LMS Chatbot'
-        verification_url = f"{settings.FRONTEND_URL}/verify-email?token={verification_token}"
-        message = f"""
+def verification_email(username: str, verification_token: str):
+    """Subject and body of the email that asks a new user to verify their address."""
+    subject = 'Verify your email - LMS Chatbot'
+    verification_url = f"{settings.FRONTEND_URL}/verify-email?token={verification_token}"
+    message = f"""
 Hello {username},
 
 Thank you for signing up for our LMS Chatbot service!
@@ -67,17 +157,7 @@ If you didn't create this account, please ignore this email.
 Best regards,
 LMS Platform Team
         """
-
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.EMAIL_HOST_USER or 'noreply@lmsplatform.com',
-            recipient_list=[user_email],
-            fail_silently=False,
-        )
-        print(f"[Email] Verification email sent to {user_email}")
-    except Exception as e:
-        print(f"[Email] Failed to send verification email to {user_email}: {e}")
+    return subject, message
 
 
 def generate_verification_token() -> str:
@@ -86,15 +166,19 @@ def generate_verification_token() -> str:
 
 
 def schedule_verification_email(user_email: str, username: str, verification_token: str):
-    """Schedule verification email as a background task."""
-    scheduler.add_job(
-        send_verification_email,
-        args=[user_email, username, verification_token],
-        trigger=IntervalTrigger(seconds=1),  # Run almost immediately
-        id=f'verify_email_{user_email}',
-        replace_existing=True,
-        max_instances=1
-    )
+    """Queue the verification email in the outbox and wake the drain job once it is committed."""
+    subject, message = verification_email(username, verification_token)
+    queue_email(user_email, subject, message)
+    transaction.on_commit(wake_outbox)
+
+
+def wake_outbox():
+    """
+    Run the in-process outbox drain now instead of at its next interval. A
+    separate ``drain_outbox`` worker picks the email up on its next run.
+    """
+    if scheduler.running and scheduler.get_job(OUTBOX_JOB_ID) is not None:
+        scheduler.modify_job(OUTBOX_JOB_ID, next_run_time=timezone.now())
 
 
 def start_scheduler():
@@ -108,6 +192,16 @@ def start_scheduler():
             replace_existing=True,
         )
 
+        # Send queued emails; runs never overlap, and missed runs collapse into one
+        scheduler.add_job(
+            drain_outbox,
+            trigger=IntervalTrigger(seconds=getattr(settings, 'EMAIL_OUTBOX_INTERVAL', 5)),
+            id=OUTBOX_JOB_ID,
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+        )
+
         scheduler.start()
         print("[Scheduler] Background scheduler started")
 
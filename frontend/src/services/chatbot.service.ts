@@ -26,8 +26,15 @@ interface ChatSession {
   };
 }
 
+interface ChatHistoryPage {
+  results: ChatSession[];
+  next: string | null;  // Cursor for the next (older) page, pass back to getChatHistory
+}
+
 interface ChatSessionDetail extends ChatSession {
-  messages: ChatMessage[];
+  messages: ChatMessage[];  // One page, newest first
+  older_cursor: number | null;  // Pass as `before` for older messages; null at the start of the session
+  newer_cursor: number | null;  // Pass as `after` to fetch messages added since
 }
 
 interface ChatResponse {
@@ -196,18 +203,31 @@ class ChatbotService {
     return response.json();
   }
 
-  async getChatHistory(): Promise<ChatSession[]> {
-    const response = await this.fetchWithAuth('/chat-history/');
+  async getChatHistory(cursor?: string | null): Promise<ChatHistoryPage> {
+    const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+    const response = await this.fetchWithAuth(`/chat-history/${query}`);
 
     if (!response.ok) {
       throw new Error('Failed to fetch chat history');
     }
 
-    return response.json();
+    const page = await response.json();
+    return {
+      results: page.results,
+      next: page.next ? new URL(page.next).searchParams.get('cursor') : null,
+    };
   }
 
-  async getChatSession(sessionId: number): Promise<ChatSessionDetail> {
-    const response = await this.fetchWithAuth(`/chat-history/${sessionId}/`);
+  async getChatSession(
+    sessionId: number,
+    page: { before?: number; after?: number; limit?: number } = {}
+  ): Promise<ChatSessionDetail> {
+    const params = new URLSearchParams();
+    Object.entries(page).forEach(([key, value]) => {
+      if (value !== undefined) params.set(key, String(value));
+    });
+    const query = params.toString() ? `?${params}` : '';
+    const response = await this.fetchWithAuth(`/chat-history/${sessionId}/${query}`);
 
     if (!response.ok) {
       throw new Error('Failed to fetch chat session');
@@ -234,4 +254,4 @@ class ChatbotService {
 }
 
 export const chatbotService = new ChatbotService();
-export type { ChatMessage, ChatSession, ChatSessionDetail, ChatResponse, AuthResponse };
+export type { ChatMessage, ChatSession, ChatHistoryPage, ChatSessionDetail, ChatResponse, AuthResponse };